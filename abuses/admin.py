@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db import transaction
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
@@ -11,26 +12,36 @@ from .models import AdAbuse, UserAbuse
 class AbuseAdmin(admin.ModelAdmin, UserLinkMixin):
     date_hierarchy = 'created_at'
     actions = ['confirm', 'reject']
+    notify_task = None
 
     def sender_link(self, obj):
         return self._get_user_link(obj.sender)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'is_confirmed' in form.changed_data:
+            self.model.update_counters([getattr(obj, f'{obj.target_field}_id')])
+            if obj.is_confirmed:
+                self.notify([obj.pk])
+
+    def notify(self, abuse_ids):
+        """ Уведомление и блокировка по порогу после коммита. """
+        transaction.on_commit(lambda: self.notify_task.delay(abuse_ids))
+
     def confirm(self, request, queryset):
-        queryset.update(is_confirmed=True)
-        model = self.model.__name__.lower()
-        abuse_ids = queryset.values_list('id', flat=True)
-        getattr(tasks, f'notify_and_block_{model}').delay(abuse_ids)
+        self.notify(queryset.confirm())
 
     confirm.short_description = "Mark selected abuses as confirmed"
 
     def reject(self, request, queryset):
-        queryset.update(is_confirmed=False)
+        queryset.reject()
 
     reject.short_description = "Mark selected abuses as rejected"
 
 
 @admin.register(UserAbuse)
 class UserAbuseAdmin(AbuseAdmin):
+    notify_task = tasks.notify_and_block_user
     list_display = (
         'reason', 'user_link', 'sender_link', 'short_comment',
         'is_confirmed', 'created_at'
@@ -61,6 +72,7 @@ class UserAbuseAdmin(AbuseAdmin):
 
 @admin.register(AdAbuse)
 class AdAbuseAdmin(AbuseAdmin):
+    notify_task = tasks.notify_and_block_ad
     list_display = (
         'reason', 'ad_link', 'sender_link', 'short_comment',
         'is_confirmed', 'created_at'
@@ -70,6 +82,12 @@ class AdAbuseAdmin(AbuseAdmin):
     )
     list_select_related = ('ad', 'sender')
     list_filter = ('reason', 'is_confirmed')
+
+    def lookup_allowed(self, lookup, value):
+        # Жалобы на объявления пользователя (ссылка из UserAdmin.in_adabuse)
+        if lookup == 'ad__user__id__exact':
+            return True
+        return super().lookup_allowed(lookup, value)
     fieldsets = (
         (None, {
             'fields': (
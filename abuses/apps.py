@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AbusesConfig(AppConfig):
     name = 'abuses'
+
+    def ready(self):
+        from . import signals  # noqa
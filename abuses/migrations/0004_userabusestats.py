@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('abuses', '0003_auto_20180814_1646'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAbuseStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='abuse_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('in_userabuse', models.PositiveIntegerField(default=0)),
+                ('in_userabuse_confirmed', models.PositiveIntegerField(default=0)),
+                ('out_userabuse', models.PositiveIntegerField(default=0)),
+                ('out_userabuse_confirmed', models.PositiveIntegerField(default=0)),
+                ('in_adabuse', models.PositiveIntegerField(default=0)),
+                ('in_adabuse_confirmed', models.PositiveIntegerField(default=0)),
+                ('out_adabuse', models.PositiveIntegerField(default=0)),
+                ('out_adabuse_confirmed', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'user_abuse_stats',
+            },
+        ),
+    ]
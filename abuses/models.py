@@ -1,5 +1,10 @@
 from django.contrib.gis.db import models
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Count, F, FloatField, Func, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Ln
 from django.utils.functional import cached_property
 from django.template.defaultfilters import truncatewords
 from django.utils.translation import gettext_lazy as _
@@ -7,10 +12,74 @@ from core import models as core_models
 from ads import models as ad_models
 
 
+class AbuseQuerySet(models.QuerySet):
+
+    def confirm(self):
+        """ Подтверждение жалоб. Возвращает id измененных жалоб. """
+        return self._set_confirmed(True)
+
+    def reject(self):
+        return self._set_confirmed(False)
+
+    def _set_confirmed(self, value):
+        with transaction.atomic():
+            abuse_ids = list(self.values_list('pk', flat=True))
+            abuses = self.model.objects.filter(pk__in=abuse_ids)
+            abuses.update(is_confirmed=value)
+            self.model.update_counters(abuses.values(self.model.target_field))
+            schedule_stats_refresh(abuses.stats_user_ids())
+        return abuse_ids
+
+    def pending_groups(self):
+        """
+        Очередь модерации: необработанные жалобы, сгруппированные по
+        объекту жалобы, по убыванию score.
+
+        Вес жалобы - репутация отправителя (доля его подтвержденных
+        жалоб со сглаживанием), score = ln(1 + сумма весов) + время
+        последней жалобы / ABUSES_QUEUE_RECENCY. Score не зависит от
+        текущего времени, поэтому порядок стабилен для keyset-пагинации.
+        """
+        stats = 'sender__abuse_stats__'
+        confirmed = Coalesce(F(f'{stats}out_userabuse_confirmed'), 0) + \
+            Coalesce(F(f'{stats}out_adabuse_confirmed'), 0) + 1
+        total = Coalesce(F(f'{stats}out_userabuse'), 0) + \
+            Coalesce(F(f'{stats}out_adabuse'), 0) + 2
+        reputation = Cast(confirmed, FloatField()) / Cast(total, FloatField())
+        last_epoch = Func(
+            F('last_reported_at'),
+            template='EXTRACT(EPOCH FROM %(expressions)s)',
+            output_field=FloatField()
+        )
+        return self.filter(is_confirmed__isnull=True).order_by().values(
+            self.model.target_field
+        ).annotate(
+            count=Count('pk'),
+            weight=Sum(reputation, output_field=FloatField()),
+            last_reported_at=Max('created_at'),
+            reasons=ArrayAgg('reason', distinct=True),
+        ).annotate(
+            score=Ln(Value(1.0) + F('weight'), output_field=FloatField()) +
+            last_epoch / Value(float(settings.ABUSES_QUEUE_RECENCY))
+        ).order_by('-score', self.model.target_field)
+
+    def stats_user_ids(self):
+        """ Пользователи, чья статистика жалоб зависит от этих жалоб. """
+        user_ids = set()
+        for row in self.values_list(*self.model.stats_user_fields):
+            user_ids.update(row)
+        return user_ids
+
+
 class BaseAbuse(core_models.BaseModel):
     """
     Base abuse model.
     """
+    # Поле объекта жалобы (у которого есть confirmed_abuses_count)
+    target_field = None
+    # Пути к пользователям, в статистике которых учитывается жалоба
+    stats_user_fields = ()
+
     comment = models.CharField(
         max_length=1024, blank=True, null=True, help_text=_('Abuse comment')
     )
@@ -22,6 +91,8 @@ class BaseAbuse(core_models.BaseModel):
     )
     is_confirmed = models.NullBooleanField(help_text=_('Is abuse confirmed'))
 
+    objects = AbuseQuerySet.as_manager()
+
     @cached_property
     def owner(self):
         return self.sender
@@ -29,6 +100,22 @@ class BaseAbuse(core_models.BaseModel):
     class Meta:
         abstract = True
 
+    @classmethod
+    def update_counters(cls, target_ids):
+        """
+        Пересчет confirmed_abuses_count объектов жалоб одним UPDATE
+        (сгруппированный подзапрос по подтвержденным жалобам).
+        """
+        target_model = cls._meta.get_field(cls.target_field).related_model
+        confirmed = cls.objects.filter(
+            is_confirmed=True, **{cls.target_field: OuterRef('pk')}
+        ).order_by().values(cls.target_field).annotate(count=Count('pk')).values('count')
+        return target_model._base_manager.filter(pk__in=target_ids).update(
+            confirmed_abuses_count=Coalesce(
+                Subquery(confirmed, output_field=models.IntegerField()), 0
+            )
+        )
+
     def short_comment(self):
         if self.comment:
             return truncatewords(self.comment, 6)
@@ -58,6 +145,9 @@ class UserAbuse(BaseAbuse):
         get_user_model(), on_delete=models.CASCADE, help_text=_('On user')
     )
 
+    target_field = 'user'
+    stats_user_fields = ('user', 'sender')
+
     class Meta:
         db_table = 'user_abuses'
 
@@ -89,6 +179,9 @@ class AdAbuse(BaseAbuse):
         ad_models.Ad, on_delete=models.CASCADE, help_text=_('On ad')
     )
 
+    target_field = 'ad'
+    stats_user_fields = ('ad__user', 'sender')
+
     class Meta:
         db_table = 'ad_abuses'
 
@@ -98,3 +191,87 @@ class AdAbuse(BaseAbuse):
 
     def __str__(self):
         return f'{self.ad.uuid}: {self.reason}'
+
+
+class UserAbuseStatsManager(models.Manager):
+
+    REFRESH_SQL = """
+        INSERT INTO user_abuse_stats (
+            user_id, in_userabuse, in_userabuse_confirmed,
+            out_userabuse, out_userabuse_confirmed,
+            in_adabuse, in_adabuse_confirmed,
+            out_adabuse, out_adabuse_confirmed, updated_at
+        )
+        SELECT u.id, iu.total, iu.confirmed, ou.total, ou.confirmed,
+               ia.total, ia.confirmed, oa.total, oa.confirmed, now()
+        FROM users u
+        CROSS JOIN LATERAL (
+            SELECT count(*) AS total, count(*) FILTER (WHERE is_confirmed) AS confirmed
+            FROM user_abuses WHERE user_id = u.id
+        ) iu
+        CROSS JOIN LATERAL (
+            SELECT count(*) AS total, count(*) FILTER (WHERE is_confirmed) AS confirmed
+            FROM user_abuses WHERE sender_id = u.id
+        ) ou
+        CROSS JOIN LATERAL (
+            SELECT count(*) AS total, count(*) FILTER (WHERE a.is_confirmed) AS confirmed
+            FROM ad_abuses a JOIN ads ON ads.id = a.ad_id WHERE ads.user_id = u.id
+        ) ia
+        CROSS JOIN LATERAL (
+            SELECT count(*) AS total, count(*) FILTER (WHERE is_confirmed) AS confirmed
+            FROM ad_abuses WHERE sender_id = u.id
+        ) oa
+        WHERE u.id = ANY(%s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            in_userabuse = EXCLUDED.in_userabuse,
+            in_userabuse_confirmed = EXCLUDED.in_userabuse_confirmed,
+            out_userabuse = EXCLUDED.out_userabuse,
+            out_userabuse_confirmed = EXCLUDED.out_userabuse_confirmed,
+            in_adabuse = EXCLUDED.in_adabuse,
+            in_adabuse_confirmed = EXCLUDED.in_adabuse_confirmed,
+            out_adabuse = EXCLUDED.out_adabuse,
+            out_adabuse_confirmed = EXCLUDED.out_adabuse_confirmed,
+            updated_at = EXCLUDED.updated_at
+    """
+
+    def refresh(self, user_ids):
+        """ Пересчет статистики пользователей одним запросом (upsert). """
+        user_ids = [pk for pk in user_ids if pk is not None]
+        if not user_ids:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(self.REFRESH_SQL, [user_ids])
+            return cursor.rowcount
+
+
+class UserAbuseStats(models.Model):
+    """
+    Abuse counters of user (materialised for admin changelist).
+    """
+    user = models.OneToOneField(
+        get_user_model(), primary_key=True, on_delete=models.CASCADE,
+        related_name='abuse_stats'
+    )
+    in_userabuse = models.PositiveIntegerField(default=0)
+    in_userabuse_confirmed = models.PositiveIntegerField(default=0)
+    out_userabuse = models.PositiveIntegerField(default=0)
+    out_userabuse_confirmed = models.PositiveIntegerField(default=0)
+    in_adabuse = models.PositiveIntegerField(default=0)
+    in_adabuse_confirmed = models.PositiveIntegerField(default=0)
+    out_adabuse = models.PositiveIntegerField(default=0)
+    out_adabuse_confirmed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserAbuseStatsManager()
+
+    class Meta:
+        db_table = 'user_abuse_stats'
+
+
+def schedule_stats_refresh(user_ids):
+    """ Пересчет статистики жалоб после коммита транзакции. """
+    from .tasks import refresh_abuse_stats
+
+    user_ids = sorted({pk for pk in user_ids if pk is not None})
+    if user_ids:
+        transaction.on_commit(lambda: refresh_abuse_stats.delay(user_ids))
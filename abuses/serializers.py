@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core import signing
 from rest_framework import serializers
 
 from .models import AdAbuse, UserAbuse
@@ -23,3 +25,60 @@ class AdAbuseSerializer(serializers.ModelSerializer):
     class Meta:
         model = AdAbuse
         fields = ('reason', 'comment', 'ad')
+
+
+class AbuseQueueQueryParamsSerializer(serializers.Serializer):
+    """
+    Query params for moderation queue (keyset pagination).
+    """
+    SALT = 'abuses.queue'
+
+    cursor = serializers.CharField(
+        required=False, help_text='Cursor from previous page.'
+    )
+    limit = serializers.IntegerField(
+        required=False, min_value=1, max_value=settings.MAX_ABUSES_QUEUE_PAGE_SIZE,
+        default=settings.ABUSES_QUEUE_PAGE_SIZE
+    )
+
+    @classmethod
+    def make_cursor(cls, score, target_id):
+        return signing.dumps([score, target_id], salt=cls.SALT)
+
+    def validate_cursor(self, value):
+        """ Курсор превращается в (score, id) последней группы страницы. """
+        try:
+            score, target_id = signing.loads(value, salt=self.SALT)
+            return float(score), int(target_id)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise serializers.ValidationError('Invalid cursor.')
+
+
+class AbuseGroupSerializer(serializers.Serializer):
+    """
+    Group of pending abuses on one target.
+    """
+    target = serializers.SerializerMethodField()
+    count = serializers.IntegerField()
+    weight = serializers.FloatField()
+    score = serializers.FloatField()
+    reasons = serializers.ListField(child=serializers.CharField())
+    last_reported_at = serializers.DateTimeField()
+
+    def get_target(self, obj):
+        target = obj['target']
+        if target is None:
+            return None
+        return self.context['target_serializer_class'](target, context=self.context).data
+
+
+class AbuseGroupActionSerializer(serializers.Serializer):
+    """
+    Confirm or reject all pending abuses of targets.
+    """
+    targets = serializers.ListField(
+        child=serializers.UUIDField(),
+        min_length=1,
+        max_length=settings.MAX_ABUSES_QUEUE_PAGE_SIZE,
+        help_text='UUIDs of abuse targets.'
+    )
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AdAbuse, UserAbuse, schedule_stats_refresh
+
+
+def get_stats_user_ids(abuse):
+    """ Id пользователей по путям stats_user_fields жалобы. """
+    user_ids = []
+    for field in abuse.stats_user_fields:
+        *path, name = field.split('__')
+        obj = abuse
+        for attr in path:
+            obj = getattr(obj, attr)
+        user_ids.append(getattr(obj, f'{name}_id'))
+    return user_ids
+
+
+@receiver(post_save, sender=UserAbuse)
+@receiver(post_save, sender=AdAbuse)
+@receiver(post_delete, sender=UserAbuse)
+@receiver(post_delete, sender=AdAbuse)
+def refresh_abuse_stats(sender, instance, **kwargs):
+    """ Изменение жалобы обновляет статистику затронутых пользователей. """
+    schedule_stats_refresh(get_stats_user_ids(instance))
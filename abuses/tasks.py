@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from .models import UserAbuseStats
+
+
+@shared_task
+def refresh_abuse_stats(user_ids):
+    """
+    Пересчет статистики жалоб указанных пользователей.
+    """
+    return UserAbuseStats.objects.refresh(user_ids)
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models import Q
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from ads.serializers import AdSerializer
+from core import tasks
+from core.permissions import IsAbuseModerator
+from users.serializers import SimpeUserSerializer
+from .models import AdAbuse, UserAbuse
+from .serializers import (
+    AbuseGroupActionSerializer, AbuseGroupSerializer, AbuseQueueQueryParamsSerializer
+)
+
+
+class AbuseQueueViewSet(viewsets.GenericViewSet):
+    """
+    Moderation queue.
+
+    list:
+        Необработанные жалобы, сгруппированные по объекту жалобы
+        и упорядоченные по приоритету (keyset-пагинация по `cursor`).
+    """
+    abuse_model = None
+    notify_task = None
+    target_serializer_class = None
+    target_select_related = ()
+    permission_classes = (permissions.IsAuthenticated, IsAbuseModerator)
+    serializer_class = AbuseGroupSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return self.abuse_model.objects.all()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['target_serializer_class'] = self.target_serializer_class
+        return context
+
+    @swagger_auto_schema(query_serializer=AbuseQueueQueryParamsSerializer)
+    def list(self, request, *args, **kwargs):
+        params = AbuseQueueQueryParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        cursor, limit = params.validated_data.get('cursor'), params.validated_data['limit']
+
+        field = self.abuse_model.target_field
+        groups = self.get_queryset().pending_groups()
+        if cursor:
+            score, target_id = cursor
+            groups = groups.filter(Q(score__lt=score) | Q(score=score, **{f'{field}__gt': target_id}))
+        groups = list(groups[:limit + 1])
+
+        next_url = None
+        if len(groups) > limit:
+            groups = groups[:limit]
+            last = groups[-1]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor',
+                AbuseQueueQueryParamsSerializer.make_cursor(last['score'], last[field])
+            )
+
+        # Объекты жалоб одним запросом со всеми связанными данными
+        target_model = self.abuse_model._meta.get_field(field).related_model
+        targets = target_model._base_manager.select_related(
+            *self.target_select_related
+        ).in_bulk([group[field] for group in groups])
+        for group in groups:
+            group['target'] = targets.get(group[field])
+
+        serializer = self.get_serializer(groups, many=True)
+        return Response({'next': next_url, 'results': serializer.data})
+
+    @swagger_auto_schema(
+        request_body=AbuseGroupActionSerializer,
+        responses={200: 'Number of confirmed abuses.'}
+    )
+    @action(methods=['post'], detail=False, serializer_class=AbuseGroupActionSerializer)
+    def confirm(self, request, *args, **kwargs):
+        """ Подтверждение всех необработанных жалоб на объекты. """
+        abuse_ids = self._get_pending(request).confirm()
+        transaction.on_commit(lambda: self.notify_task.delay(abuse_ids))
+        return Response({'confirmed': len(abuse_ids)}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        request_body=AbuseGroupActionSerializer,
+        responses={200: 'Number of rejected abuses.'}
+    )
+    @action(methods=['post'], detail=False, serializer_class=AbuseGroupActionSerializer)
+    def reject(self, request, *args, **kwargs):
+        """ Отклонение всех необработанных жалоб на объекты. """
+        abuse_ids = self._get_pending(request).reject()
+        return Response({'rejected': len(abuse_ids)}, status=status.HTTP_200_OK)
+
+    def _get_pending(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.get_queryset().filter(is_confirmed__isnull=True, **{
+            f'{self.abuse_model.target_field}__uuid__in': serializer.validated_data['targets']
+        })
+
+
+class UserAbuseQueueViewSet(AbuseQueueViewSet):
+    abuse_model = UserAbuse
+    notify_task = tasks.notify_and_block_user
+    target_serializer_class = SimpeUserSerializer
+
+
+class AdAbuseQueueViewSet(AbuseQueueViewSet):
+    abuse_model = AdAbuse
+    notify_task = tasks.notify_and_block_ad
+    target_serializer_class = AdSerializer
+    target_select_related = ('user',)
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0019_auto_20190122_1435'),
+        ('abuses', '0003_auto_20180814_1646'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='confirmed_abuses_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of confirmed abuses.'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE ads SET confirmed_abuses_count = confirmed.count
+            FROM (
+                SELECT ad_id, count(*) AS count FROM ad_abuses
+                WHERE is_confirmed GROUP BY ad_id
+            ) AS confirmed
+            WHERE ads.id = confirmed.ad_id
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -80,6 +80,9 @@ class Ad(BaseModel):
     is_blocked = models.BooleanField(
         default=False, help_text=_('Is blocked by moderator')
     )
+    confirmed_abuses_count = models.PositiveIntegerField(
+        default=0, editable=False, help_text=_('Number of confirmed abuses.')
+    )
 
     objects = AdManager()
 
@@ -5,6 +5,7 @@ from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
 from core.fields import ArrayToggleField, TimestampField, TimestampRangeField
 from core.serializers import validate_toggle_field
+from core.utils import get_field_value
 from users.serializers import SimpeUserSerializer
 
 from .models import Ad
@@ -79,6 +80,18 @@ class AdMapQueryParamsSerializer(AdCollectionQueryParamsSerializer):
         default=11,
         min_value=1, max_value=21, help_text=_('Zoom level (from 1 to 20).')
     )
+    state = serializers.CharField(
+        required=False,
+        help_text=_('Map state token from previous response (viewport delta).')
+    )
+    compact = serializers.BooleanField(
+        required=False, default=False,
+        help_text=_('Compact output: rounded coordinates, no empty and cluster filler fields.')
+    )
+    columnar = serializers.BooleanField(
+        required=False, default=False,
+        help_text=_('Compact output with properties in columns (with compact only).')
+    )
 
 
 class AdMapCollectionSerializer(GeoFeatureModelSerializer):
@@ -108,20 +121,19 @@ class AdMapCollectionSerializer(GeoFeatureModelSerializer):
             'point': {'required': True}
         }
 
+    # Колонки строк values(), которые читают методы (core.fastserializers)
+    row_fields = ('ages',)
+
     @staticmethod
     def get_desired_age(obj):
-        if isinstance(obj, dict):
-            if obj.get('ages'):
-                return obj['ages'].lower, obj['ages'].upper
-        else:
-            return obj.ages.lower, obj.ages.upper
+        ages = get_field_value(obj, 'ages')
+        if ages is not None:
+            return ages.lower, ages.upper
 
     @staticmethod
     def get_is_cluster(obj) -> bool:
-        """ Признак кластера точек. """
-        if isinstance(obj, dict) and obj['title'].startswith('Cluster'):
-            return True
-        return False
+        """ Признак кластера точек (колонка is_cluster строк DBSCAN). """
+        return bool(get_field_value(obj, 'is_cluster', False))
 
 
 class AdListCollectionSerializer(AdMapCollectionSerializer):
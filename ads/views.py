@@ -6,13 +6,19 @@ from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework_gis.filters import DistanceToPointFilter, InBBoxFilter
 from rest_framework_gis.pagination import GeoJsonPagination
 
 from abuses.serializers import AdAbuseSerializer
-from core.utils import (fix_rawsql_helper, get_best_minpoints_dbscan,
-                        get_meter_per_pixel, get_rows_from_cursor)
+from core.filters import BlockedUsersFilter
+from core.mixins import (FastSerializerMixin, VectorTileMixin,
+                         ViewportDeltaMixin)
+from core.renderers import MVTRenderer
+from core.utils import (compact_geojson, fix_rawsql_helper,
+                        get_best_minpoints_dbscan, get_meter_per_pixel,
+                        get_rows_from_cursor)
 # from core.filters import DistanceToPointFilter
 from core.viewsets import CustomModelViewSet
 
@@ -24,7 +30,8 @@ from .serializers import (AdCollectionQueryParamsSerializer,
                           AdMapQueryParamsSerializer, AdSerializer)
 
 
-class AdViewSet(CustomModelViewSet):
+class AdViewSet(FastSerializerMixin, VectorTileMixin, ViewportDeltaMixin,
+                CustomModelViewSet):
     """
     list:
         Return all active ads.
@@ -44,9 +51,14 @@ class AdViewSet(CustomModelViewSet):
     distance_filter_convert_meters = True
     bbox_filter_field = 'point'
     bbox_filter_include_overlapping = True
-    filter_backends = (InBBoxFilter, DistanceToPointFilter, DjangoFilterBackend,)
+    filter_backends = (
+        InBBoxFilter, DistanceToPointFilter, DjangoFilterBackend, BlockedUsersFilter,
+    )
     filterset_class = AdFilter
     http_method_names = ('get', 'post', 'patch', 'delete',)
+    tile_layer = 'ads'
+    tile_geom_field = 'point'
+    tile_properties = ('uuid', 'type', 'sex', 'title')
 
     def retrieve(self, request, *args, **kwargs):
         user_uuid = str(request.user.uuid)
@@ -78,7 +90,11 @@ class AdViewSet(CustomModelViewSet):
         query_serializer=AdCollectionQueryParamsSerializer, responses={200: ''}
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        queryset = self.get_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_rows(page))
+        return Response(self.serialize_rows(queryset))
 
     @swagger_auto_schema(responses={201: ''})
     def create(self, request, *args, **kwargs):
@@ -158,14 +174,15 @@ class AdViewSet(CustomModelViewSet):
         query_serializer.is_valid(raise_exception=True)
         zoom = query_serializer.validated_data.get('zoom')
 
-        queryset = self.get_queryset()
-        queryset = self.filter_queryset(queryset)
+        queryset = self.filter_queryset(self.get_queryset())
         points_count = queryset.count()
         meter_pixel = get_meter_per_pixel(zoom)
 
         # При определенном зуме кластеризация не применяется
         if zoom >= 20 or points_count < 3:
-            serializer = self.get_serializer(queryset, many=True)
+            # При сдвиге карты с токеном state - только изменения
+            queryset, removed, ids = self.get_viewport_delta(queryset)
+            data = self.viewport_response_data(self.serialize_rows(self.get_rows(queryset)), removed, ids)
 
         else:
             # Запрос сырого SQL через курсор
@@ -182,9 +199,25 @@ class AdViewSet(CustomModelViewSet):
                     row['point'] = GEOSGeometry(row['point'])
                     # row['uuid'] = str(row['uuid'])
 
-                serializer = self.get_serializer(data, many=True)
+                data = self.serialize_rows(data)
 
-        return Response(serializer.data)
+        if query_serializer.validated_data['compact']:
+            data = compact_geojson(
+                data, zoom, columnar=query_serializer.validated_data['columnar']
+            )
+        return Response(data)
+
+    @swagger_auto_schema(responses={200: 'Mapbox Vector Tile.'})
+    @action(methods=['get'], detail=False,
+            url_path=r'tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt', url_name='tiles',
+            renderer_classes=(MVTRenderer, JSONRenderer))
+    def tiles(self, request, z, x, y, *args, **kwargs):
+        """
+        Векторный тайл предложений (кластеры на мелких зумах).
+        """
+        return self.tile_response(
+            request, lambda: self.filter_queryset(self.get_queryset()), z, x, y
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0006_remove_contact_is_blocked'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['holder', 'updated_at'], name='contacts_holder_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['holder', 'deleted_at'], name='contacts_holder_deleted_idx'),
+        ),
+    ]
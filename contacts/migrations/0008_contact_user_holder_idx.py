@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0007_contact_sync_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'holder'], name='contacts_user_holder_idx'),
+        ),
+    ]
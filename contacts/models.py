@@ -1,12 +1,58 @@
 from django import forms
 from django.db import models
+from django.db.models import Count
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
+from core.managers import CustomManager
 from core.models import BaseModel
 
 
+class ContactManager(CustomManager):
+    """
+    Удаленные контакты остаются в базе (для синхронизации),
+    но по умолчанию не видны.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at=None)
+
+    def add(self, holder, user_ids, **fields):
+        """ Добавление в контакты с восстановлением удаленных ранее. """
+        self.model.all_objects.filter(
+            holder=holder, user_id__in=user_ids, deleted_at__isnull=False
+        ).update(
+            deleted_at=None,
+            updated_at=timezone.now(),
+            is_favorite=False,
+            is_from_app=fields.get('is_from_app', False)
+        )
+        self.bulk_create([
+            self.model(holder=holder, user_id=user_id, **fields)
+            for user_id in user_ids
+        ], ignore_conflicts=True)
+
+    def followers(self, user):
+        """ Id пользователей, у которых user есть в контактах. """
+        return self.filter(user=user).order_by().values('holder_id')
+
+    def mutual(self, holder, user):
+        """ Id общих контактов двух пользователей. """
+        return self.filter(
+            holder=user,
+            user_id__in=self.filter(holder=holder).order_by().values('user_id')
+        ).order_by().values('user_id')
+
+    def mutual_counts(self, holder, user_ids):
+        """ Количество общих контактов с holder для списка пользователей. """
+        counts = self.filter(
+            holder_id__in=user_ids,
+            user_id__in=self.filter(holder=holder).order_by().values('user_id')
+        ).order_by().values('holder_id').annotate(count=Count('pk'))
+        return {row['holder_id']: row['count'] for row in counts}
+
+
 class Contact(BaseModel):
     """
     Модель списка контак-листа для пользователя.
@@ -31,9 +77,22 @@ class Contact(BaseModel):
         help_text='Contact added from application.'
     )
 
+    objects = ContactManager()
+    all_objects = CustomManager()
+
     class Meta:
         unique_together = ('holder', 'user',)
         ordering = ('is_favorite', 'updated_at',)
+        indexes = [
+            models.Index(fields=['holder', 'updated_at'], name='contacts_holder_updated_idx'),
+            models.Index(fields=['holder', 'deleted_at'], name='contacts_holder_deleted_idx'),
+            # Обратный поиск: у кого пользователь в контактах
+            models.Index(
+                fields=['user', 'holder'],
+                name='contacts_user_holder_idx',
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} contact of {self.holder}'
@@ -45,6 +104,11 @@ class Contact(BaseModel):
     def owner(self):
         return self.holder
 
+    def delete(self, *args, **kwargs):
+        """ Оставляем запись для синхронизации удаления на клиентах. """
+        self.deleted_at = timezone.now()
+        self.save(update_fields=('deleted_at', 'updated_at'))
+
     def clean(self):
         """ Валидация модели целиком. """
         if self.cleaned_data['user'] == self.cleaned_data['contact']:
@@ -1,3 +1,6 @@
+from datetime import datetime, timezone
+
+from django.core import signing
 from rest_framework import serializers
 
 from users.serializers import UserSerializer, InitialSerializer
@@ -30,3 +33,27 @@ class ContactUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = ('is_favorite',)
+
+
+class ContactSyncQueryParamsSerializer(serializers.Serializer):
+    """
+    Query params for contact list delta sync.
+    """
+    SALT = 'contacts.sync'
+
+    token = serializers.CharField(
+        required=False,
+        help_text='Sync token from previous response (omit for full sync).'
+    )
+
+    @classmethod
+    def make_token(cls, timestamp):
+        return signing.dumps(timestamp.timestamp(), salt=cls.SALT)
+
+    def validate_token(self, value):
+        """ Токен превращается во время предыдущей синхронизации. """
+        try:
+            timestamp = signing.loads(value, salt=self.SALT)
+            return datetime.fromtimestamp(float(timestamp), tz=timezone.utc)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise serializers.ValidationError('Invalid sync token.')
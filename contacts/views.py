@@ -1,11 +1,15 @@
+import json
 import uuid
+from datetime import timedelta
+from itertools import islice
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import mixins, status, viewsets
@@ -15,8 +19,11 @@ from rest_framework.response import Response
 
 from core.serializers import EmptySerializer
 from core.permissions import OnlyOwnerAllowedEdit
+from core.utils import normalize_phone
+from users.serializers import SimpeUserSerializer
 from .serializers import (
-    ContactSerializer, ContactImportSerializer, ContactUpdateSerializer
+    ContactSerializer, ContactImportSerializer, ContactUpdateSerializer,
+    ContactSyncQueryParamsSerializer
 )
 from .filters import ContactFilter
 from .models import Contact
@@ -32,6 +39,9 @@ class ContactViewSet(mixins.ListModelMixin,
     destroy:
         Удаляет пользователя из списка контактов по его UUID.
     """
+    # Перекрытие окна синхронизации на случай долгих транзакций
+    SYNC_OVERLAP = timedelta(seconds=5)
+
     lookup_field = 'user__uuid'
     lookup_url_kwarg = 'uuid'
     queryset = Contact.objects.all()
@@ -46,6 +56,8 @@ class ContactViewSet(mixins.ListModelMixin,
         """
         if self.action == 'importing':
             return ContactImportSerializer
+        elif self.action == 'followers':
+            return SimpeUserSerializer
         elif self.action in ('update', 'partial_update',):
             return ContactUpdateSerializer
         else:
@@ -64,7 +76,7 @@ class ContactViewSet(mixins.ListModelMixin,
             self.get_object()
         except Http404:
             user = get_object_or_404(get_user_model(), uuid=kwargs['uuid'])
-            request.user.contacts.create(user=user)
+            Contact.objects.add(request.user, [user.pk])
 
         return super().update(request, *args, **kwargs)
 
@@ -96,12 +108,81 @@ class ContactViewSet(mixins.ListModelMixin,
         )
 
         # ... и пихаем всех найденых в свои контакты
-        Contact.objects.bulk_create([
-            Contact(holder=request.user, user=contact) for contact in users
-        ])
+        Contact.objects.add(request.user, [user.pk for user in users])
 
         return Response(status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        request_body=EmptySerializer,
+        responses={
+            200: 'Matched contacts as NDJSON stream (one line per chunk).',
+        }
+    )
+    @action(methods=['post'], detail=False, url_path=r'import/stream', url_name='import-stream')
+    def import_stream(self, request, *args, **kwargs):
+        """
+        Импорт адресной книги любого размера.
+
+        Тело запроса - по одному номеру на строку (строка с номером или
+        JSON-объект {"phone": ...}). Номера обрабатываются пачками,
+        найденные пользователи отдаются сразу после каждой пачки.
+        """
+        phones = self._read_phones(request.stream or [])
+        return StreamingHttpResponse(
+            self._import_chunks(request.user, phones),
+            content_type='application/x-ndjson'
+        )
+
+    @staticmethod
+    def _read_phones(stream):
+        """ Номера из тела запроса, приведенные к E.164 (None для мусора). """
+        for line in stream:
+            line = line.decode('utf-8', 'ignore').strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    line = json.loads(line).get('phone', '')
+                except (AttributeError, ValueError):
+                    line = ''
+            yield normalize_phone(line)
+
+    @staticmethod
+    def _import_chunks(holder, phones):
+        """ Сопоставление номеров пачками и добавление найденных в контакты. """
+        processed = invalid = 0
+        seen = set()  # Найденные в предыдущих пачках
+        while True:
+            chunk = list(islice(phones, settings.CONTACTS_IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            processed += len(chunk)
+            valid = set(filter(None, chunk))
+            invalid += len(chunk) - sum(1 for phone in chunk if phone)
+
+            users = get_user_model().objects \
+                .filter(username__in=valid) \
+                .exclude(pk__in=seen | {holder.pk}) \
+                .values_list('pk', 'uuid', 'username')
+            users = list(users)
+            Contact.objects.add(holder, [pk for pk, _, _ in users])
+            seen.update(pk for pk, _, _ in users)
+
+            yield json.dumps({
+                'processed': processed,
+                'contacts': [
+                    {'phone': phone, 'uuid': str(user_uuid)}
+                    for _, user_uuid, phone in users
+                ],
+            }) + '\n'
+
+        yield json.dumps({
+            'processed': processed,
+            'matched': len(seen),
+            'invalid': invalid,
+            'done': True,
+        }) + '\n'
+
     @swagger_auto_schema(
         request_body=EmptySerializer,
         responses={
@@ -114,15 +195,68 @@ class ContactViewSet(mixins.ListModelMixin,
         """ Добавляет зарегистрированного пользователя в контакт-лист. """
         try:
             uuid.UUID(kwargs.get('uuid'))
-            assert Contact.objects.create(
-                holder=request.user,
-                user=get_user_model().objects.get(uuid=kwargs['uuid']),
-                is_from_app=True
-            )
-        except (IntegrityError, ValueError, AssertionError):
+            user = get_user_model().objects.get(uuid=kwargs['uuid'])
+        except ValueError:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
         except ObjectDoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+        if user == request.user or self.get_queryset().filter(user=user).exists():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        Contact.objects.add(request.user, [user.pk], is_from_app=True)
         return Response(status=status.HTTP_201_CREATED)
+
+    @action(methods=['get'], detail=False)
+    def followers(self, request, *args, **kwargs):
+        """ Пользователи, у которых текущий пользователь есть в контактах. """
+        queryset = get_user_model().objects.filter(
+            pk__in=Contact.objects.followers(request.user),
+            is_active=True
+        ).order_by('pk')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @swagger_auto_schema(
+        query_serializer=ContactSyncQueryParamsSerializer,
+        responses={
+            200: 'Changed contacts, removed user UUIDs and new sync token.',
+            400: 'Invalid sync token.',
+        }
+    )
+    @action(methods=['get'], detail=False)
+    def sync(self, request, *args, **kwargs):
+        """
+        Дельта-синхронизация контакт-листа.
+
+        Без токена возвращает весь список. С токеном - только контакты,
+        добавленные или измененные (включая профиль пользователя) с момента
+        предыдущей синхронизации, и UUID удаленных из списка.
+        """
+        query_serializer = ContactSyncQueryParamsSerializer(data=request.GET)
+        query_serializer.is_valid(raise_exception=True)
+        since = query_serializer.validated_data.get('token')
+        now = timezone.now()
+
+        contacts = self.filter_queryset(self.get_queryset()).select_related('user')
+        removed = []
+        if since:
+            since -= self.SYNC_OVERLAP
+            contacts = contacts.filter(
+                Q(updated_at__gt=since) | Q(user__updated_at__gt=since)
+            )
+            removed = Contact.all_objects.filter(
+                holder=request.user.pk, deleted_at__gt=since
+            ).values_list('user__uuid', flat=True)
+
+        return Response({
+            'token': ContactSyncQueryParamsSerializer.make_token(now),
+            'contacts': self.get_serializer(contacts, many=True).data,
+            'removed': [str(user_uuid) for user_uuid in removed],
+        })
@@ -0,0 +1,101 @@
+"""
+HTTP response compression: brotli and gzip.
+
+Encoding is negotiated by Accept-Encoding with server preference (br over
+gzip). Compression level depends on the content type (COMPRESSION_LEVELS),
+repeatable responses (COMPRESSION_CACHE_PATHS) are compressed once with
+the maximum level and cached by content hash.
+"""
+import hashlib
+import re
+import zlib
+
+import brotli
+from django.conf import settings
+from django.core.cache import cache
+
+ENCODINGS = ('br', 'gzip')
+
+
+class BrotliCompressor:
+    """ Brotli с интерфейсом zlib.compressobj. """
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self, mode=zlib.Z_FINISH):
+        if mode == zlib.Z_FINISH:
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def get_compressor(encoding, level):
+    if encoding == 'br':
+        return BrotliCompressor(level)
+    # wbits=31 - формат gzip (заголовок и контрольная сумма)
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def compress(data, encoding, level):
+    compressor = get_compressor(encoding, level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_sequence(chunks, encoding, level):
+    """ Потоковое сжатие: каждый чанк отдается клиенту сразу. """
+    compressor = get_compressor(encoding, level)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_cached(data, encoding, level):
+    """ Сжатие с кешем по хешу содержимого (для повторяющихся ответов). """
+    key = f'compression:{encoding}:{level}:{hashlib.sha1(data).hexdigest()}'
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(data, encoding, level)
+        cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+    return compressed
+
+
+def parse_accept_encoding(header):
+    """ Кодировки из Accept-Encoding с их весами (q). """
+    accepted = {}
+    for item in header.split(','):
+        name, *params = [part.strip() for part in item.split(';')]
+        if not name:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        accepted[name.lower()] = weight
+    return accepted
+
+
+def negotiate(header):
+    """ Поддерживаемая сервером кодировка, принимаемая клиентом, или None. """
+    accepted = parse_accept_encoding(header)
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def get_levels(content_type):
+    """ Уровни сжатия по кодировкам для типа содержимого (без параметров). """
+    media_type = content_type.split(';')[0].strip().lower()
+    return settings.COMPRESSION_LEVELS.get(media_type)
+
+
+def is_cached_path(path):
+    return any(re.search(pattern, path) for pattern in settings.COMPRESSION_CACHE_PATHS)
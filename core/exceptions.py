@@ -4,3 +4,7 @@ class LimonBaseException(Exception):
 
 class RemoteAPIError(LimonBaseException):
     """ Ошибка удаленного API. """
+
+
+class TranscodingError(LimonBaseException):
+    """ Ошибка транскодирования медиафайла. """
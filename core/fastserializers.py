@@ -0,0 +1,204 @@
+"""
+Compiled read-only serialization of values() rows.
+
+DRF resolves every field of every row through get_attribute and
+to_representation. For the read-only map and list endpoints the field
+list is known in advance, so CompiledSerializer builds a plan once per
+serializer class. It has direct row lookups and specialised converters,
+and falls back to the field's to_representation for anything else.
+Output is the same as serializer_class(instance, many=True).data.
+
+Method fields call the serializer's get_<field> with the row (dict), so
+these methods must accept both instances and rows (core.utils.
+get_field_value); row_fields lists the columns they read. Fields that are
+not model fields (geom_count of DBSCAN rows) are selected only when the
+queryset annotates them, otherwise the field default is used.
+"""
+from functools import lru_cache
+from time import mktime
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework_gis.serializers import GeoFeatureModelSerializer
+
+from .fields import TimestampField
+
+
+def timestamp(value):
+    """ То же, что value.strftime('%s') (локальное время без форматирования). """
+    return str(int(mktime(value.timetuple()))) if value else value
+
+
+def boolean(field):
+    def convert(value):
+        if value is True or value is False:
+            return value
+        return field.to_representation(value)
+    return convert
+
+
+def is_model_field(model, attrs):
+    """ Путь source_attrs ведет к полю модели (его можно выбрать через values()). """
+    for attr in attrs:
+        if model is None:
+            return False
+        try:
+            model = model._meta.get_field(attr).related_model
+        except FieldDoesNotExist:
+            return False
+    return True
+
+
+def get_converter(field):
+    """ Преобразование значения (не None) поля в примитив. """
+    field_type = type(field)
+    if field_type is serializers.UUIDField and field.uuid_format == 'hex_verbose':
+        return str
+    if field_type is serializers.CharField:
+        return str
+    if field_type is serializers.IntegerField:
+        return int
+    if field_type is serializers.BooleanField:
+        return boolean(field)
+    if isinstance(field, TimestampField):
+        return timestamp
+    return field.to_representation
+
+
+class CompiledSerializer:
+    """
+    План сериализации строк (словарей) для класса сериализатора.
+
+    columns - ключи строк, которые нужно выбрать через values(),
+    optional_columns - ключи вне модели (выбираются из аннотаций).
+    """
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        serializer = serializer_class()
+        meta = serializer.Meta
+        self.model = meta.model
+        self.is_geo = isinstance(serializer, GeoFeatureModelSerializer)
+        self.id_field = getattr(meta, 'id_field', None) if self.is_geo else None
+        self.geo_field = meta.geo_field if self.is_geo else None
+        if self.is_geo and (meta.auto_bbox or meta.bbox_geo_field):
+            raise ImproperlyConfigured('Compiled serializers do not support bbox.')
+
+        self.pk_column = self.model._meta.pk.attname
+        columns = [self.pk_column, *getattr(serializer_class, 'row_fields', ())]
+        self.optional_columns = ()
+        self.plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            plan, field_columns = self.compile_field(name, field)
+            self.plan.append(plan)
+            columns.extend(field_columns)
+        self.columns = tuple(dict.fromkeys(columns))
+
+    def compile_field(self, name, field):
+        """ (имя, вид, ключ, параметр) и нужные полю колонки. """
+        if isinstance(field, serializers.SerializerMethodField):
+            return (name, 'method', None, field.method_name), ()
+        key = '__'.join(field.source_attrs)
+        if isinstance(field, serializers.ListSerializer):
+            raise ImproperlyConfigured(f'Nested list field {name} is not supported.')
+        if isinstance(field, serializers.BaseSerializer):
+            nested = compile_serializer(type(field))
+            return (name, 'nested', key, nested), [f'{key}__{column}' for column in nested.columns]
+        if not is_model_field(self.model, field.source_attrs):
+            self.optional_columns += (key,)
+            return (name, 'optional', key, field), ()
+        return (name, 'value', key, field), (key,)
+
+    def get_columns(self, queryset):
+        """ Колонки для queryset.values(): с ключами вне модели из аннотаций. """
+        annotations = queryset.query.annotations
+        return self.columns + tuple(key for key in self.optional_columns if key in annotations)
+
+    def bind(self, context):
+        """ Функции row -> значение поля для одного вызова (с контекстом). """
+        serializer = self.serializer_class(context=context or {})
+        getters = []
+        for name, kind, key, param in self.plan:
+            if kind == 'method':
+                getters.append((name, getattr(serializer, param)))
+            elif kind == 'nested':
+                getters.append((name, self.nested_getter(key, param, context)))
+            elif kind == 'optional':
+                getters.append((name, self.optional_getter(key, param)))
+            elif name == self.geo_field:
+                getters.append((name, self.value_getter(key, param.to_representation, True)))
+            else:
+                getters.append((name, self.value_getter(key, get_converter(param))))
+        return getters
+
+    @staticmethod
+    def value_getter(key, convert, convert_none=False):
+        def get(row):
+            value = row[key]
+            if value is None and not convert_none:
+                return None
+            return convert(value)
+        return get
+
+    @staticmethod
+    def optional_getter(key, field):
+        """ Значение из строки курсора/аннотации, иначе default поля. """
+        convert = get_converter(field)
+        default = None
+        if field.default is not serializers.empty:
+            default = field.to_representation(field.get_default())
+
+        def get(row):
+            if key not in row:
+                return default
+            value = row[key]
+            return None if value is None else convert(value)
+        return get
+
+    @staticmethod
+    def nested_getter(key, nested, context):
+        prefix = f'{key}__'
+        to_dict = nested.row_converter(context)
+
+        def get(row):
+            if row[prefix + nested.pk_column] is None:
+                return None
+            return to_dict({column: row[prefix + column] for column in nested.columns})
+        return get
+
+    def row_converter(self, context=None):
+        """ Функция row -> представление (feature для GeoJSON). """
+        getters = self.bind(context)
+        if not self.is_geo:
+            def to_dict(row):
+                return {name: get(row) for name, get in getters}
+            return to_dict
+
+        geometry = dict(getters).pop(self.geo_field)
+        identifier = dict(getters).get(self.id_field)
+        properties = [
+            (name, get) for name, get in getters if name not in (self.geo_field, self.id_field)
+        ]
+
+        def to_feature(row):
+            feature = {'id': identifier(row)} if identifier else {}
+            feature['type'] = 'Feature'
+            feature['geometry'] = geometry(row)
+            feature['properties'] = {name: get(row) for name, get in properties}
+            return feature
+        return to_feature
+
+    def data(self, rows, context=None):
+        """ Аналог serializer_class(rows, many=True).data. """
+        to_representation = self.row_converter(context)
+        items = [to_representation(row) for row in rows]
+        if self.is_geo:
+            return {'type': 'FeatureCollection', 'features': items}
+        return items
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    """ Скомпилированный сериализатор (один на класс в процессе). """
+    return CompiledSerializer(serializer_class)
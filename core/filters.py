@@ -2,10 +2,14 @@ import datetime
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models.expressions import RawSQL
 from django_filters import ChoiceFilter, FilterSet
 from rest_framework.filters import BaseFilterBackend
 from rest_framework_gis.filters import \
     DistanceToPointFilter as BaseDistanceToPointFilter
+from taggit.models import Tag
+
+from core.utils import years_ago
 
 
 class SexFilter(FilterSet):
@@ -19,20 +23,68 @@ class SexFilter(FilterSet):
         fields = ('sex',)
 
 
+class BlockedUsersFilter(BaseFilterBackend):
+    """
+    Исключение пользователей, заблокированных текущим или заблокировавших его.
+
+    Поле с пользователем задается во вьюхе атрибутом `blocked_users_filter_field`.
+    """
+    def filter_queryset(self, request, queryset, view):
+        if not request.user.is_authenticated:
+            return queryset
+
+        block_set = request.user.get_block_set()
+        if block_set:
+            field = getattr(view, 'blocked_users_filter_field', 'user')
+            queryset = queryset.exclude(**{f'{field}__in': sorted(block_set)})
+        return queryset
+
+
 class InterestsFilter(BaseFilterBackend):
     """
-    Фильтр по интересам.
+    Фильтр по интересам (по индексу interest_ids).
+
+    interests_match=any (по умолчанию) - хотя бы один из интересов,
+    interests_match=all - все интересы. При `interests_filter_rank`
+    у вьюхи результаты ранжируются по количеству совпавших интересов.
     """
+    interests_param = 'interests'
+    match_param = 'interests_match'
+
     def filter_queryset(self, request, queryset, view):
-        interests = request.query_params.getlist('interests')
-        if interests:
-            queryset = queryset.filter(interests__name__in=interests).distinct()
+        names = [
+            name.strip()
+            for value in request.query_params.getlist(self.interests_param)
+            for name in value.split(',') if name.strip()
+        ]
+        if not names:
+            return queryset
+
+        tag_ids = sorted(Tag.objects.filter(name__in=names).values_list('pk', flat=True))
+        match = request.query_params.get(self.match_param, 'any')
+        if not tag_ids or (match == 'all' and len(tag_ids) < len(set(names))):
+            return queryset.none()
+
+        if match == 'all':
+            queryset = queryset.filter(interest_ids__contains=tag_ids)
+        else:
+            queryset = queryset.filter(interest_ids__overlap=tag_ids)
+
+        if getattr(view, 'interests_filter_rank', False):
+            column = f'"{queryset.model._meta.db_table}"."interest_ids"'
+            queryset = queryset.annotate(interests_score=RawSQL(
+                f'SELECT COUNT(*) FROM unnest({column}) AS tag_id WHERE tag_id = ANY(%s)',
+                (tag_ids,)
+            )).order_by('-interests_score', 'pk')
         return queryset
 
 
 class BirthDateFilter(BaseFilterBackend):
     """
     Фильтр по возрасту.
+
+    Возраст переводится в точный диапазон дат рождения, который
+    обслуживается индексом (sex, birth_date).
     """
     age_param = 'age'
     date_param = 'birth_date'
@@ -44,49 +96,37 @@ class BirthDateFilter(BaseFilterBackend):
         if not age:
             return queryset
 
-        age_from, age_to = self.get_filter_params(age)
-        date_range = {f'{self.date_param}__range': [age_from, age_to]}
+        date_from, date_to = self.get_filter_params(age)
+        date_range = {f'{self.date_param}__range': [date_from, date_to]}
         queryset = queryset.filter(**date_range)
 
         return queryset
 
-    def get_filter_params(self, param):
+    def get_age_range(self, param):
+        """ Границы возраста из строки вида "20-30" или "20". """
         ages = [x.strip() for x in param.split('-')]
+        try:
+            age_from = int(ages[0])
+        except ValueError:
+            age_from = self.default_from
+
         if len(ages) == 1:
-            age_to = self.default_to
+            age_to = max(self.default_to, age_from)
         else:
             try:
-                age_to = int(ages[0])
+                age_to = int(ages[-1])
             except ValueError:
                 age_to = self.default_to
 
-        try:
-            age_from = int(ages[-1])
-        except ValueError:
-            age_from = self.default_from
-
-        age_to = self.age_to_date(age_to)
-        age_from = self.age_to_date(age_from)
-        return age_from, age_to
+        return min(age_from, age_to), max(age_from, age_to)
 
-    def age_to_date(self, age):
+    def get_filter_params(self, param):
+        """ Диапазон дат рождения (включительно) для диапазона возраста. """
+        age_from, age_to = self.get_age_range(param)
         today = datetime.date.today()
-        try:
-            value = datetime.date(
-                year=today.year - age,
-                month=today.month,
-                day=today.day
-            )
-        except ValueError:
-            # 29 Feb
-            yesterday = today - datetime.timedelta(days=1)
-            value = datetime.date(
-                year=yesterday.year - age,
-                month=yesterday.month,
-                day=yesterday.day
-            )
-
-        return value
+        date_from = years_ago(age_to + 1, today) + datetime.timedelta(days=1)
+        date_to = years_ago(age_from, today)
+        return date_from, date_to
 
 
 # class DistanceToPointFilter(BaseDistanceToPointFilter):
@@ -0,0 +1,31 @@
+"""
+Cooperative psycopg2 under gevent (gunicorn -k gevent).
+
+libpq blocks the whole process while it waits for the server. With
+a wait callback psycopg2 polls the connection and yields to the gevent
+hub instead, like psycogreen does.
+"""
+import psycopg2
+from psycopg2 import extensions
+
+
+def gevent_wait_callback(conn, timeout=None):
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f'Bad result from poll: {state!r}')
+
+
+def make_psycopg_green():
+    """ Установка wait callback (до первого соединения с базой). """
+    if not hasattr(extensions, 'set_wait_callback'):  # pragma: no cover
+        raise ImportError('Support for coroutines is available only from psycopg2 2.2.')
+    extensions.set_wait_callback(gevent_wait_callback)
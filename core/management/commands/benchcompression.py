@@ -0,0 +1,66 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.test import Client
+from rest_framework_jwt.settings import api_settings
+
+from core import compression
+
+DEFAULT_URLS = (
+    '/v2/ads/map/?zoom=11',
+    '/v2/ads/map/?zoom=16',
+    '/v2/users/who_list/?radius=250000&page_size=100',
+)
+
+
+class Command(BaseCommand):
+    """ Measure response compression CPU cost and size savings. """
+    help = 'Benchmark gzip/brotli levels on real API responses (ads/map, users/who_list).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*', default=DEFAULT_URLS,
+            help='API paths with query string'
+        )
+        parser.add_argument(
+            '-u', '--user', dest='username',
+            help='Username of requesting user (first user with location by default)'
+        )
+        parser.add_argument(
+            '-r', '--repeat', dest='repeat', type=int, default=20,
+            help='Compressions per level'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(location__isnull=False)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.first()
+        if user is None:
+            raise CommandError('No users with location, run filldb first.')
+
+        token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(user))
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_ACCEPT_ENCODING='identity')
+
+        for url in options['urls']:
+            response = client.get(url)
+            if response.status_code != 200:
+                self.stderr.write(f'{url}: HTTP {response.status_code}')
+                continue
+            self.measure(url, response.content, options['repeat'])
+
+    def measure(self, url, content, repeat):
+        self.stdout.write(f'{url}: {len(content)} bytes')
+        levels = [('gzip', level) for level in (1, 5, 6, 9)] + \
+            [('br', level) for level in (1, 4, 5, 11)]
+        for encoding, level in levels:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                compressed = compression.compress(content, encoding, level)
+            elapsed = (time.perf_counter() - started) / repeat
+            self.stdout.write(
+                f'  {encoding}-{level}: {len(compressed)} bytes '
+                f'({len(compressed) / len(content):.1%}), '
+                f'{elapsed * 1000:.2f} ms, {len(content) / elapsed / 2 ** 20:.1f} MB/s'
+            )
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from events.models import Event
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """ Measure event publishing throughput. """
+    help = 'Benchmark bulk event publishing (bulk_create/COPY) against single inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n', '--counts', dest='counts', type=int, nargs='+', default=[1000, 100000],
+            help='Batch sizes to publish'
+        )
+        parser.add_argument(
+            '-r', '--recipients', dest='recipients', type=int, default=3,
+            help='Recipients per event'
+        )
+        parser.add_argument(
+            '--single', dest='single', type=int, default=1000,
+            help='Number of events for single INSERT baseline (0 to skip)'
+        )
+        parser.add_argument(
+            '--keep', action='store_true', dest='keep',
+            help='Commit generated events instead of rolling back'
+        )
+
+    def handle(self, *args, **options):
+        users = list(get_user_model().objects.values_list('pk', 'uuid')[:1000])
+        if not users:
+            self.stderr.write('No users, run filldb first.')
+            return
+
+        def make_events(count):
+            return [
+                Event(
+                    sender_id=random.choice(users)[0],
+                    payload={'type': 'benchmark', 'num': num},
+                    recipients=[str(uuid) for _, uuid in random.sample(users, min(
+                        options['recipients'], len(users)))],
+                )
+                for num in range(count)
+            ]
+
+        if options['single']:
+            events = make_events(options['single'])
+            self.measure('single', len(events), lambda: [event.save() for event in events], options['keep'])
+
+        for count in options['counts']:
+            events = make_events(count)
+            self.measure('bulk', count, lambda: Event.objects.publish(events), options['keep'])
+
+    def measure(self, name, count, func, keep):
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                func()
+                elapsed = time.perf_counter() - started
+                if not keep:
+                    raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(
+            f'{name} x{count}: {elapsed:.2f} s, {count / elapsed:.0f} events/s'
+        )
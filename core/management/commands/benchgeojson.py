@@ -0,0 +1,60 @@
+import json
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.test import Client
+from rest_framework_jwt.settings import api_settings
+
+DEFAULT_URLS = (
+    '/v2/ads/map/?zoom=20',
+    '/v2/users/who/?zoom=20',
+)
+VARIANTS = (
+    ('full', ''),
+    ('compact', urlencode({'compact': 'true'})),
+    ('columnar', urlencode({'compact': 'true', 'columnar': 'true'})),
+)
+
+
+class Command(BaseCommand):
+    """ Measure map response sizes: full, compact and columnar GeoJSON. """
+    help = 'Compare full, compact and columnar GeoJSON sizes of map responses (ads/map, users/who).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*', default=DEFAULT_URLS,
+            help='API paths with query string'
+        )
+        parser.add_argument(
+            '-u', '--user', dest='username',
+            help='Username of requesting user (first user with location by default)'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(location__isnull=False)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.first()
+        if user is None:
+            raise CommandError('No users with location, run filldb first.')
+
+        token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(user))
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_ACCEPT_ENCODING='identity')
+
+        for url in options['urls']:
+            separator = '&' if '?' in url else '?'
+            sizes = {}
+            for name, query in VARIANTS:
+                response = client.get(f'{url}{separator}{query}' if query else url)
+                if response.status_code != 200:
+                    self.stderr.write(f'{url} ({name}): HTTP {response.status_code}')
+                    break
+                sizes[name] = len(response.content)
+                if name == 'full':
+                    features = json.loads(response.content).get('features', ())
+            else:
+                self.stdout.write(
+                    f'{url}: {len(features)} features, '
+                    + ', '.join(f'{name} {size}' for name, size in sizes.items()) + ' bytes'
+                )
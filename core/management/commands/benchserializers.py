@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from ads.models import Ad
+from ads.serializers import AdListCollectionSerializer, AdMapCollectionSerializer
+from core.fastserializers import compile_serializer
+from users.serializers import UserLocationSerializer
+
+
+class Command(BaseCommand):
+    """ Measure per-feature serialization cost. """
+    help = 'Benchmark DRF serializers against compiled ones (core.fastserializers).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n', '--limit', dest='limit', type=int, default=1000,
+            help='Rows to serialize'
+        )
+        parser.add_argument(
+            '-r', '--repeat', dest='repeat', type=int, default=5,
+            help='Serializations per serializer'
+        )
+
+    def handle(self, *args, **options):
+        limit, repeat = options['limit'], options['repeat']
+        ads = Ad.objects.order_by('pk')
+        users = get_user_model().objects.filter(location__isnull=False).order_by('pk')
+        for serializer_class, queryset in (
+            (AdMapCollectionSerializer, ads),
+            (AdListCollectionSerializer, ads.select_related('user')),
+            (UserLocationSerializer, users),
+        ):
+            compiled = compile_serializer(serializer_class)
+            instances = list(queryset[:limit])
+            rows = list(queryset.values(*compiled.get_columns(queryset))[:limit])
+            if not rows:
+                self.stderr.write(f'{serializer_class.__name__}: no rows, run filldb first.')
+                continue
+
+            drf = self.measure(lambda: serializer_class(instances, many=True).data, repeat)
+            fast = self.measure(lambda: compiled.data(rows), repeat)
+            self.stdout.write(
+                f'{serializer_class.__name__} x{len(rows)}: '
+                f'DRF {drf / len(rows) * 10 ** 6:.1f} us/feature, '
+                f'compiled {fast / len(rows) * 10 ** 6:.1f} us/feature ({drf / fast:.1f}x)'
+            )
+
+    @staticmethod
+    def measure(func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat
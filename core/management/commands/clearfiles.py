@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from files.tasks import collect_garbage
+
+
+class Command(BaseCommand):
+
+    help = 'Remove abandoned and deleted files from database and storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run',
+            help='Only report what would be removed',
+        )
+
+    def handle(self, *args, **options):
+        report = collect_garbage(dry_run=options['dry_run'])
+        self.stdout.write(
+            f'Abandoned: {report["abandoned"]}, deleted: {report["deleted"]}, '
+            f'storage objects: {report["objects"]}'
+        )
@@ -6,6 +6,8 @@ from django.contrib.gis.geos import Point
 from django.core.management import BaseCommand
 from django.db import transaction
 
+from users.presence import get_presence_store
+
 
 class Command(BaseCommand):
     """ Fill DB with fake data. """
@@ -27,6 +29,10 @@ class Command(BaseCommand):
         parser.add_argument(
             '-c', '--count', dest='count', type=int, help='Users count'
         )
+        parser.add_argument(
+            '-b', '--batch-size', dest='batch_size', type=int, default=5000,
+            help='Users per INSERT batch'
+        )
 
     def handle(self, *args, **options):
         moscow_bbox = (55.5613, 37.3480, 55.9261, 37.8671)
@@ -51,14 +57,28 @@ class Command(BaseCommand):
         if count is None:
             count = 100
 
-        # self.create_users((lb_lng, lb_lat, rt_lng, rt_lat), count)
-        self.create_users((55.4751, 35.9785, 55.5245, 36.0722), count)  # Mozhaysk
+        # Последовательные номера телефонов без коллизий внутри запуска
+        self.phone_base = random.randint(1000000000, 9999999999 - count)
+        self.phone_seq = 0
+
+        batch_size = options['batch_size']
+        for offset in range(0, count, batch_size):
+            # self.create_users((lb_lng, lb_lat, rt_lng, rt_lat), count)
+            self.create_users(
+                (55.4751, 35.9785, 55.5245, 36.0722),  # Mozhaysk
+                min(batch_size, count - offset)
+            )
 
     @transaction.atomic
     def create_users(self, bbox, users_count):
         users = [self.get_user(bbox) for _ in range(users_count)]
         get_user_model().objects.bulk_create(users)
 
+        # is_online в базе проставит users.tasks.flush_presence
+        store = get_presence_store()
+        for user in users:
+            store.heartbeat(user.pk)
+
     def get_user(self, bbox):
         # d = 100
         lb_lng, lb_lat, rt_lng, rt_lat = bbox
@@ -66,13 +86,16 @@ class Command(BaseCommand):
         lng = random.uniform(lb_lng, rt_lng)
         # lat = random.randint(int(lb_lat * d), int(rt_lat * d)) / d
         # lng = random.randint(int(lb_lng * d), int(rt_lng * d)) / d
-        username = '7' + ''.join(str(random.randint(0, 9)) for _ in range(10))
+        self.phone_seq += 1
+        username = f'7{self.phone_base + self.phone_seq}'
         user = get_user_model()(
             username=username,
             display_name=username,
             sex=random.choice(['M', 'F']),
             location=Point(lng, lat),
-            birth_date=datetime.date(2000, 1, 1),
+            birth_date=datetime.date.today() - datetime.timedelta(
+                days=random.randint(18 * 365, 60 * 365)
+            ),
             confirm_tos=True,
             last_activity=datetime.datetime.now(),
             is_online=True,
@@ -0,0 +1,83 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, reset_queries
+
+from contacts.models import Contact
+
+
+class Command(BaseCommand):
+    """ Generate contact graph and measure contact queries. """
+    help = 'Generate contact graph for existing users and benchmark lookups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-c', '--contacts', dest='contacts', type=int, default=1000,
+            help='Contacts per user (average)'
+        )
+        parser.add_argument(
+            '-u', '--users', dest='users', type=int, default=None,
+            help='Limit graph to first N users'
+        )
+        parser.add_argument(
+            '-s', '--samples', dest='samples', type=int, default=20,
+            help='Number of sampled users for benchmark'
+        )
+        parser.add_argument(
+            '--no-generate', action='store_true', dest='no_generate',
+            help='Only run benchmark on existing graph'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = list(
+            get_user_model().objects.order_by('pk').values_list('pk', flat=True)[:options['users']]
+        )
+        if len(user_ids) < 2:
+            self.stderr.write('Not enough users, run filldb first.')
+            return
+
+        if not options['no_generate']:
+            self.generate(user_ids, options['contacts'])
+        self.benchmark(user_ids, options['samples'])
+
+    def generate(self, user_ids, contacts_count):
+        """ Граф с "популярными" пользователями (степенное распределение). """
+        weights = [1.0 / (rank + 1) for rank in range(len(user_ids))]
+        created = 0
+        for holder_id in user_ids:
+            count = min(int(random.expovariate(1.0 / contacts_count)) + 1, len(user_ids) - 1)
+            targets = set(random.choices(user_ids, weights=weights, k=count))
+            targets.discard(holder_id)
+            Contact.objects.bulk_create([
+                Contact(holder_id=holder_id, user_id=user_id) for user_id in targets
+            ], batch_size=5000, ignore_conflicts=True)
+            created += len(targets)
+        self.stdout.write(f'Generated {created} contacts for {len(user_ids)} users')
+
+    def benchmark(self, user_ids, samples):
+        User = get_user_model()  # noqa
+        pairs = [random.sample(user_ids, 2) for _ in range(samples)]
+        queries = {
+            'followers': lambda a, b: list(User.objects.filter(
+                pk__in=Contact.objects.followers(a))[:100]),
+            'mutual': lambda a, b: list(User.objects.filter(
+                pk__in=Contact.objects.mutual(a, b))[:100]),
+            'mutual_counts': lambda a, b: Contact.objects.mutual_counts(a, [b]),
+        }
+        for name, query in queries.items():
+            reset_queries()
+            started = time.perf_counter()
+            for holder_id, user_id in pairs:
+                query(holder_id, user_id)
+            elapsed = (time.perf_counter() - started) / len(pairs) * 1000
+            self.stdout.write(f'{name}: {elapsed:.2f} ms avg over {len(pairs)} runs')
+
+        with connection.cursor() as cursor:
+            holder_id, user_id = pairs[0]
+            sql, params = User.objects.filter(
+                pk__in=Contact.objects.mutual(holder_id, user_id)
+            ).query.sql_with_params()
+            cursor.execute(f'EXPLAIN ANALYZE {sql}', params)
+            self.stdout.write('\n'.join(row[0] for row in cursor.fetchall()))
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from abuses.models import UserAbuseStats
+
+
+class Command(BaseCommand):
+    """ Rebuild materialised abuse statistics. """
+    help = 'Recalculate abuse counters of all users (user_abuse_stats).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b', '--batch-size', dest='batch_size', type=int, default=1000,
+            help='Users per upsert statement'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+        last_pk, refreshed = 0, 0
+        while True:
+            user_ids = list(users.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not user_ids:
+                break
+            refreshed += UserAbuseStats.objects.refresh(user_ids)
+            last_pk = user_ids[-1]
+        self.stdout.write(f'Refreshed abuse stats of {refreshed} users')
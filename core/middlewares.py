@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
 from django.utils.functional import SimpleLazyObject
 
+from . import compression
 from .utils import get_user_jwt
 
 
@@ -43,3 +46,47 @@ class RestrictUsersWithoutLocationMiddleware(MiddlewareMixin):
         if hasattr(request.user, 'location') and \
                 not request.user.location:
             return HttpResponse(status=424)  # Failed Dependency
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Сжатие ответов gzip/brotli (по Accept-Encoding).
+
+    Сжимаются только типы из COMPRESSION_LEVELS и ответы не короче
+    COMPRESSION_MIN_LENGTH, потоковые ответы сжимаются по чанкам.
+    """
+    def process_response(self, request, response):
+        levels = compression.get_levels(response.get('Content-Type', ''))
+        if not levels or response.has_header('Content-Encoding') or response.status_code == 206:
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_LENGTH:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding not in levels:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compression.compress_sequence(
+                response.streaming_content, encoding, levels[encoding]
+            )
+            del response['Content-Length']
+        else:
+            if compression.is_cached_path(request.path):
+                content = compression.compress_cached(
+                    response.content, encoding, settings.COMPRESSION_CACHE_LEVELS[encoding]
+                )
+            else:
+                content = compression.compress(response.content, encoding, levels[encoding])
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # Сжатый ответ не совпадает побайтно с несжатым
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
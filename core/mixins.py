@@ -1,4 +1,19 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
 from django.http import Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from core import tiles
+from core.fastserializers import compile_serializer
 
 
 class NotFoundOnDeletedObjectMixin:
@@ -8,3 +23,152 @@ class NotFoundOnDeletedObjectMixin:
         if hasattr(obj, 'deleted_at') and obj.deleted_at is not None:
             raise Http404
         return obj
+
+
+class FastSerializerMixin:
+    """
+    Read-only сериализация строк values() скомпилированным
+    сериализатором (см. core.fastserializers).
+    """
+    def get_compiled_serializer(self):
+        return compile_serializer(self.get_serializer_class())
+
+    def get_rows(self, queryset):
+        return queryset.values(*self.get_compiled_serializer().get_columns(queryset))
+
+    def serialize_rows(self, rows):
+        return self.get_compiled_serializer().data(rows, self.get_serializer_context())
+
+
+class VectorTileMixin:
+    """
+    Ответ с MVT-тайлом: кеш тайлов и HTTP-кеширование (ETag).
+
+    Слой задается атрибутами `tile_layer`, `tile_geom_field` и
+    `tile_properties` вьюхи.
+    """
+    tile_layer = None
+    tile_geom_field = None
+    tile_properties = ()
+
+    def get_tile_cache_vary(self, request):
+        """ Зависимость тайла от текущего пользователя (блокировки). """
+        return sorted(request.user.get_block_set())
+
+    def get_tile_cache_key(self, request, z, x, y):
+        query = sorted(request.query_params.lists())
+        vary = hashlib.md5(repr((query, self.get_tile_cache_vary(request))).encode()).hexdigest()
+        return f'tiles:{self.tile_layer}:{z}/{x}/{y}:{vary}'
+
+    def tile_response(self, request, get_queryset, z, x, y):
+        """ get_queryset вызывается, только если тайла нет в кеше. """
+        z, x, y = int(z), int(x), int(y)
+        if not tiles.is_valid_tile(z, x, y):
+            raise NotFound('Invalid tile coordinates.')
+
+        key = self.get_tile_cache_key(request, z, x, y)
+        tile = cache.get(key)
+        if tile is None:
+            tile = tiles.get_tile(
+                get_queryset(), z, x, y, self.tile_layer,
+                self.tile_geom_field, self.tile_properties
+            )
+            cache.set(key, tile, settings.TILES_CACHE_TIMEOUT)
+
+        etag = f'"{hashlib.md5(tile).hexdigest()}"'
+        # После сжатия ответа клиент присылает слабый ETag
+        if request.META.get('HTTP_IF_NONE_MATCH') in (etag, f'W/{etag}'):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(tile)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=settings.TILES_CACHE_TIMEOUT)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class ViewportDeltaMixin:
+    """
+    Дельта карты при сдвиге viewport.
+
+    В ответ без кластеризации добавляется токен состояния `state`
+    (подписанные время, хеш остальных параметров запроса и хеш
+    множества отправленных UUID, само множество - в кеше). С этим
+    токеном следующий запрос возвращает только объекты, появившиеся в
+    viewport (или измененные с прошлого запроса), и `removed` - UUID
+    отправленных в прошлый раз объектов, которых в ответе больше нет:
+    вышли из viewport, удалены или перестали подходить под фильтры.
+    """
+    viewport_bbox_param = 'in_bbox'
+    viewport_state_param = 'state'
+    viewport_state_salt = 'core.viewport'
+
+    def get_viewport(self, request):
+        """ Текущий bbox (minx, miny, maxx, maxy) или None. """
+        try:
+            bbox = [float(value) for value in request.query_params[self.viewport_bbox_param].split(',')]
+        except (KeyError, ValueError):
+            return None
+        return tuple(bbox) if len(bbox) == 4 else None
+
+    def get_viewport_params_hash(self, request):
+        ignored = (self.viewport_bbox_param, self.viewport_state_param, 'zoom', 'eps', 'minpoints')
+        params = sorted((key, value) for key, value in request.query_params.lists() if key not in ignored)
+        return hashlib.md5(repr(params).encode()).hexdigest()
+
+    @staticmethod
+    def get_viewport_ids_key(digest):
+        return f'viewport:{digest}'
+
+    def make_viewport_state(self, request, ids):
+        """ Токен состояния; отправленные UUID сохраняются в кеш. """
+        if ids is None:
+            return None
+        digest = hashlib.md5(repr(sorted(ids)).encode()).hexdigest()
+        cache.set(self.get_viewport_ids_key(digest), ids, settings.MAP_STATE_MAX_AGE)
+        return signing.dumps({
+            'ids': digest,
+            'ts': time.time(),
+            'params': self.get_viewport_params_hash(request),
+        }, salt=self.viewport_state_salt)
+
+    def load_viewport_state(self, request):
+        """ UUID из прошлого ответа и время запроса, если дельта возможна. """
+        token = request.query_params.get(self.viewport_state_param)
+        if not token:
+            return None
+        try:
+            state = signing.loads(
+                token, salt=self.viewport_state_salt, max_age=settings.MAP_STATE_MAX_AGE
+            )
+        except signing.BadSignature:
+            return None
+        if state.get('params') != self.get_viewport_params_hash(request):
+            return None
+        previous = cache.get(self.get_viewport_ids_key(state.get('ids')))
+        if previous is None:
+            return None
+        return previous, datetime.fromtimestamp(state['ts'], tz=timezone.utc)
+
+    def get_viewport_delta(self, queryset):
+        """
+        (объекты ответа, removed или None, UUID объектов viewport).
+        queryset - после фильтрации; без bbox в запросе дельты нет.
+        """
+        if self.get_viewport(self.request) is None:
+            return queryset, None, None
+        ids = frozenset(queryset.values_list('uuid', flat=True))
+        state = self.load_viewport_state(self.request)
+        if state is None:
+            return queryset, None, ids
+
+        previous, since = state
+        entering = queryset.filter(Q(uuid__in=ids - previous) | Q(updated_at__gt=since))
+        return entering, sorted(previous - ids), ids
+
+    def viewport_response_data(self, data, removed, ids):
+        """ Дополнение FeatureCollection полями дельты. """
+        data['delta'] = removed is not None
+        data['removed'] = removed or []
+        data['state'] = self.make_viewport_state(self.request, ids)
+        return data
@@ -18,3 +18,13 @@ class OnlyOwnerAllowedEdit(permissions.BasePermission):
 
         # Instance must have an attribute named `owner`.
         return obj.owner == request.user
+
+
+class IsAbuseModerator(permissions.BasePermission):
+    """
+    Доступ модераторам жалоб (право на изменение модели жалоб вьюсета).
+    """
+
+    def has_permission(self, request, view):
+        opts = view.abuse_model._meta
+        return request.user.has_perm(f'{opts.app_label}.change_{opts.model_name}')
@@ -1,8 +1,40 @@
 import json
 
-from rest_framework.renderers import JSONRenderer
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 
 
 class JSONDictRenderer(JSONRenderer):
     def render(self, *args, **kwargs):
         return json.loads(super().render(*args, **kwargs))
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Server-Sent Events. Stream itself is written by the view, renderer is
+    needed for content negotiation and error responses.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return f'event: error\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+class MVTRenderer(BaseRenderer):
+    """
+    Mapbox Vector Tile (binary tile is passed by the view as is).
+    """
+    media_type = 'application/vnd.mapbox-vector-tile'
+    format = 'mvt'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        return json.dumps(data).encode()
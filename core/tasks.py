@@ -11,38 +11,38 @@ from ads.models import Ad
 
 @shared_task
 def notify_and_block_ad(abuse_ids):
-    abuses = AdAbuse.objects.filter(id__in=abuse_ids)
-    to_block_ad_ids = []
-    for abuse in abuses:
-        # send_mail(
-        #     'Abuse on ad',
-        #     'You have abuse on your ad',
-        #     settings.DEFAULT_FROM_EMAIL,
-        #     [abuse.ad.owner.email]
-        # )
-        if abuse.ad.abuses.filter(is_confirmed=True).count() > 3:
-            to_block_ad_ids.append(abuse.ad.id)
-
-    Ad.objects.filter(id__in=to_block_ad_ids).update(is_blocked=True)
+    """
+    Блокировка объявлений, у которых подтвержденных жалоб больше
+    ABUSES_BLOCK_THRESHOLD (один UPDATE на всю пачку жалоб).
+    """
+    # send_mail(
+    #     'Abuse on ad',
+    #     'You have abuse on your ad',
+    #     settings.DEFAULT_FROM_EMAIL,
+    #     AdAbuse.objects.filter(id__in=abuse_ids).values_list('ad__user__email', flat=True)
+    # )
+    return Ad.objects.filter(
+        id__in=AdAbuse.objects.filter(id__in=abuse_ids).values('ad'),
+        confirmed_abuses_count__gt=settings.ABUSES_BLOCK_THRESHOLD
+    ).update(is_blocked=True)
 
 
 @shared_task
 def notify_and_block_user(abuse_ids):
-    abuses = UserAbuse.objects.filter(id__in=abuse_ids)
-    to_block_user_ids = []
-    for abuse in abuses:
-        # send_mail(
-        #     'Abuse on you',
-        #     'You have abuse on your profile',
-        #     settings.DEFAULT_FROM_EMAIL,
-        #     [abuse.user.email]
-        # )
-        if abuse.user.abuses.filter(is_confirmed=True).count() > 3:
-            to_block_user_ids.append(abuse.user.id)
-
-    get_user_model().objects.filter(
-        id__in=to_block_user_ids
-    ).update(is_blocked=True)
+    """
+    Блокировка пользователей, у которых подтвержденных жалоб больше
+    ABUSES_BLOCK_THRESHOLD (один UPDATE на всю пачку жалоб).
+    """
+    # send_mail(
+    #     'Abuse on you',
+    #     'You have abuse on your profile',
+    #     settings.DEFAULT_FROM_EMAIL,
+    #     UserAbuse.objects.filter(id__in=abuse_ids).values_list('user__email', flat=True)
+    # )
+    return get_user_model().objects.filter(
+        id__in=UserAbuse.objects.filter(id__in=abuse_ids).values('user'),
+        confirmed_abuses_count__gt=settings.ABUSES_BLOCK_THRESHOLD
+    ).update(is_restricted=True)
 
 
 @shared_task
@@ -0,0 +1,105 @@
+"""
+Mapbox Vector Tiles (MVT) built by PostGIS (ST_AsMVT) from querysets.
+
+Tiles are addressed by z/x/y in Web Mercator. At low zooms (up to
+TILES_CLUSTER_MAX_ZOOM) points are clustered on a fixed grid snapped to
+the projection origin, so clusters match across neighbouring tiles.
+"""
+from math import atan, degrees, exp, pi
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+
+EXTENT = 4096
+BUFFER = 64
+MAX_ZOOM = 22
+EARTH_RADIUS = 6378137
+ORIGIN_SHIFT = pi * EARTH_RADIUS
+
+
+def tile_envelope(z, x, y):
+    """ Границы тайла в EPSG:3857 (xmin, ymin, xmax, ymax). """
+    size = 2 * ORIGIN_SHIFT / 2 ** z
+    xmin = -ORIGIN_SHIFT + x * size
+    ymax = ORIGIN_SHIFT - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def tile_polygon(z, x, y):
+    """ Тайл с буфером в EPSG:4326 (для отбора точек по индексу). """
+    xmin, ymin, xmax, ymax = tile_envelope(z, x, y)
+    margin = (xmax - xmin) * BUFFER / EXTENT
+
+    def to_lon(value):
+        return max(-180.0, min(degrees(value / EARTH_RADIUS), 180.0))
+
+    def to_lat(value):
+        value = max(-ORIGIN_SHIFT, min(value, ORIGIN_SHIFT))
+        return degrees(2 * atan(exp(value / EARTH_RADIUS)) - pi / 2)
+
+    return Polygon.from_bbox((
+        to_lon(xmin - margin), to_lat(ymin - margin),
+        to_lon(xmax + margin), to_lat(ymax + margin),
+    ))
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def get_tile(queryset, z, x, y, layer, geom_field, properties=()):
+    """
+    Бинарный MVT-тайл точек queryset.
+
+    На мелких зумах точки группируются по сетке: у кластера есть
+    свойство count, у одиночной точки - также uuid.
+    """
+    queryset = queryset.filter(**{f'{geom_field}__bboverlaps': tile_polygon(z, x, y)})
+    columns = [geom_field, *properties]
+    if z <= settings.TILES_CLUSTER_MAX_ZOOM and 'uuid' not in columns:
+        columns.append('uuid')
+    rows_sql, rows_params = queryset.order_by().values(*columns).query.sql_with_params()
+
+    xmin, ymin, xmax, ymax = tile_envelope(z, x, y)
+    if z <= settings.TILES_CLUSTER_MAX_ZOOM:
+        cell = (xmax - xmin) / settings.TILES_CLUSTER_CELLS
+        sql = f"""
+            SELECT ST_AsMVT(tile, %s, {EXTENT}, 'geom') FROM (
+                SELECT
+                    ST_AsMVTGeom(ST_Centroid(ST_Collect(g)), bounds.geom, {EXTENT}, {BUFFER}, true) AS geom,
+                    count(*) AS count,
+                    CASE WHEN count(*) = 1 THEN min(points.uuid::text) END AS uuid
+                FROM (
+                    SELECT ST_Transform(rows.{geom_field}, 3857) AS g, rows.uuid
+                    FROM ({rows_sql}) AS rows
+                ) AS points,
+                (SELECT ST_MakeEnvelope(%s, %s, %s, %s, 3857) AS geom) AS bounds
+                GROUP BY ST_SnapToGrid(g, {cell}), bounds.geom
+            ) AS tile
+        """
+    else:
+        model = queryset.model
+        fields = ', '.join(
+            f'rows.{name}::text AS {name}'
+            if model._meta.get_field(name).get_internal_type() == 'UUIDField'
+            else f'rows.{name}'
+            for name in properties
+        )
+        sql = f"""
+            SELECT ST_AsMVT(tile, %s, {EXTENT}, 'geom') FROM (
+                SELECT
+                    ST_AsMVTGeom(ST_Transform(rows.{geom_field}, 3857), bounds.geom,
+                                 {EXTENT}, {BUFFER}, true) AS geom,
+                    {fields}
+                FROM ({rows_sql}) AS rows,
+                (SELECT ST_MakeEnvelope(%s, %s, %s, %s, 3857) AS geom) AS bounds
+            ) AS tile
+        """
+
+    # Порядок параметров совпадает с порядком плейсхолдеров в SQL
+    params = [layer, *rows_params, xmin, ymin, xmax, ymax]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b''
@@ -1,10 +1,12 @@
 import os
 import re
 import random
+import datetime
 import mimetypes
-from math import cos, pi, pow
+from math import ceil, cos, log10, pi, pow
 
 import jwt
+import minio
 from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -14,6 +16,8 @@ from django.db.models import Q
 from rest_framework.request import Request
 from rest_framework_jwt.authentication import JSONWebTokenAuthentication
 
+PHONE_RE = re.compile(r'^[1-9]\d{6,14}$')
+
 
 def gen_smscode():
     """ Генеация нового уникального кода для СМС. """
@@ -51,6 +55,49 @@ def get_user_jwt(request):
     return user or AnonymousUser()
 
 
+def normalize_phone(phone):
+    """
+    Приведение номера из адресной книги к E.164 (только цифры).
+
+    Возвращает None, если номер не похож на международный.
+    """
+    digits = re.sub(r'\D', '', str(phone))
+    if digits.startswith('00'):
+        digits = digits[2:]
+    # Российские номера в национальном формате (8 XXX XXX-XX-XX)
+    elif len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    if not PHONE_RE.match(digits):
+        return None
+    return digits
+
+
+def years_ago(years, today=None):
+    """ Дата ровно years лет назад (29 февраля -> 28 февраля). """
+    today = today or datetime.date.today()
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=today.day - 1)
+
+
+def calculate_age(birth_date, today=None):
+    """ Полное количество лет на дату today (по умолчанию сегодня). """
+    if not birth_date:
+        return None
+    today = today or datetime.date.today()
+    return today.year - birth_date.year - (
+        (today.month, today.day) < (birth_date.month, birth_date.day)
+    )
+
+
+def get_field_value(obj, name, default=None):
+    """ Значение поля объекта модели или строки (словаря values() или курсора). """
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
 def get_user_or_create(**kwargs):
     """ Создает или возращает существующего пользователя. """
     try:
@@ -93,6 +140,27 @@ def get_public_url(file_uuid, prefix=''):
     return public_url
 
 
+_storage_client = None
+
+
+def get_storage_client():
+    """
+    Клиент стораджа, общий для всего процесса.
+
+    Создание клиента на каждый запрос заново резолвит регион бакета,
+    поэтому инстанс переиспользуется между запросами.
+    """
+    global _storage_client
+    if _storage_client is None:
+        _storage_client = minio.Minio(
+            settings.AWS_S3_ENDPOINT_URL.replace('http://', ''),
+            access_key=settings.AWS_ACCESS_KEY_ID,
+            secret_key=settings.AWS_SECRET_ACCESS_KEY,
+            secure=False
+        )
+    return _storage_client
+
+
 def get_best_minpoints_dbscan(points_count, minpoints=None):
     if not minpoints or minpoints > points_count:
         minpoints = points_count
@@ -123,6 +191,7 @@ def fix_rawsql_helper(sql):
         sql
     )
     sql = re.sub(r'\[UUID\(', 'ARRAY[UUID(', sql)
+    sql = re.sub(r' (&&|@>) \[([\d, ]*)\]', r' \1 ARRAY[\2]::integer[]', sql)
     sql = re.sub(r'"users"."uuid" = ([^\s\)]+)', r'"users"."uuid" = ' + r"'\1'", sql)
     sql = re.sub(r' NumericRange', 'int4range', sql)
     return sql
@@ -133,6 +202,75 @@ def get_meter_per_pixel(zoom):
     return meter_pixel
 
 
+def get_coordinate_precision(zoom):
+    """ Знаков после запятой в градусах, достаточно для точности в пиксель. """
+    degrees_per_pixel = 360 / (256 * pow(2, zoom))
+    return max(0, min(ceil(-log10(degrees_per_pixel)), 7))
+
+
+def _round_coordinates(coordinates, precision):
+    if isinstance(coordinates, (list, tuple)):
+        return [_round_coordinates(value, precision) for value in coordinates]
+    return round(coordinates, precision)
+
+
+def compact_geojson(data, zoom, columnar=False):
+    """
+    Компактное представление FeatureCollection для карты.
+
+    Координаты округляются по зуму, пустые свойства, is_cluster=False и
+    geom_count=1 опускаются, у кластеров остаются только is_cluster и
+    geom_count. При columnar=True признаки отдаются столбцами
+    (`columns`: coordinates, id и по столбцу на каждое свойство).
+    """
+    precision = get_coordinate_precision(zoom)
+    features = []
+    for feature in data['features']:
+        properties = feature['properties']
+        is_cluster = bool(properties.get('is_cluster'))
+        if is_cluster:
+            properties = {'is_cluster': True, 'geom_count': properties.get('geom_count')}
+        else:
+            properties = {
+                name: value for name, value in properties.items()
+                if value not in (None, '', [], {}) and (name, value) not in (
+                    ('is_cluster', False), ('geom_count', 1), ('geom_count', '1')
+                )
+            }
+        geometry = feature['geometry']
+        compact = {
+            'type': 'Feature',
+            'geometry': geometry and {
+                'type': geometry['type'],
+                'coordinates': _round_coordinates(geometry['coordinates'], precision),
+            },
+            'properties': properties,
+        }
+        if feature.get('id') is not None and not is_cluster:
+            compact['id'] = feature['id']
+        features.append(compact)
+
+    result = {name: value for name, value in data.items() if name != 'features'}
+    if not columnar:
+        result['features'] = features
+        return result
+
+    names = sorted({name for feature in features for name in feature['properties']})
+    columns = {
+        'coordinates': [
+            feature['geometry'] and feature['geometry']['coordinates'] for feature in features
+        ],
+    }
+    if any('id' in feature for feature in features):
+        columns['id'] = [feature.get('id') for feature in features]
+    for name in names:
+        columns[name] = [feature['properties'].get(name) for feature in features]
+    result['type'] = 'FeatureColumns'
+    result['count'] = len(features)
+    result['columns'] = columns
+    return result
+
+
 def get_new_messages_count(user):
     """ Количество непрочитанных сообщений для пользователя.
 
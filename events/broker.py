@@ -0,0 +1,146 @@
+"""
+Pub/sub for real-time event delivery.
+
+New events are published to per-recipient channels after commit and
+fanned out to open event streams (see EventViewSet.stream). Redis is
+required (EVENTS_BROKER_URL), the in-process broker is only used for
+development and tests (DEBUG or TESTING): it can't deliver events
+between processes.
+"""
+import json
+import queue
+import threading
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import EventSerializer
+
+
+class Subscription:
+    """
+    Bounded queue of messages for one stream.
+
+    A slow consumer does not block publishers: once the queue is full the
+    subscription is marked as overflowed and the stream has to resume
+    from the database.
+    """
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=settings.EVENTS_STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """ Следующее сообщение или None по таймауту. """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.channel].discard(subscription)
+            if not self._subscriptions[subscription.channel]:
+                del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def publish_many(self, messages):
+        for channel, message in messages:
+            self.publish(channel, message)
+
+
+class RedisSubscription:
+    """
+    Redis channel subscription (slow consumers are cut off by Redis
+    output buffer limits and resume from the database).
+    """
+    overflowed = False
+
+    def __init__(self, broker, channel):
+        self.pubsub = broker.client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(f'events:{channel}')
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+    def close(self):
+        self.pubsub.close()
+
+
+class RedisBroker:
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    def subscribe(self, channel):
+        return RedisSubscription(self, channel)
+
+    def publish(self, channel, message):
+        self.client.publish(f'events:{channel}', json.dumps(message, cls=JSONEncoder))
+
+    def publish_many(self, messages):
+        """ Публикация пачки сообщений одним конвейером. """
+        with self.client.pipeline(transaction=False) as pipe:
+            for channel, message in messages:
+                pipe.publish(f'events:{channel}', json.dumps(message, cls=JSONEncoder))
+            pipe.execute()
+
+
+_broker = None
+
+
+def get_broker():
+    """ Брокер событий, общий для всего процесса. """
+    global _broker
+    if _broker is None:
+        if settings.EVENTS_BROKER_URL:
+            _broker = RedisBroker(settings.EVENTS_BROKER_URL)
+        elif settings.DEBUG or settings.TESTING:
+            _broker = LocalBroker()
+        else:
+            # События из других процессов (воркеров, Celery) не дошли бы до потоков
+            raise ImproperlyConfigured('EVENTS_BROKER_URL (Redis) is required when DEBUG is off.')
+    return _broker
+
+
+def publish_events(events):
+    """ Рассылка событий подписанным получателям. """
+    messages = []
+    for event in events:
+        message = {'id': event.pk, 'data': EventSerializer(event).data}
+        messages.extend((recipient, message) for recipient in event.recipients)
+    get_broker().publish_many(messages)
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-19 16:40
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_auto_20180924_0918'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['recipients'], name='events_recipients_gin'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 2.2.28 on 2026-10-19 17:55
+
+import uuid
+
+from django.db import migrations, models
+
+# Таблица событий пересоздается как партиционированная по месяцам
+# (RANGE по created_at). Ключ партиционирования должен входить во все
+# уникальные ограничения, поэтому первичный ключ - (id, created_at),
+# а уникальность uuid проверяется в паре с created_at. Составной
+# первичный ключ в Django не описать, в состоянии моделей им остается id
+# (уникален за счет последовательности).
+PARTITION_SQL = """
+CREATE TABLE events_event_new (LIKE events_event INCLUDING DEFAULTS)
+    PARTITION BY RANGE (created_at);
+
+CREATE TABLE events_event_default PARTITION OF events_event_new DEFAULT;
+
+DO $$
+DECLARE
+    month timestamp;
+BEGIN
+    SELECT date_trunc('month', coalesce(min(created_at), now()) AT TIME ZONE 'UTC')
+        INTO month FROM events_event;
+    WHILE month <= date_trunc('month', now() AT TIME ZONE 'UTC') + interval '2 months' LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF events_event_new FOR VALUES FROM (%L) TO (%L)',
+            'events_event_p' || to_char(month, 'YYYYMM'),
+            month AT TIME ZONE 'UTC',
+            (month + interval '1 month') AT TIME ZONE 'UTC'
+        );
+        month := month + interval '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO events_event_new SELECT * FROM events_event;
+
+ALTER SEQUENCE events_event_id_seq OWNED BY events_event_new.id;
+DROP TABLE events_event;
+ALTER TABLE events_event_new RENAME TO events_event;
+
+ALTER TABLE events_event ADD CONSTRAINT events_event_pkey PRIMARY KEY (id, created_at);
+ALTER TABLE events_event ADD CONSTRAINT events_event_uuid_created_at_uniq UNIQUE (uuid, created_at);
+ALTER TABLE events_event ADD CONSTRAINT events_event_sender_id_fk_users_id
+    FOREIGN KEY (sender_id) REFERENCES users (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX events_event_sender_id_idx ON events_event (sender_id);
+CREATE INDEX events_event_created_at_idx ON events_event (created_at);
+CREATE INDEX events_recipients_gin ON events_event USING gin (recipients);
+"""
+
+# Обратно в обычную таблицу (отсоединенные архивные партиции не возвращаются)
+UNPARTITION_SQL = """
+CREATE TABLE events_event_old (LIKE events_event INCLUDING DEFAULTS);
+
+INSERT INTO events_event_old SELECT * FROM events_event;
+
+ALTER SEQUENCE events_event_id_seq OWNED BY events_event_old.id;
+DROP TABLE events_event;
+ALTER TABLE events_event_old RENAME TO events_event;
+
+ALTER TABLE events_event ADD CONSTRAINT events_event_pkey PRIMARY KEY (id);
+ALTER TABLE events_event ADD CONSTRAINT events_event_uuid_key UNIQUE (uuid);
+ALTER TABLE events_event ADD CONSTRAINT events_event_sender_id_fk_users_id
+    FOREIGN KEY (sender_id) REFERENCES users (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX events_event_sender_id_idx ON events_event (sender_id);
+CREATE INDEX events_recipients_gin ON events_event USING gin (recipients);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_recipients_gin'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='event',
+                    name='uuid',
+                    field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='UUID of object.'),
+                ),
+                migrations.AddConstraint(
+                    model_name='event',
+                    constraint=models.UniqueConstraint(
+                        fields=('uuid', 'created_at'), name='events_event_uuid_created_at_uniq'
+                    ),
+                ),
+            ],
+        ),
+    ]
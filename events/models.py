@@ -1,11 +1,103 @@
+import csv
+import io
+import json
+import uuid
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField, JSONField
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.db import connection, models, transaction
+from django.db.models import F, Func, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from core.models import BaseModel
 
 
+class EventQuerySet(models.QuerySet):
+
+    def for_recipient(self, user):
+        """ Входящие события пользователя (по GIN-индексу recipients). """
+        return self.filter(recipients__contains=[str(user.uuid)])
+
+    def undelivered(self, user):
+        return self.for_recipient(user).exclude(
+            delivered_to__contains=[str(user.uuid)]
+        )
+
+    def ack(self, user, uuids):
+        """ Отметка о доставке событий одним UPDATE. """
+        recipient = str(user.uuid)
+        return self.undelivered(user).filter(uuid__in=uuids).update(
+            delivered_to=Func(
+                F('delivered_to'),
+                Cast(Value(recipient), models.CharField(max_length=36)),
+                function='array_append',
+                output_field=ArrayField(models.CharField(max_length=36))
+            )
+        )
+
+    def publish(self, events):
+        """
+        Сохранение пачки событий и рассылка после коммита.
+
+        Небольшие пачки пишутся через bulk_create, большие (от
+        EVENTS_COPY_THRESHOLD) - через COPY. Возвращает UUID событий.
+        """
+        from .broker import publish_events
+
+        events = list(events)
+        if len(events) >= settings.EVENTS_COPY_THRESHOLD:
+            self._copy(events)
+        else:
+            self.bulk_create(events, batch_size=settings.EVENTS_BULK_BATCH_SIZE)
+        transaction.on_commit(lambda: publish_events(events))
+        return [event.uuid for event in events]
+
+    def _copy(self, events):
+        """ COPY с заранее выделенными id из последовательности. """
+        table = self.model._meta.db_table
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [table, 'id', len(events)]
+            )
+            for event, (pk,) in zip(events, cursor.fetchall()):
+                event.pk = pk
+                event.created_at = event.created_at or now
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for event in events:
+                writer.writerow([
+                    event.pk,
+                    event.uuid,
+                    event.created_at.isoformat(),
+                    json.dumps(event.payload),
+                    _array_literal(event.recipients),
+                    event.sender_id,
+                    _array_literal(event.delivered_to),
+                ])
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY {table} (id, uuid, created_at, payload, recipients, '
+                f'sender_id, delivered_to) FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+
+
+def _array_literal(values):
+    """ Литерал массива PostgreSQL для COPY. """
+    items = (
+        '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        for value in values
+    )
+    return '{' + ','.join(items) + '}'
+
+
 class Event(BaseModel):
     """
     Event model.
@@ -13,6 +105,13 @@ class Event(BaseModel):
     updated_at = None
     deleted_at = None
 
+    # Таблица партиционирована по created_at: uuid уникален только в паре
+    # с created_at (первичный ключ в БД - (id, created_at))
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        help_text='UUID of object.'
+    )
     payload = JSONField(help_text=_('Event data.'))
     recipients = ArrayField(
         # TODO: try ForeignKey
@@ -30,3 +129,16 @@ class Event(BaseModel):
         default=list,
         help_text=_('Event delivered to recipients (list of UUIDs).')
     )
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('created_at',)
+        indexes = [
+            GinIndex(fields=['recipients'], name='events_recipients_gin'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['uuid', 'created_at'], name='events_event_uuid_created_at_uniq'
+            ),
+        ]
@@ -0,0 +1,94 @@
+"""
+Monthly partitions of the events table.
+
+events_event is partitioned by RANGE (created_at), one partition per
+calendar month (UTC) named events_event_pYYYYMM, plus a default
+partition that catches rows outside of the created ranges. Partitions
+are created ahead of time and old ones are dropped (or detached for
+archiving) by events.tasks.maintain_partitions instead of DELETEs.
+"""
+import re
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+TABLE = 'events_event'
+DEFAULT = f'{TABLE}_default'
+PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def month_start(value, months=0):
+    """ Начало месяца (UTC) со сдвигом на months месяцев. """
+    value = value.astimezone(timezone.utc)
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def get_partitions():
+    """ Месячные партиции: {начало месяца: имя таблицы}. """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass',
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            year, month = map(int, match.groups())
+            partitions[datetime(year, month, 1, tzinfo=timezone.utc)] = name
+    return partitions
+
+
+def create_partition(month):
+    """
+    Создание месячной партиции. PostgreSQL не создает партицию, если
+    строки ее диапазона уже лежат в партиции по умолчанию: тогда она
+    отсоединяется, строки переносятся в новую партицию и партиция по
+    умолчанию присоединяется обратно (в одной транзакции).
+    """
+    name = partition_name(month)
+    bounds = [month, month_start(month, 1)]
+    create_sql = (
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" '
+        f'FOR VALUES FROM (%s) TO (%s)'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT}" WHERE created_at >= %s AND created_at < %s)',
+            bounds
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(create_sql, bounds)
+            return name
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{DEFAULT}"')
+        cursor.execute(create_sql, bounds)
+        cursor.execute(
+            f'WITH moved AS ('
+            f'DELETE FROM "{DEFAULT}" WHERE created_at >= %s AND created_at < %s RETURNING *'
+            f') INSERT INTO "{TABLE}" SELECT * FROM moved',
+            bounds
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{DEFAULT}" DEFAULT')
+    return name
+
+
+def remove_partition(name, archive=False):
+    """
+    Удаление партиции. При archive=True партиция только отсоединяется
+    и остается отдельной таблицей (для выгрузки в архив).
+    """
+    with connection.cursor() as cursor:
+        if archive:
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+        else:
+            cursor.execute(f'DROP TABLE "{name}"')
@@ -1,8 +1,29 @@
+from django.conf import settings
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 from .models import Event
 
 
+class EventListSerializer(serializers.ListSerializer):
+    """
+    Bulk events creation (one INSERT or COPY for the whole batch).
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > settings.MAX_EVENTS_BULK_SIZE:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f'Ensure this list has no more than {settings.MAX_EVENTS_BULK_SIZE} items.'
+                ]
+            })
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        events = [Event(**attrs) for attrs in validated_data]
+        Event.objects.publish(events)
+        return events
+
+
 class EventSerializer(serializers.ModelSerializer):
     """
     Events serializer.
@@ -13,3 +34,16 @@ class EventSerializer(serializers.ModelSerializer):
         model = Event
         fields = ('uuid', 'payload', 'recipients', 'created_at', 'sender',)
         read_only_fields = ('uuid', 'created_at',)
+        list_serializer_class = EventListSerializer
+
+
+class EventAckSerializer(serializers.Serializer):
+    """
+    Events delivery acknowledgement.
+    """
+    uuids = serializers.ListField(
+        child=serializers.UUIDField(),
+        min_length=1,
+        max_length=settings.MAX_EVENTS_ACK_SIZE,
+        help_text='UUIDs of delivered events.'
+    )
@@ -0,0 +1,35 @@
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.utils import timezone
+
+from . import partitions
+
+logger = get_task_logger(__name__)
+
+
+@shared_task
+def maintain_partitions():
+    """
+    Создание партиций событий на EVENTS_PARTITIONS_AHEAD месяцев вперед
+    и удаление (или архивация) партиций старше EVENTS_RETENTION_MONTHS.
+    """
+    now = timezone.now()
+    existing = partitions.get_partitions()
+
+    created = []
+    for months in range(settings.EVENTS_PARTITIONS_AHEAD + 1):
+        month = partitions.month_start(now, months)
+        if month not in existing:
+            created.append(partitions.create_partition(month))
+
+    removed = []
+    if settings.EVENTS_RETENTION_MONTHS:
+        cutoff = partitions.month_start(now, -settings.EVENTS_RETENTION_MONTHS)
+        for month, name in sorted(existing.items()):
+            if month < cutoff:
+                partitions.remove_partition(name, archive=settings.EVENTS_RETENTION_ARCHIVE)
+                removed.append(name)
+
+    logger.info(f'Event partitions: created {created}, removed {removed}')
+    return created, removed
@@ -1,16 +1,176 @@
-from rest_framework import mixins, viewsets
+import json
+import time
+from datetime import timedelta
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.filters import BlockedUsersFilter
+from core.renderers import EventStreamRenderer
+from .broker import get_broker, publish_events
 from .models import Event
-from .serializers import EventSerializer
+from .serializers import EventAckSerializer, EventSerializer
 
 
 class EventViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
     """
     Event viewset.
+
+    list:
+        Входящие события текущего пользователя
+        (`?undelivered=true` - только недоставленные) за последние
+        EVENTS_INBOX_DAYS дней или начиная с `?since=<ISO 8601>`.
     """
     lookup_field = 'uuid'
     queryset = Event.objects.all()
     serializer_class = EventSerializer
+    filter_backends = (BlockedUsersFilter,)
+    blocked_users_filter_field = 'sender'
+
+    def get_queryset(self):
+        """
+        Только события, адресованные текущему пользователю.
+
+        Окно по created_at ограничивает запрос последними партициями.
+        """
+        if getattr(self, 'swagger_fake_view', False):
+            return super().get_queryset().none()
+        queryset = super().get_queryset().filter(created_at__gte=self.get_since())
+        if self.request.query_params.get('undelivered') in ('1', 'true'):
+            return queryset.undelivered(self.request.user)
+        return queryset.for_recipient(self.request.user)
+
+    def get_since(self):
+        since = self.request.query_params.get('since')
+        if since is None:
+            return timezone.now() - timedelta(days=settings.EVENTS_INBOX_DAYS)
+        try:
+            value = parse_datetime(since)
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValidationError({'since': 'Invalid datetime format.'})
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.utc)
+        return value
 
     def perform_create(self, serializer):
-        serializer.save(sender=self.request.user)
+        event = serializer.save(sender=self.request.user)
+        transaction.on_commit(lambda: publish_events([event]))
+
+    @swagger_auto_schema(
+        request_body=EventSerializer(many=True),
+        responses={201: 'UUIDs of created events.'}
+    )
+    @action(methods=['post'], detail=False)
+    def bulk(self, request, *args, **kwargs):
+        """ Создание пачки событий одним запросом. """
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False)
+        serializer.is_valid(raise_exception=True)
+        events = serializer.save(sender=request.user)
+        return Response(
+            {'uuids': [event.uuid for event in events]},
+            status=status.HTTP_201_CREATED
+        )
+
+    @swagger_auto_schema(
+        request_body=EventAckSerializer,
+        responses={200: 'Number of acknowledged events.'}
+    )
+    @action(methods=['post'], detail=False, serializer_class=EventAckSerializer)
+    def ack(self, request, *args, **kwargs):
+        """ Отметка о доставке нескольких событий. """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        count = self.get_queryset().ack(request.user, serializer.validated_data['uuids'])
+        return Response({'acknowledged': count}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(responses={200: 'Server-Sent Events stream.'})
+    @action(methods=['get'], detail=False,
+            renderer_classes=(EventStreamRenderer, JSONRenderer))
+    def stream(self, request, *args, **kwargs):
+        """
+        Поток новых событий (Server-Sent Events).
+
+        После переподключения с заголовком Last-Event-ID пропущенные
+        события досылаются из базы. Событие `reset` означает, что
+        клиент отстал и должен перечитать список через REST.
+        """
+        last_id = request.META.get('HTTP_LAST_EVENT_ID') or \
+            request.query_params.get('last_event_id')
+        try:
+            last_id = int(last_id) if last_id is not None else None
+        except ValueError:
+            last_id = None
+
+        response = StreamingHttpResponse(
+            self._event_stream(request.user, last_id),
+            content_type=EventStreamRenderer.media_type
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def _release_connection():
+        """ Соединение с базой не держится, пока поток ждет сообщений. """
+        if not connection.in_atomic_block:
+            connection.close()
+
+    def _event_stream(self, user, last_id):
+        subscription = get_broker().subscribe(str(user.uuid))
+        blocked = {
+            str(uuid) for uuid in get_user_model().objects
+            .filter(pk__in=user.get_block_set()).values_list('uuid', flat=True)
+        }
+        try:
+            if last_id is not None:
+                limit = settings.EVENTS_STREAM_REPLAY_LIMIT
+                missed = list(
+                    self.filter_queryset(self.get_queryset())
+                    .filter(pk__gt=last_id).order_by('pk')[:limit + 1]
+                )
+                if len(missed) > limit:
+                    yield self._format('reset', {'detail': 'Too many missed events.'})
+                    return
+                for event in missed:
+                    last_id = event.pk
+                    yield self._format('event', self.get_serializer(event).data, event.pk)
+
+            self._release_connection()
+            deadline = time.monotonic() + settings.EVENTS_STREAM_TIMEOUT
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=settings.EVENTS_STREAM_KEEPALIVE)
+                if subscription.overflowed:
+                    yield self._format('reset', {'detail': 'Stream overflowed.'})
+                    return
+                if message is None:
+                    yield ': keepalive\n\n'
+                    continue
+                if last_id is not None and message['id'] <= last_id:
+                    continue
+                if str(message['data'].get('sender')) in blocked:
+                    continue
+                last_id = message['id']
+                yield self._format('event', message['data'], message['id'])
+        finally:
+            subscription.close()
+
+    @staticmethod
+    def _format(event, data, event_id=None):
+        """ Сообщение в формате text/event-stream. """
+        message = f'event: {event}\n'
+        if event_id is not None:
+            message += f'id: {event_id}\n'
+        return message + f'data: {json.dumps(data, cls=JSONEncoder)}\n\n'
@@ -0,0 +1,68 @@
+import json
+import subprocess
+
+from django.conf import settings
+
+from core.exceptions import TranscodingError
+
+
+def probe_duration(path):
+    """ Длительность медиафайла в секундах (по данным ffprobe). """
+    output = subprocess.check_output([
+        settings.FFPROBE_BINARY,
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'json',
+        path,
+    ])
+    duration = json.loads(output).get('format', {}).get('duration')
+    return float(duration) if duration else None
+
+
+def parse_progress(line, duration):
+    """
+    Доля выполнения (от 0 до 1) из строки вывода `ffmpeg -progress`.
+
+    Возвращает None для строк, не относящихся к прогрессу.
+    """
+    key, _, value = line.strip().partition('=')
+    if key == 'progress' and value == 'end':
+        return 1.0
+
+    # Несмотря на название, out_time_ms тоже в микросекундах
+    if key in ('out_time_us', 'out_time_ms') and duration:
+        try:
+            elapsed = int(value) / 1000000
+        except ValueError:
+            return None
+        return max(0.0, min(elapsed / duration, 1.0))
+
+    return None
+
+
+def transcode(args, duration=None, on_progress=None):
+    """
+    Запуск ffmpeg с указанными аргументами.
+
+    Прогресс читается из `-progress pipe:1` и передается в on_progress.
+    """
+    command = [
+        settings.FFMPEG_BINARY,
+        '-hide_banner', '-nostats', '-loglevel', 'error', '-y',
+        '-progress', 'pipe:1',
+        *args
+    ]
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    for line in process.stdout:
+        progress = parse_progress(line, duration)
+        if progress is not None and on_progress:
+            on_progress(progress)
+
+    _, errors = process.communicate()
+    if process.returncode != 0:
+        raise TranscodingError(errors.strip() or f'ffmpeg exited with {process.returncode}')
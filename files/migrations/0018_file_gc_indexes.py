@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0017_auto_20190416_1903'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(is_uploaded=False), fields=['created_at'], name='files_not_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['deleted_at'], name='files_deleted_idx'),
+        ),
+    ]
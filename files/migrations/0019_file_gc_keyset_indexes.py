@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0018_file_gc_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_not_uploaded_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_deleted_idx',
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(is_uploaded=False), fields=['created_at', 'id'], name='files_not_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['deleted_at', 'id'], name='files_deleted_idx'),
+        ),
+    ]
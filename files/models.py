@@ -17,6 +17,18 @@ class FileManager(CustomManager):
         return self.filter(is_uploaded=True)
 
 
+def get_placeholder(metadata):
+    """ Плейсхолдер изображения (LQIP) из метаданных файла. """
+    if not metadata or not metadata.get('placeholder'):
+        return None
+    return {
+        'thumbnail': metadata['placeholder'],
+        'color': metadata.get('color'),
+        'width': int(metadata.get('width') or 0),
+        'height': int(metadata.get('height') or 0),
+    }
+
+
 def rename_to_uuid(instance, filename):
     """ Renames the file name to its UUID. """
     return str(instance.uuid)
@@ -96,10 +108,28 @@ class File(BaseModel):
     metadata = HStoreField(null=True)
 
     objects = FileManager()
+    all_objects = CustomManager()
 
     class Meta:
         db_table = 'files'
+        indexes = [
+            # Для сборщика мусора: брошенные и удаленные файлы
+            models.Index(
+                fields=['created_at', 'id'],
+                name='files_not_uploaded_idx',
+                condition=models.Q(is_uploaded=False),
+            ),
+            models.Index(
+                fields=['deleted_at', 'id'],
+                name='files_deleted_idx',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
+        ]
 
     @cached_property
     def owner(self):
         return self.user
+
+    @property
+    def placeholder(self):
+        return get_placeholder(self.metadata)
@@ -6,7 +6,7 @@ from rest_framework import serializers
 
 from core.fields import TimestampField
 
-from .models import File
+from .models import File, get_placeholder
 
 
 class FileSerializer(serializers.ModelSerializer):
@@ -19,12 +19,14 @@ class FileSerializer(serializers.ModelSerializer):
     timestamp = TimestampField(source='created_at', required=False)
     type = serializers.CharField(source='file_type')
     metadata = serializers.HStoreField(allow_null=True, read_only=False)
+    placeholder = serializers.SerializerMethodField()
 
     class Meta:
         model = File
         fields = (
             'uuid', 'orig_name', 'url', 'size', 'type', 'mime_type',
             'timestamp', 'is_uploaded', 'is_compressed', 'metadata',
+            'placeholder',
         )
 
     @staticmethod
@@ -32,6 +34,13 @@ class FileSerializer(serializers.ModelSerializer):
         """ Размер файла в байтах (не зависит от типа стораджа). """
         return getattr(obj, 'size', getattr(obj, 'file.size', None))
 
+    @staticmethod
+    def get_placeholder(obj) -> dict:
+        """ Плейсхолдер изображения для отрисовки до загрузки превью. """
+        if isinstance(obj, dict):
+            return get_placeholder(obj.get('metadata'))
+        return obj.placeholder
+
     @staticmethod
     def get_url(obj):
         """ Публичный URL для доступа к файлу. """
@@ -84,6 +93,17 @@ class SignQueryParamsSerializer(UploadQueryParamsSerializer):
     is_private = serializers.BooleanField(default=False, required=False)
 
 
+class SignBatchSerializer(serializers.Serializer):
+    """
+    Batch of file descriptors for pre-signed upload.
+    """
+    files = serializers.ListField(
+        child=SignQueryParamsSerializer(),
+        min_length=1,
+        max_length=settings.MAX_SIGN_BATCH_SIZE
+    )
+
+
 class SignedFormDataSerializer(serializers.Serializer):
     """
     Pre-signed form data ready for direct upload.
@@ -1,14 +1,27 @@
+import io
 import os
 import json
+import time
 import uuid
+import base64
 import hashlib
+import logging
+from datetime import timedelta
 
 from PIL import Image
+from celery import shared_task
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
 
+from core.utils import get_storage_client
 from oraaange import celery_app
+from . import ffmpeg
 from .models import File
 
+logger = logging.getLogger(__name__)
+
 
 class FileTask(celery_app.Task):
     """
@@ -24,8 +37,33 @@ class FileTask(celery_app.Task):
         'hq': (1920, 1080)  # 1080p
     }
 
+    # Opus bitrate for audio and voice messages
+    AUDIO_BITRATES = {
+        File.Type.AUDIO: '96k',
+        File.Type.SPEECH: '24k',
+    }
+
+    # HLS variants: (height, video kbps, audio kbps)
+    VIDEO_PROFILES = {
+        'lq': (480, 800, 96),    # 480p
+        'mq': (720, 2500, 128),  # 720p
+    }
+    HLS_SEGMENT_TIME = 6
+
+    # Low-quality image placeholder (LQIP)
+    PLACEHOLDER_TYPES = (File.Type.AVATAR, File.Type.IMAGE, File.Type.PORTFOLIO)
+    PLACEHOLDER_SIZE = (16, 16)
+
+    # Handlers which don't work with images
+    MEDIA_HANDLERS = (
+        File.Handler.NONE,
+        File.Handler.AUDIO_ENCODING,
+        File.Handler.VIDEO_ENCODING,
+    )
+
     def __init__(self):
         self.file = None
+        self.progress = 0.0
         self.meta_dir = os.path.join(
             self.MINIO_PATH,
             '.minio.sys/buckets',
@@ -41,15 +79,20 @@ class FileTask(celery_app.Task):
 
         # Get file entry
         self.file = File.objects.get(uuid=file_uuid)
+        self.progress = 0.0
 
-        # Default handler
-        if self.file.handler != self.file.Handler.NONE:
+        # Default handler (images only)
+        if self.file.handler not in self.MEDIA_HANDLERS:
             self._handle_default(file_uuid)
 
         # Run specific file handler
         if self.file.handler:
             getattr(self, f'_handle_{self.file.handler}')(file_uuid)
 
+        # Placeholder for instant rendering on clients
+        if self.file.file_type in self.PLACEHOLDER_TYPES:
+            self._make_placeholder(file_uuid)
+
         # Mark file as compressed and ready
         self.file.is_compressed = True
         self.file.save()
@@ -76,7 +119,153 @@ class FileTask(celery_app.Task):
         pass
 
     def _handle_speech(self, file_name):
-        raise NotImplementedError
+        """
+        Voice message encoding (Opus at speech bitrate).
+        """
+        self._encode_audio(file_name, File.Type.SPEECH)
+
+    def _handle_audio_enc(self, file_name):
+        """
+        Audio encoding to Opus (bitrate depends on file type).
+        """
+        self._encode_audio(file_name, self.file.file_type)
+
+    def _handle_video_enc(self, file_name):
+        """
+        Video encoding to HLS segments (one playlist per profile)
+        with master playlist and poster frame.
+        """
+        source = self._get_full_path(file_name)
+        duration = ffmpeg.probe_duration(source)
+        hls_prefix = os.path.join('hls', file_name)
+
+        profiles_count = len(self.VIDEO_PROFILES)
+        for num, (quality, profile) in enumerate(self.VIDEO_PROFILES.items()):
+            height, video_bitrate, audio_bitrate = profile
+            output_dir = self._get_full_path(hls_prefix, quality)
+            os.makedirs(output_dir, exist_ok=True)
+
+            ffmpeg.transcode([
+                '-i', source,
+                '-vf', f"scale=-2:'min({height},ih)'",
+                '-c:v', 'libx264', '-preset', 'veryfast',
+                '-b:v', f'{video_bitrate}k',
+                '-maxrate', f'{video_bitrate}k',
+                '-bufsize', f'{video_bitrate * 2}k',
+                '-c:a', 'aac', '-b:a', f'{audio_bitrate}k',
+                '-f', 'hls',
+                '-hls_time', str(self.HLS_SEGMENT_TIME),
+                '-hls_playlist_type', 'vod',
+                '-hls_segment_filename', os.path.join(output_dir, 'seg_%05d.ts'),
+                os.path.join(output_dir, 'index.m3u8'),
+            ], duration, lambda value: self._report_progress((num + value) / profiles_count))
+
+            for segment in os.listdir(output_dir):
+                self._copy_meta_data(
+                    segment,
+                    os.path.join(hls_prefix, quality),
+                    self._get_hls_content_type(segment)
+                )
+
+        # Master playlist with all variants
+        with open(self._get_full_path(hls_prefix, 'index.m3u8'), 'w') as fp:
+            fp.write('#EXTM3U\n')
+            for quality, (_, video_bitrate, audio_bitrate) in self.VIDEO_PROFILES.items():
+                bandwidth = (video_bitrate + audio_bitrate) * 1000
+                fp.write(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}\n')
+                fp.write(f'{quality}/index.m3u8\n')
+        self._copy_meta_data('index.m3u8', hls_prefix, 'application/vnd.apple.mpegurl')
+
+        # Poster frame
+        os.makedirs(self._get_full_path('poster'), exist_ok=True)
+        ffmpeg.transcode([
+            '-ss', str(min(1.0, (duration or 0) / 2)),
+            '-i', source,
+            '-frames:v', '1',
+            '-f', 'image2', '-c:v', 'mjpeg',
+            self._get_full_path('poster', file_name),
+        ])
+        self._copy_meta_data(file_name, 'poster', 'image/jpeg')
+
+        self._update_metadata(
+            duration=duration,
+            hls=os.path.join(hls_prefix, 'index.m3u8'),
+            poster=os.path.join('poster', file_name),
+        )
+
+    def _make_placeholder(self, file_name):
+        """
+        Tiny base64 thumbnail, dominant color and dimensions of image.
+        Avatar placeholder is also denormalised to the user.
+        """
+        image = Image.open(self._get_full_path(file_name))
+        width, height = image.size
+
+        thumbnail = image.convert('RGB')
+        thumbnail.thumbnail(self.PLACEHOLDER_SIZE, Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, 'JPEG', quality=40, optimize=True)
+        encoded = base64.b64encode(buffer.getvalue()).decode()
+        red, green, blue = thumbnail.resize((1, 1), Image.BOX).getpixel((0, 0))
+
+        self._update_metadata(
+            placeholder=f'data:image/jpeg;base64,{encoded}',
+            color=f'#{red:02x}{green:02x}{blue:02x}',
+            width=width,
+            height=height,
+        )
+
+        if self.file.file_type == File.Type.AVATAR or \
+                self.file.handler == File.Handler.AVATAR:
+            get_user_model().objects.filter(
+                pk=self.file.user_id, avatar_uuid=self.file.uuid
+            ).update(avatar_placeholder=self.file.placeholder)
+
+    def _encode_audio(self, file_name, file_type):
+        """ Audio encoding to Opus in Ogg container. """
+        source = self._get_full_path(file_name)
+        duration = ffmpeg.probe_duration(source)
+        is_speech = file_type == File.Type.SPEECH
+        bitrate = self.AUDIO_BITRATES.get(file_type, self.AUDIO_BITRATES[File.Type.AUDIO])
+
+        os.makedirs(self._get_full_path('opus'), exist_ok=True)
+        ffmpeg.transcode([
+            '-i', source,
+            '-vn',
+            '-c:a', 'libopus', '-b:a', bitrate,
+            '-application', 'voip' if is_speech else 'audio',
+            '-f', 'ogg',
+            self._get_full_path('opus', file_name),
+        ], duration, self._report_progress)
+        self._copy_meta_data(file_name, 'opus', 'audio/ogg')
+
+        self._update_metadata(
+            duration=duration,
+            opus=os.path.join('opus', file_name),
+        )
+
+    def _report_progress(self, value):
+        """ Progress of transcoding (saved on every 10%). """
+        if value < 1.0 and value - self.progress < 0.1:
+            return
+        self.progress = value
+        logger.info(f'File {self.file.uuid} processing: {value:.0%}')
+        self._update_metadata(progress=round(value, 2))
+
+    def _update_metadata(self, duration=None, **values):
+        """ Update metadata of file (HStore keeps only strings). """
+        metadata = dict(self.file.metadata or {})
+        if duration:
+            metadata['duration'] = str(round(duration))
+        metadata.update({key: str(value) for key, value in values.items()})
+        self.file.metadata = metadata
+        File.objects.filter(pk=self.file.pk).update(metadata=metadata)
+
+    @staticmethod
+    def _get_hls_content_type(file_name):
+        if file_name.endswith('.m3u8'):
+            return 'application/vnd.apple.mpegurl'
+        return 'video/mp2t'
 
     def _handle_avatar(self, file_name):
         """
@@ -119,10 +308,7 @@ class FileTask(celery_app.Task):
             }
         }
         meta_path = os.path.join(self.meta_dir, quality, file_name)
-        try:
-            os.mkdir(meta_path)
-        except FileExistsError:
-            pass
+        os.makedirs(meta_path, exist_ok=True)
         data['meta']['etag'] = hashlib.md5(file_name.encode()).hexdigest()
         with open(os.path.join(meta_path, 'fs.json'), 'w') as fp:
             data['meta']['content-type'] = content_type
@@ -130,3 +316,111 @@ class FileTask(celery_app.Task):
 
 
 celery_app.tasks.register(FileTask())
+
+
+# Prefixes of derivative objects created by FileTask
+DERIVATIVE_PREFIXES = ('lq', 'mq', 'hq', 'av', 'opus', 'poster')
+
+
+def _get_storage_objects(client, file):
+    """ Все объекты в хранилище, относящиеся к файлу. """
+    file_name = str(file.uuid)
+    objects = [file_name]
+    objects.extend(f'{prefix}/{file_name}' for prefix in DERIVATIVE_PREFIXES)
+    if file.metadata and file.metadata.get('hls'):
+        objects.extend(
+            obj.object_name for obj in client.list_objects(
+                settings.AWS_STORAGE_BUCKET_NAME,
+                prefix=f'hls/{file_name}/',
+                recursive=True
+            )
+        )
+    return objects
+
+
+def _remove_storage_objects(client, owners):
+    """
+    Удаление объектов из хранилища.
+
+    Возвращает pk файлов, объекты которых удалить не удалось.
+    """
+    failed = set()
+    # Ошибки удаления приходят лениво, итератор нужно вычитать
+    for error in client.remove_objects(settings.AWS_STORAGE_BUCKET_NAME, list(owners)):
+        if error.error_code != 'NoSuchKey':
+            logger.warning(f'Unable to remove {error.object_name}: {error.error_message}')
+            failed.add(owners[error.object_name])
+    return failed
+
+
+def _iter_batches(queryset, field):
+    """ Пачки файлов по ключу (field, pk) - keyset-пагинация. """
+    queryset = queryset.order_by(field, 'pk')
+    files = list(queryset[:settings.FILES_GC_BATCH_SIZE])
+    while files:
+        yield files
+        last = files[-1]
+        value = getattr(last, field)
+        files = list(queryset.filter(
+            Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': last.pk})
+        )[:settings.FILES_GC_BATCH_SIZE])
+
+
+def _collect_files(client, files, dry_run):
+    """ Удаление пачки файлов, возвращает удаленные и число объектов. """
+    owners = {}
+    for file in files:
+        for object_name in _get_storage_objects(client, file):
+            owners[object_name] = file.pk
+
+    failed = set()
+    if not dry_run:
+        failed = _remove_storage_objects(client, owners)
+
+    collected = [file for file in files if file.pk not in failed]
+    if not dry_run:
+        File.all_objects.filter(
+            pk__in=[file.pk for file in collected]
+        ).delete()
+    return collected, sum(1 for pk in owners.values() if pk not in failed)
+
+
+@shared_task
+def collect_garbage(dry_run=False):
+    """
+    Удаление брошенных (не загруженных) и давно удаленных файлов
+    вместе со всеми производными объектами в хранилище.
+    """
+    now = timezone.now()
+    abandoned = Q(
+        is_uploaded=False,
+        created_at__lt=now - timedelta(seconds=settings.FILES_GC_ABANDONED_AFTER)
+    )
+    deleted = Q(
+        deleted_at__lt=now - timedelta(seconds=settings.FILES_GC_DELETED_AFTER)
+    )
+    # Каждый вид мусора обходится по своему частичному индексу
+    sources = (
+        ('abandoned', File.all_objects.filter(abandoned), 'created_at'),
+        ('deleted', File.all_objects.filter(deleted).exclude(abandoned), 'deleted_at'),
+    )
+
+    client = get_storage_client()
+    report = {'abandoned': 0, 'deleted': 0, 'objects': 0}
+    batches = 0
+    for kind, queryset, field in sources:
+        for files in _iter_batches(queryset, field):
+            if batches and settings.FILES_GC_BATCH_DELAY:
+                time.sleep(settings.FILES_GC_BATCH_DELAY)
+            batches += 1
+
+            collected, objects = _collect_files(client, files, dry_run)
+            report[kind] += len(collected)
+            report['objects'] += objects
+            if batches >= settings.FILES_GC_MAX_BATCHES:
+                break
+        if batches >= settings.FILES_GC_MAX_BATCHES:
+            break
+
+    logger.info(f'Files garbage collected (dry_run={dry_run}): {report}')
+    return report
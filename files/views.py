@@ -1,11 +1,15 @@
 import uuid
 from mimetypes import guess_type
 from datetime import timedelta, datetime
+from urllib.parse import unquote
 
 import minio
+from celery import group
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, PositiveIntegerField, Value, When
 from django.utils import timezone
-from django.core.exceptions import SuspiciousOperation, ObjectDoesNotExist
+from django.core.exceptions import SuspiciousOperation
 from rest_framework import viewsets, mixins, status, parsers, permissions
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
@@ -17,14 +21,14 @@ from minio.error import ResponseError
 from core.serializers import EmptySerializer
 from core.permissions import OnlyOwnerAllowedEdit
 from core.constants import MULTIMEDIA_FILE_TYPES
-from core.utils import get_file_type
+from core.utils import get_file_type, get_storage_client
 from .models import File
 from .tasks import FileTask
 # from .forms import UploadForm
 from .filters import FileFilter
 from .serializers import (
     FileSerializer, UploadSerializer, SignQueryParamsSerializer,
-    SignedFormDataSerializer, UploadQueryParamsSerializer
+    SignedFormDataSerializer, UploadQueryParamsSerializer, SignBatchSerializer
 )
 
 
@@ -77,7 +81,7 @@ class FileViewSet(mixins.RetrieveModelMixin,
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
         # form = UploadForm(request.POST, request.FILES)
         # file_name = form.files['file'].name
-        # file_type = self._get_file_type(request, file_name)
+        # file_type = self._get_file_type(file_name, request.GET.get('type'))
         #
         # if form.is_valid():
         #     uploaded = request.user.files.create(
@@ -107,10 +111,64 @@ class FileViewSet(mixins.RetrieveModelMixin,
         query_serializer = SignQueryParamsSerializer(data=request.GET)
         query_serializer.is_valid(raise_exception=True)
 
+        # Подписываем загрузку с указанным policy
+        try:
+            signed_data, file = self._sign_file(
+                get_storage_client(), query_serializer.validated_data
+            )
+        except ResponseError as err:
+            return Response(
+                data={'detail': str(err)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        # Create new file entry
+        file.save()
+        return Response(signed_data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        request_body=SignBatchSerializer,
+        responses={201: SignedFormDataSerializer(many=True)},
+    )
+    @action(methods=['post'], detail=False)
+    def sign_batch(self, request):
+        """
+        Пакетное подписание прямой загрузки нескольких файлов.
+
+        Возвращает подписанные формы в порядке переданных файлов.
+        """
+        serializer = SignBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        client = get_storage_client()
+        try:
+            signed = [
+                self._sign_file(client, params)
+                for params in serializer.validated_data['files']
+            ]
+        except ResponseError as err:
+            return Response(
+                data={'detail': str(err)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        # Все записи о файлах создаются одним запросом
+        File.objects.bulk_create([file for _, file in signed])
+        return Response(
+            [signed_data for signed_data, _ in signed],
+            status=status.HTTP_201_CREATED
+        )
+
+    def _sign_file(self, client, params):
+        """
+        Подписывает загрузку одного файла.
+
+        Возвращает данные подписанной формы и еще не сохраненный File.
+        """
         file_uuid = str(uuid.uuid4())
-        orig_name = request.GET['orig_name']
+        orig_name = params['orig_name']
         mime_type = guess_type(orig_name)[0] or 'application/octet-stream'
-        file_type = self._get_file_type(request, orig_name)
+        file_type = self._get_file_type(orig_name, params.get('type'))
 
         post_policy = minio.PostPolicy()
         post_policy.set_bucket_name(settings.AWS_STORAGE_BUCKET_NAME)
@@ -118,57 +176,41 @@ class FileViewSet(mixins.RetrieveModelMixin,
         post_policy.set_expires(datetime.utcnow() + timedelta(days=1))
         post_policy.set_content_type(mime_type)
 
-        if query_serializer.validated_data.get('type') == 'video':
+        if params.get('type') == 'video':
             post_policy.set_content_length_range(10, 100 * 1 << 20)    # 100 MB
         else:
             post_policy.set_content_length_range(1, 10 * 1 << 50)      # 50 MB
 
-        client = minio.Minio(settings.AWS_S3_ENDPOINT_URL.replace('http://', ''),
-                             access_key=settings.AWS_ACCESS_KEY_ID,
-                             secret_key=settings.AWS_SECRET_ACCESS_KEY,
-                             secure=False)
-        # Подписываем загрузку с указанным policy
-        try:
-            file_data = {
-                'uuid': file_uuid,
-                'user': request.user,
-                'file_type': file_type,
-                'orig_name': orig_name,
-                'mime_type': mime_type,
-                'handler': query_serializer.validated_data.get('handler'),
-                'is_private': query_serializer.validated_data['is_private'],
-                'is_uploaded': False,
-            }
-
-            target_url, signed_form_data = client.presigned_post_policy(post_policy)
-            query_params = {
-                'target_url': target_url,
-                'content-type': mime_type,
-                **signed_form_data
-            }
-            if query_serializer.validated_data.get('duration'):
-                audio_duration = query_serializer.validated_data.get('duration')
-                query_params['x-amz-meta-duration'] = audio_duration
-                file_data['metadata'] = {'duration': audio_duration}
-
-            serializer = SignedFormDataSerializer(data=query_params)
-            serializer.is_valid(raise_exception=True)
-
-            # Create new file entry
-            assert File.objects.create(**file_data)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        except ResponseError as err:
-            return Response(
-                data={'detail': str(err)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        file = File(
+            uuid=file_uuid,
+            user=self.request.user,
+            file_type=file_type,
+            orig_name=orig_name,
+            mime_type=mime_type,
+            handler=params.get('handler'),
+            is_private=params['is_private'],
+            is_uploaded=False,
+        )
+
+        target_url, signed_form_data = client.presigned_post_policy(post_policy)
+        query_params = {
+            'target_url': target_url,
+            'content-type': mime_type,
+            **signed_form_data
+        }
+        if params.get('duration'):
+            audio_duration = params.get('duration')
+            query_params['x-amz-meta-duration'] = audio_duration
+            file.metadata = {'duration': audio_duration}
+
+        serializer = SignedFormDataSerializer(data=query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.data, file
 
     @staticmethod
-    def _get_file_type(request, file_name):
+    def _get_file_type(file_name, file_type=None):
 
         # Тип файла можно форсить через query params
-        file_type = request.GET.get('type', None)
         if file_type and \
                 file_type not in MULTIMEDIA_FILE_TYPES + [File.Type.DOCUMENT]:
             raise SuspiciousOperation   # Какой-то мусор в значении
@@ -180,38 +222,72 @@ class FileViewSet(mixins.RetrieveModelMixin,
         return file_type
 
 
+def _get_object_uuid(key):
+    """ UUID файла из ключа объекта в стораджe (с префиксом бакета или без). """
+    key = unquote(key).lstrip('/')
+    bucket_prefix = f'{settings.AWS_STORAGE_BUCKET_NAME}/'
+    if key.startswith(bucket_prefix):
+        key = key[len(bucket_prefix):]
+    return uuid.UUID(key)
+
+
+def _process_uploaded_files(file_uuids):
+    """ Конвертация загруженных файлов одной группой тасков. """
+    task = FileTask()
+    group(task.si(str(file_uuid)) for file_uuid in file_uuids).delay()
+
+
 @api_view(['POST'])
 @swagger_auto_schema(auto_schema=False)
 @permission_classes((permissions.AllowAny,))
 def minio_webhook(request):
-    """ Вебхук для событий от стораджа. """
-    uploaded = False
-    data = request.data
-    if data['EventName'].startswith('s3:ObjectCreated:'):
-        uploaded = True
+    """
+    Вебхук для событий от стораджа.
 
-    file_name = data['Key'] \
-        .lstrip(settings.AWS_STORAGE_BUCKET_NAME) \
-        .lstrip('/')
+    Обрабатывает все события из уведомления разом: загруженные файлы
+    помечаются одним UPDATE, а их конвертация ставится в очередь группой.
+    """
+    data = request.data
 
     # TODO: Можно так же отлавливать и считать просмотры.
 
+    file_uuids = set()
+    uploaded_sizes = {}
     try:
-        uuid.UUID(file_name)
-        file = File.objects.get(uuid=file_name)
-        if uploaded:
-            # Указывается размер и Файл помечается загруженным
-            file.is_uploaded = True
-            file.file_size = int(data['Records'][0]['s3']['object']['size'])
-            file.save()
-
-            # Конвертация файла в асинхронном режиме
-            FileTask().delay(str(file.uuid))
-
-    except ObjectDoesNotExist:
+        for record in data.get('Records') or []:
+            s3_object = record['s3']['object']
+            file_uuid = _get_object_uuid(s3_object['key'] or data['Key'])
+            file_uuids.add(file_uuid)
+            if record['eventName'].startswith('s3:ObjectCreated:'):
+                uploaded_sizes[file_uuid] = int(s3_object['size'])
+
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    if not File.objects.filter(uuid__in=file_uuids).exists():
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    except ValueError:
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+    with transaction.atomic():
+        # Повторные уведомления не запускают обработку заново: берутся только
+        # еще не загруженные файлы, уже залоченные параллельным запросом
+        # пропускаются.
+        pending = list(
+            File.objects.select_for_update(skip_locked=True)
+            .filter(uuid__in=uploaded_sizes, is_uploaded=False)
+            .values_list('uuid', flat=True)
+        )
+        if pending:
+            # Указывается размер и файлы помечаются загруженными
+            File.objects.filter(uuid__in=pending).update(
+                is_uploaded=True,
+                file_size=Case(
+                    *[When(uuid=file_uuid, then=Value(uploaded_sizes[file_uuid]))
+                      for file_uuid in pending],
+                    output_field=PositiveIntegerField()
+                )
+            )
+
+            # Конвертация файлов в асинхронном режиме
+            transaction.on_commit(lambda: _process_uploaded_files(pending))
 
     return Response(status=status.HTTP_200_OK)
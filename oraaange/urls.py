@@ -11,6 +11,7 @@ from rest_framework.documentation import include_docs_urls
 from rest_framework.routers import DefaultRouter
 from rest_framework_jwt.views import RefreshJSONWebToken
 
+from abuses.views import AdAbuseQueueViewSet, UserAbuseQueueViewSet
 from ads.views import AdViewSet
 from contacts.views import ContactViewSet
 from core.views import ping
@@ -46,6 +47,8 @@ router.register(r'locations', LocationViewSet, basename='location')
 router.register(r'init', InitialViewSet, basename='initial')
 router.register(r'users', UserViewSet)
 router.register(r'files', FileViewSet)
+router.register(r'moderation/user-abuses', UserAbuseQueueViewSet, basename='userabuse-queue')
+router.register(r'moderation/ad-abuses', AdAbuseQueueViewSet, basename='adabuse-queue')
 
 
 # Urlpattern
@@ -8,10 +8,17 @@ https://docs.djangoproject.com/en/1.11/howto/deployment/wsgi/
 """
 
 import os
+import sys
 
 from whitenoise import WhiteNoise
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oraaange.settings")
 
+# gunicorn -k gevent: запросы к PostgreSQL не блокируют остальные гринлеты
+# воркера (потоки событий SSE ждут сообщений, не занимая процесс)
+if 'gevent' in sys.modules:
+    from core.green import make_psycopg_green
+    make_psycopg_green()
+
 application = WhiteNoise(get_wsgi_application())
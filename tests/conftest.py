@@ -4,12 +4,14 @@ import pytest
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Point
 from django.core import management
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework import status
 
 from ads.models import Ad
 from core.utils import get_random_phone
 from users.models import SMSCode
+from users.presence import get_presence_store
 
 
 def pytest_configure(config):
@@ -36,6 +38,13 @@ def enable_db_access_for_all_tests(db):
     pass
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """ Кеш не должен переживать откат базы между тестами. """
+    cache.clear()
+    get_presence_store().clear()
+
+
 @pytest.fixture(scope='function')
 def jwt_token_by_user(client, request):
     """ JWT token. """
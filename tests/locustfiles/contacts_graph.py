@@ -0,0 +1,32 @@
+"""
+JWT_TOKEN=... USER_UUID=... pipenv run locust -f tests/locustfiles/contacts_graph.py -H http://localhost:8000
+
+Contact graph should be generated first: python manage.py gencontacts
+"""
+import os
+
+from locust import HttpLocust, TaskSet, task
+
+
+class ContactsGraphTaskSet(TaskSet):
+
+    def on_start(self):
+        self.client.headers['Authorization'] = f'Bearer {os.environ["JWT_TOKEN"]}'
+
+    @task
+    def followers(self):
+        self.client.get('/v2/contacts/followers/')
+
+    @task
+    def mutual(self):
+        self.client.get(f'/v2/users/{os.environ["USER_UUID"]}/mutual/', name='/v2/users/[uuid]/mutual/')
+
+    @task
+    def profile(self):
+        self.client.get(f'/v2/users/{os.environ["USER_UUID"]}/', name='/v2/users/[uuid]/')
+
+
+class WebsiteUser(HttpLocust):
+    task_set = ContactsGraphTaskSet
+    min_wait = 100
+    max_wait = 100
@@ -0,0 +1,24 @@
+"""
+JWT_TOKEN=... pipenv run locust -f tests/locustfiles/who_list_age.py -H http://localhost:8000
+
+Database should be filled first: python manage.py filldb -c 1000000
+"""
+import os
+
+from locust import HttpLocust, TaskSet, task
+
+
+class WhoListAgeTaskSet(TaskSet):
+
+    def on_start(self):
+        self.client.headers['Authorization'] = f'Bearer {os.environ["JWT_TOKEN"]}'
+
+    @task
+    def who_list(self):
+        self.client.get('/v2/users/who_list/?radius=250000&age=20-30&sex=F')
+
+
+class WebsiteUser(HttpLocust):
+    task_set = WhoListAgeTaskSet
+    min_wait = 100
+    max_wait = 100
@@ -1,9 +1,15 @@
 import json
 
+from django.contrib.admin import site
+from django.contrib.auth.models import Permission
+from django.core import management
 from django.urls import reverse
 from rest_framework import status
 
-from abuses.models import UserAbuse, AdAbuse
+from abuses.models import UserAbuse, AdAbuse, UserAbuseStats
+from core.tasks import notify_and_block_ad, notify_and_block_user
+from users.admin import UserAdmin
+from users.models import User
 
 
 def test_api_create_user_abuse(client, jwt_headers, example_user):
@@ -30,3 +36,132 @@ def test_api_create_ad_abuse(client, jwt_headers, example_ad):
         **jwt_headers
     )
     assert response.status_code == status.HTTP_201_CREATED
+
+
+def test_abuses_confirm_and_block_ad(example_ad, test_user, django_assert_num_queries,
+                                     django_assert_max_num_queries):
+    """ Счетчик подтвержденных жалоб и блокировка объявления. """
+    abuses = [
+        AdAbuse.objects.create(ad=example_ad, sender=test_user, reason=AdAbuse.Reason.advertising)
+        for _ in range(5)
+    ]
+    queryset = AdAbuse.objects.filter(pk__in=[abuse.pk for abuse in abuses])
+
+    # SELECT id, UPDATE жалоб, UPDATE счетчиков, SELECT пользователей
+    # для статистики (+ SAVEPOINT/RELEASE)
+    with django_assert_max_num_queries(6):
+        abuse_ids = queryset.confirm()
+    assert sorted(abuse_ids) == sorted(abuse.pk for abuse in abuses)
+    example_ad.refresh_from_db()
+    assert example_ad.confirmed_abuses_count == 5
+
+    with django_assert_num_queries(1):
+        assert notify_and_block_ad(abuse_ids) == 1
+    example_ad.refresh_from_db()
+    assert example_ad.is_blocked
+
+    AdAbuse.objects.filter(pk=abuses[0].pk).reject()
+    example_ad.refresh_from_db()
+    assert example_ad.confirmed_abuses_count == 4
+
+
+def test_abuses_confirm_and_block_user(example_user, test_user):
+    """ Пользователь блокируется после превышения порога. """
+    abuses = [
+        UserAbuse.objects.create(user=test_user, sender=example_user, reason=UserAbuse.Reason.spam)
+        for _ in range(3)
+    ]
+    abuse_ids = UserAbuse.objects.filter(pk__in=[abuse.pk for abuse in abuses]).confirm()
+    test_user.refresh_from_db()
+    assert test_user.confirmed_abuses_count == 3
+    assert notify_and_block_user(abuse_ids) == 0
+    assert not test_user.is_restricted
+
+
+def test_admin_abuses_confirm(admin_client, example_ad, test_user, mocker, settings):
+    """ Подтверждение в админке блокирует объявление по порогу. """
+    mocker.patch('django.db.transaction.on_commit', side_effect=lambda func: func())
+    mocker.patch.object(notify_and_block_ad, 'delay', side_effect=notify_and_block_ad)
+    settings.ABUSES_BLOCK_THRESHOLD = 1
+    abuses = [
+        AdAbuse.objects.create(ad=example_ad, sender=test_user, reason=AdAbuse.Reason.advertising)
+        for _ in range(2)
+    ]
+    response = admin_client.post(reverse('admin:abuses_adabuse_changelist'), {
+        'action': 'confirm',
+        '_selected_action': [abuse.pk for abuse in abuses],
+    })
+    assert response.status_code == status.HTTP_302_FOUND
+    notify_and_block_ad.delay.assert_called_once()
+    example_ad.refresh_from_db()
+    assert example_ad.confirmed_abuses_count == 2
+    assert example_ad.is_blocked
+
+
+def test_admin_user_in_adabuse_link(admin_client, example_user, example_ad, test_user):
+    """ Ссылка на жалобы на объявления пользователя ведет к ним, а не к отправленным. """
+    abuse = AdAbuse.objects.create(ad=example_ad, sender=test_user, reason=AdAbuse.Reason.advertising)
+    link = UserAdmin(User, site).in_adabuse(example_user)
+    assert f'ad__user__id__exact={example_user.id}' in link
+
+    url = reverse('admin:abuses_adabuse_changelist')
+    response = admin_client.get(url, {'ad__user__id__exact': example_user.id})
+    assert response.status_code == status.HTTP_200_OK
+    assert list(response.context['cl'].result_list) == [abuse]
+    response = admin_client.get(url, {'ad__user__id__exact': test_user.id})
+    assert list(response.context['cl'].result_list) == []
+
+
+def test_abuses_stats(example_user, test_user, example_ad, mocker):
+    """ Статистика жалоб обновляется сигналами и пересобирается командой. """
+    mocker.patch('django.db.transaction.on_commit', side_effect=lambda func: func())
+    UserAbuse.objects.create(user=test_user, sender=example_user, reason=UserAbuse.Reason.spam)
+    abuse = AdAbuse.objects.create(ad=example_ad, sender=test_user, reason=AdAbuse.Reason.advertising)
+
+    stats = UserAbuseStats.objects.get(user=test_user)
+    assert (stats.in_userabuse, stats.out_adabuse) == (1, 1)
+    stats = UserAbuseStats.objects.get(user=example_user)
+    assert (stats.out_userabuse, stats.in_adabuse, stats.in_adabuse_confirmed) == (1, 1, 0)
+
+    AdAbuse.objects.filter(pk=abuse.pk).confirm()
+    assert UserAbuseStats.objects.get(user=example_user).in_adabuse_confirmed == 1
+
+    abuse.delete()
+    UserAbuseStats.objects.all().delete()
+    management.call_command('rebuildabusestats', batch_size=2)
+    stats = UserAbuseStats.objects.get(user=example_user)
+    assert (stats.out_userabuse, stats.in_adabuse) == (1, 0)
+
+
+def test_api_abuses_queue(client, jwt_headers, example_user, test_user, another_user, mocker):
+    """ Очередь модерации: группы жалоб, курсор и подтверждение группы. """
+    mocker.patch('django.db.transaction.on_commit', side_effect=lambda func: func())
+    notify = mocker.patch.object(notify_and_block_user, 'delay')
+    response = client.get(reverse('v2:userabuse-queue-list'), **jwt_headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    example_user.user_permissions.add(Permission.objects.get(codename='change_userabuse'))
+    for sender in (example_user, another_user):
+        UserAbuse.objects.create(user=test_user, sender=sender, reason=UserAbuse.Reason.spam)
+    UserAbuse.objects.create(user=another_user, sender=example_user, reason=UserAbuse.Reason.fraud)
+
+    response = client.get(reverse('v2:userabuse-queue-list'), {'limit': 1}, **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    first = response.data['results'][0]
+    assert first['target']['uuid'] == str(test_user.uuid)
+    assert first['count'] == 2 and first['reasons'] == [UserAbuse.Reason.spam]
+
+    response = client.get(response.data['next'], **jwt_headers)
+    assert [group['target']['uuid'] for group in response.data['results']] == [str(another_user.uuid)]
+    assert response.data['next'] is None
+
+    response = client.post(
+        reverse('v2:userabuse-queue-confirm'),
+        data=json.dumps({'targets': [str(test_user.uuid)]}),
+        **jwt_headers
+    )
+    assert response.data['confirmed'] == 2
+    notify.assert_called_once()
+    assert len(notify.call_args[0][0]) == 2
+    response = client.get(reverse('v2:userabuse-queue-list'), **jwt_headers)
+    assert [group['count'] for group in response.data['results']] == [1]
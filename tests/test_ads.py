@@ -1,6 +1,8 @@
 import json
+import math
 from datetime import timedelta
 
+from django.contrib.gis.geos import Point
 from django.urls import reverse
 from django.http import QueryDict
 from django.utils import timezone
@@ -104,3 +106,87 @@ def test_api_list_archive_ads(client, jwt_headers, example_ad):
     )
     assert response.status_code == status.HTTP_200_OK
     assert response.data['count'] == 1
+
+
+def test_api_ads_tiles(client, jwt_headers, example_ad):
+    """ Векторные тайлы: кластеры, точки и HTTP-кеширование. """
+    lon, lat = example_ad.point.x, example_ad.point.y
+    z = 16
+    x = int((lon + 180) / 360 * 2 ** z)
+    y = int((1 - math.log(math.tan(math.radians(lat)) + 1 / math.cos(math.radians(lat))) / math.pi) / 2 * 2 ** z)
+
+    for url in (reverse('v2:ad-tiles', args=[0, 0, 0]), reverse('v2:ad-tiles', args=[z, x, y])):
+        response = client.get(url, **jwt_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/vnd.mapbox-vector-tile'
+        assert b'ads' in response.content
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **jwt_headers)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get(reverse('v2:ad-tiles', args=[z, x + 2, y]), **jwt_headers)
+    assert response.content == b''
+
+    response = client.get(reverse('v2:ad-tiles', args=[1, 2, 0]), **jwt_headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_api_ads_map_viewport_delta(client, jwt_headers, example_ad):
+    """ Сдвиг карты с токеном state: только вошедшие и вышедшие объекты. """
+    url = reverse('v2:ad-map')
+    response = client.get(url, {'zoom': 20, 'in_bbox': '0,0,2,2'}, **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert not response.data['delta'] and len(response.data['features']) == 1
+    state = response.data['state']
+
+    response = client.get(url, {'zoom': 20, 'in_bbox': '1,1,3,3', 'state': state}, **jwt_headers)
+    assert response.data['delta']
+    assert response.data['features'] == [] and response.data['removed'] == []
+
+    response = client.get(url, {'zoom': 20, 'in_bbox': '2,2,4,4', 'state': state}, **jwt_headers)
+    assert response.data['removed'] == [example_ad.uuid]
+
+    example_ad.save()
+    response = client.get(url, {'zoom': 20, 'in_bbox': '1,1,3,3', 'state': state}, **jwt_headers)
+    assert len(response.data['features']) == 1
+
+    # Другие фильтры - полный ответ
+    response = client.get(url, {'zoom': 20, 'in_bbox': '1,1,3,3', 'state': state, 'foo': 'bar'},
+                          **jwt_headers)
+    assert not response.data['delta']
+
+
+def test_api_ads_map_viewport_delta_removed(client, jwt_headers, example_ad):
+    """ removed - отправленные ранее объекты: перемещенные и удаленные. """
+    url = reverse('v2:ad-map')
+    params = {'zoom': 20, 'in_bbox': '0,0,2,2'}
+    state = client.get(url, params, **jwt_headers).data['state']
+
+    # Переместился за пределы viewport
+    example_ad.point = Point(5, 5)
+    example_ad.save()
+    response = client.get(url, {**params, 'state': state}, **jwt_headers)
+    assert response.data['delta'] and response.data['removed'] == [example_ad.uuid]
+    assert response.data['features'] == []
+
+    # Вернулся и удален
+    example_ad.point = Point(1.32, 1.12)
+    example_ad.save()
+    response = client.get(url, {**params, 'state': state}, **jwt_headers)
+    assert response.data['removed'] == [] and len(response.data['features']) == 1
+    state = response.data['state']
+    example_ad.deleted_at = timezone.now()
+    example_ad.save()
+    response = client.get(url, {**params, 'state': state}, **jwt_headers)
+    assert response.data['removed'] == [example_ad.uuid]
+
+
+def test_api_ads_map_compact(client, jwt_headers, example_ad):
+    """ Компактный ответ карты по столбцам. """
+    response = client.get(reverse('v2:ad-map'), {'zoom': 20, 'compact': 'true', 'columnar': 'true'},
+                          **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['type'] == 'FeatureColumns'
+    assert response.data['columns']['uuid'] == [str(example_ad.uuid)]
+    assert response.data['columns']['coordinates'] == [[1.32, 1.12]]
+    assert 'text' in response.data['columns'] and 'is_cluster' not in response.data['columns']
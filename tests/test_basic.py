@@ -1,6 +1,12 @@
+import gzip
+import json
+
+import brotli
 from django.urls import reverse
 from rest_framework import status
 
+from core import compression
+
 
 def test_ping_pong(client):
     """ Ping-pong monitoring check. """
@@ -15,6 +21,29 @@ def test_docs_index(client, jwt_headers):
     assert response.status_code == status.HTTP_200_OK
 
 
+def test_compression_middleware(client, jwt_headers):
+    """ Сжатие ответов по Accept-Encoding. """
+    url = reverse('schema-json', kwargs={'format': '.json'})
+    response = client.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0', **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response['Vary']
+    assert json.loads(gzip.decompress(response.content))['paths']
+
+    response = client.get(url, HTTP_ACCEPT_ENCODING='gzip, br', **jwt_headers)
+    assert response['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.content))['paths']
+
+    # Короткие ответы не сжимаются
+    response = client.get(reverse('ping'), HTTP_ACCEPT_ENCODING='gzip')
+    assert not response.has_header('Content-Encoding')
+
+    assert compression.negotiate('identity') is None
+    assert compression.negotiate('gzip;q=0') is None
+    assert compression.negotiate('*') == 'br'
+    assert compression.negotiate('gzip, br') == 'br'
+
+
 def test_wrong_data_input(client):
     """ Проверка неверных параметров на вход. """
     response = client.post(
@@ -1,10 +1,12 @@
 import json
 
+import pytest
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 
-from core.utils import get_random_phone
+from contacts.models import Contact
+from core.utils import get_random_phone, normalize_phone
 
 
 def test_get_contact_list(contact, client, example_user, jwt_headers):
@@ -75,6 +77,49 @@ def test_import_registered_contacts(contact, client, example_user, jwt_headers):
     assert example_user.contacts.filter(is_from_app=False).count() == importing_count
 
 
+@pytest.mark.parametrize('phone,expected', [
+    ('+7 (912) 345-67-89', '79123456789'),
+    ('8 912 345 67 89', '79123456789'),
+    ('0044 20 7946 0958', '442079460958'),
+    ('112', None),
+    ('not a phone', None),
+])
+def test_normalize_phone(phone, expected):
+    assert normalize_phone(phone) == expected
+
+
+def test_import_contacts_stream(contact, client, example_user, jwt_headers, settings):
+    """ Потоковый импорт адресной книги пачками. """
+    settings.CONTACTS_IMPORT_CHUNK_SIZE = 2
+    phones = [get_random_phone() for _ in range(3)]
+    for phone in phones:
+        get_user_model().objects.create(username=phone, is_active=True, confirm_tos=True)
+
+    lines = [
+        f'+{phones[0][0]} ({phones[0][1:4]}) {phones[0][4:]}',
+        json.dumps({'phone': phones[1]}),
+        'garbage',
+        contact.user.username,   # Уже в контактах
+        phones[2],
+        phones[2],
+        example_user.username,   # Себя не добавляем
+    ]
+    response = client.post(
+        reverse('v2:contact-import-stream'),
+        data='\n'.join(lines),
+        content_type='application/x-ndjson',
+        HTTP_AUTHORIZATION=jwt_headers['HTTP_AUTHORIZATION']
+    )
+    assert response.status_code == status.HTTP_200_OK
+    chunks = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+    assert len(chunks) == 5
+    summary = chunks.pop()
+    assert summary == {'processed': 7, 'matched': 4, 'invalid': 1, 'done': True}
+    matched = {item['phone'] for chunk in chunks for item in chunk['contacts']}
+    assert matched == set(phones) | {contact.user.username}
+    assert example_user.contacts.filter(user__username__in=phones).count() == 3
+
+
 def test_filter_contacts_is_from_app(contact, client, example_user, jwt_headers):
     """ Фильтрация списка по юзерам, которые были добавлены в приложении. """
     response = client.get(
@@ -130,3 +175,44 @@ def test_new_contact_favorite(client, example_user, test_user, jwt_headers):
     )
     assert response.status_code == status.HTTP_200_OK
     assert favorite_count + 1 == get_favorite_count()
+
+
+def test_contacts_delta_sync(contact, client, example_user, another_user, jwt_headers):
+    """ Дельта-синхронизация: изменения и удаления с момента токена. """
+    response = client.get(reverse('v2:contact-sync'), **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data['contacts']) == 1
+    assert response.data['removed'] == []
+    token = response.data['token']
+
+    client.delete(reverse('v2:contact-detail', kwargs={'uuid': contact.user.uuid}), **jwt_headers)
+    client.post(reverse('v2:contact-add', kwargs={'uuid': another_user.uuid}), **jwt_headers)
+
+    response = client.get(reverse('v2:contact-sync'), {'token': token}, **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [c['user']['uuid'] for c in response.data['contacts']] == [str(another_user.uuid)]
+    assert response.data['removed'] == [str(contact.user.uuid)]
+
+    # Повторное добавление восстанавливает удаленный контакт
+    response = client.post(reverse('v2:contact-add', kwargs={'uuid': contact.user.uuid}), **jwt_headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert example_user.contacts.filter(user=contact.user).exists()
+
+    response = client.get(reverse('v2:contact-sync'), {'token': 'bad'}, **jwt_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_followers_and_mutual_contacts(contact, client, example_user, another_user, jwt_headers):
+    """ Обратный поиск контактов и общие контакты. """
+    Contact.objects.add(another_user, [example_user.pk, contact.user.pk])
+
+    response = client.get(reverse('v2:contact-followers'), **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [u['uuid'] for u in response.data['results']] == [str(another_user.uuid)]
+
+    response = client.get(reverse('v2:user-mutual', kwargs={'uuid': another_user.uuid}), **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [u['uuid'] for u in response.data['results']] == [str(contact.user.uuid)]
+
+    response = client.get(reverse('v2:user-detail', kwargs={'uuid': another_user.uuid}), **jwt_headers)
+    assert response.data['mutual_count'] == 1
@@ -1,9 +1,17 @@
 import json
+from datetime import timedelta
 
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
+from events import broker, partitions
+from events.models import Event
 from events.serializers import EventSerializer
+from events.tasks import maintain_partitions
 
 
 def test_api_create_event(client, example_user, jwt_headers):
@@ -25,3 +33,141 @@ def test_api_create_event(client, example_user, jwt_headers):
     # Используем сериализатор для проверки данных
     serializer = EventSerializer(data=response.data)
     assert serializer.is_valid()
+
+
+def test_api_events_inbox_and_ack(client, example_user, test_user, jwt_headers):
+    """ Входящие события получателя и отметка о доставке. """
+    mine = [
+        Event.objects.create(payload={'n': n}, recipients=[str(example_user.uuid)])
+        for n in range(3)
+    ]
+    Event.objects.create(payload={}, recipients=[str(test_user.uuid)])
+
+    response = client.get(reverse('v2:event-list'), {'undelivered': 'true'}, **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['count'] == 3
+
+    response = client.post(
+        reverse('v2:event-ack'),
+        data=json.dumps({'uuids': [str(event.uuid) for event in mine[:2]]}),
+        **jwt_headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['acknowledged'] == 2
+    assert Event.objects.get(pk=mine[0].pk).delivered_to == [str(example_user.uuid)]
+
+    response = client.get(reverse('v2:event-list'), {'undelivered': 'true'}, **jwt_headers)
+    assert [e['uuid'] for e in response.data['results']] == [str(mine[2].uuid)]
+    response = client.get(reverse('v2:event-list'), **jwt_headers)
+    assert response.data['count'] == 3
+
+
+def test_api_events_stream(client, example_user, jwt_headers, mocker, settings):
+    """ Поток событий: дозагрузка пропущенных и новые события. """
+    settings.EVENTS_STREAM_KEEPALIVE = 0.01
+    mocker.patch('django.db.transaction.on_commit', side_effect=lambda func: func())
+    missed = Event.objects.create(payload={'n': 1}, recipients=[str(example_user.uuid)])
+
+    response = client.get(
+        reverse('v2:event-stream'),
+        HTTP_ACCEPT='text/event-stream',
+        HTTP_LAST_EVENT_ID='0',
+        HTTP_AUTHORIZATION=jwt_headers['HTTP_AUTHORIZATION']
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'].startswith('text/event-stream')
+    stream = iter(response.streaming_content)
+    assert next(stream).decode().startswith(f'event: event\nid: {missed.pk}\n')
+
+    client.post(
+        reverse('v2:event-list'),
+        data=json.dumps({'payload': {'n': 2}, 'recipients': [str(example_user.uuid)]}),
+        **jwt_headers
+    )
+    message = next(stream).decode()
+    while message.startswith(': keepalive'):
+        message = next(stream).decode()
+    assert '"n": 2' in message
+    response.close()
+
+
+def test_events_broker_required(settings, monkeypatch):
+    """ Без EVENTS_BROKER_URL в продакшене брокер не создается. """
+    monkeypatch.setattr(broker, '_broker', None)
+    settings.EVENTS_BROKER_URL = ''
+    settings.DEBUG = settings.TESTING = False
+    with pytest.raises(ImproperlyConfigured):
+        broker.get_broker()
+
+
+def test_api_events_inbox_window(client, example_user, jwt_headers):
+    """ Старые события не читаются без явного since. """
+    recent = Event.objects.create(payload={}, recipients=[str(example_user.uuid)])
+    old = Event.objects.create(payload={}, recipients=[str(example_user.uuid)])
+    Event.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=60))
+
+    response = client.get(reverse('v2:event-list'), **jwt_headers)
+    assert [e['uuid'] for e in response.data['results']] == [str(recent.uuid)]
+
+    since = (timezone.now() - timedelta(days=90)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    response = client.get(reverse('v2:event-list'), {'since': since}, **jwt_headers)
+    assert response.data['count'] == 2
+
+    response = client.get(reverse('v2:event-list'), {'since': 'yesterday'}, **jwt_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_events_maintain_partitions(settings):
+    """ Партиции создаются заранее, устаревшие удаляются. """
+    settings.EVENTS_RETENTION_MONTHS = 12
+    now = timezone.now()
+    old = partitions.month_start(now, -24)
+    partitions.create_partition(old)
+
+    created, removed = maintain_partitions()
+    existing = partitions.get_partitions()
+    assert partitions.partition_name(old) in removed
+    assert old not in existing
+    for months in range(settings.EVENTS_PARTITIONS_AHEAD + 1):
+        assert partitions.month_start(now, months) in existing
+
+
+def test_events_partition_from_default():
+    """ Строки из партиции по умолчанию переносятся в новую партицию. """
+    month = partitions.month_start(timezone.now(), 36)
+    event = Event.objects.create(payload={'n': 1}, recipients=[])
+    Event.objects.filter(pk=event.pk).update(created_at=month + timedelta(days=3))
+
+    assert partitions.create_partition(month) == partitions.partition_name(month)
+    assert month in partitions.get_partitions()
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id FROM "{partitions.partition_name(month)}"')
+        assert cursor.fetchall() == [(event.pk,)]
+        cursor.execute(f'SELECT count(*) FROM "{partitions.DEFAULT}"')
+        assert cursor.fetchone() == (0,)
+
+
+def test_api_events_bulk(client, example_user, test_user, jwt_headers, mocker, settings):
+    """ Пачка событий: bulk_create и COPY. """
+    mocker.patch('django.db.transaction.on_commit', side_effect=lambda func: func())
+    publish = mocker.patch('events.broker.get_broker').return_value.publish_many
+    settings.MAX_EVENTS_BULK_SIZE = 5
+    data = [
+        {'payload': {'n': n}, 'recipients': [str(test_user.uuid), 'a"b\\c']}
+        for n in range(3)
+    ]
+
+    for threshold in (1000, 2):
+        settings.EVENTS_COPY_THRESHOLD = threshold
+        response = client.post(reverse('v2:event-bulk'), data=json.dumps(data), **jwt_headers)
+        assert response.status_code == status.HTTP_201_CREATED
+        events = Event.objects.filter(uuid__in=response.data['uuids']).order_by('pk')
+        assert [event.payload['n'] for event in events] == [0, 1, 2]
+        assert all(event.sender == example_user for event in events)
+        assert events[0].recipients == [str(test_user.uuid), 'a"b\\c']
+        assert len(publish.call_args[0][0]) == 6
+
+    response = client.post(reverse('v2:event-bulk'), data=json.dumps(data * 2), **jwt_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = client.post(reverse('v2:event-bulk'), data=json.dumps([]), **jwt_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
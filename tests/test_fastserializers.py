@@ -0,0 +1,114 @@
+import json
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.urls import reverse
+from psycopg2.extras import DateTimeRange, NumericRange
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from ads.models import Ad
+from ads.serializers import AdListCollectionSerializer, AdMapCollectionSerializer
+from core.fastserializers import compile_serializer, timestamp
+from users.serializers import UserLocationSerializer
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+def assert_golden(serializer_class, queryset):
+    """ Ответ скомпилированного сериализатора совпадает с DRF побайтно. """
+    compiled = compile_serializer(serializer_class)
+    expected = render(serializer_class(list(queryset), many=True).data)
+    assert render(compiled.data(queryset.values(*compiled.get_columns(queryset)))) == expected
+
+
+def assert_golden_features(serializer_class, instances, response):
+    """ Признаки ответа вьюхи совпадают с DRF на объектах (без учета порядка). """
+    assert response.status_code == status.HTTP_200_OK
+    expected = json.loads(render(serializer_class(instances, many=True).data))['features']
+    features = response.json()['features']
+    assert features
+    assert sorted(map(json.dumps, features)) == sorted(map(json.dumps, expected))
+
+
+@pytest.fixture
+def ads(example_user, another_user):
+    another_user.avatar_uuid = uuid.uuid4()
+    another_user.birth_date = date(1990, 5, 17)
+    another_user.last_activity = datetime(2020, 1, 2, 3, 4, 5, 678)
+    another_user.save()
+    Ad.objects.create(
+        title='Cluster of bikes', text='', ages=(25, 30), user=another_user,
+        type=Ad.Type.dating, address='ul. Mira, 8', point=Point(37.6176, 55.7558), is_active=False,
+        period=(datetime(2020, 1, 1, 10), None),
+    )
+    Ad.objects.create(
+        title='Пустой адрес', text='Текст', ages=(18, 99), user=example_user,
+        type=Ad.Type.travel, point=Point(1.123456789012345, -1.987654321), address='',
+    )
+    return Ad.objects.order_by('pk')
+
+
+def test_golden_ad_map(ads):
+    assert_golden(AdMapCollectionSerializer, ads)
+
+
+def test_golden_ad_list(ads):
+    assert_golden(AdListCollectionSerializer, ads)
+
+
+def test_golden_user_location(another_user):
+    users = get_user_model().objects.filter(location__isnull=False).order_by('pk')
+    assert users.exists()
+    assert_golden(UserLocationSerializer, users)
+
+
+def test_golden_ad_map_view(client, jwt_headers, ads):
+    """ Карта без кластеризации: geom_count берется из default поля. """
+    response = client.get(reverse('v2:ad-map'), {'zoom': 20}, **jwt_headers)
+    assert_golden_features(AdMapCollectionSerializer, list(ads), response)
+
+
+def test_golden_who_list_view(client, jwt_headers, example_user, test_user, another_user):
+    another_user.avatar_uuid = uuid.uuid4()
+    another_user.save()
+    example_user.location = Point(1.32, 1.12)
+    example_user.save()
+    users = get_user_model().objects.filter(pk__in=[test_user.pk, another_user.pk])
+    users.update(location=Point(1.321, 1.121), show_activity=True, is_online=True)
+
+    response = client.get(reverse('v2:user-who-list'), {'radius': 10000}, **jwt_headers)
+    assert_golden_features(UserLocationSerializer, list(users), response)
+
+
+def test_golden_cursor_rows():
+    """ Строки курсора DBSCAN (словари), включая кластер. """
+    rows = [
+        {
+            'cluster_id': None, 'uuid': uuid.uuid4(), 'point': Point(1.32, 1.12),
+            'created_at': datetime(2020, 2, 3, 4, 5, 6), 'title': 'TITLE', 'text': 'Ad text.',
+            'address': 'ul. Mira, 8', 'ages': NumericRange(18, 80), 'user_id': 1, 'sex': 'M',
+            'period': DateTimeRange(datetime(2020, 2, 4), datetime(2020, 2, 5)),
+            'type': Ad.Type.dating, 'is_active': True, 'is_blocked': False,
+            'geom_count': '1', 'is_cluster': False,
+        },
+        {
+            'cluster_id': 0, 'uuid': uuid.UUID(int=0), 'point': Point(1.5, 1.5),
+            'created_at': None, 'title': 'Cluster 0', 'text': '', 'address': None, 'ages': None,
+            'user_id': None, 'sex': 'N', 'period': None, 'type': None, 'is_active': True,
+            'is_blocked': False, 'geom_count': 5, 'is_cluster': True,
+        },
+    ]
+    expected = render(AdMapCollectionSerializer(rows, many=True).data)
+    assert render(compile_serializer(AdMapCollectionSerializer).data(rows)) == expected
+
+
+def test_timestamp_matches_strftime():
+    value = datetime(2021, 7, 1, 12, 30, 15, 999999)
+    for moment in (value, value - timedelta(days=200), None):
+        assert timestamp(moment) == (moment.strftime('%s') if moment else moment)
@@ -16,9 +16,11 @@ from PIL import Image
 from rest_framework import status
 
 from core.utils import get_file_type
+from files import ffmpeg
+from files import tasks as files_tasks
 from files.models import File
 from files.serializers import FileSerializer, SignedFormDataSerializer
-from files.tasks import FileTask
+from files.tasks import FileTask, collect_garbage
 
 
 @pytest.fixture(scope='function')
@@ -147,6 +149,45 @@ def test_api_sign_method(client, example_user, jwt_headers):
     assert response.status_code == status.HTTP_201_CREATED
 
 
+def test_api_sign_batch_method(client, example_user, jwt_headers):
+    """ Пакетное подписание загрузки нескольких файлов. """
+    files_count = example_user.files.count()
+    data = {
+        'files': [
+            {'orig_name': f'portfolio-{i}.png', 'type': File.Type.PORTFOLIO}
+            for i in range(3)
+        ]
+    }
+    response = client.post(
+        reverse('v2:file-sign-batch'),
+        data=json.dumps(data),
+        **jwt_headers
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(response.data) == 3
+    assert example_user.files.count() == files_count + 3
+    for signed, params in zip(response.data, data['files']):
+        file = example_user.files.get(uuid=signed['key'])
+        assert file.orig_name == params['orig_name']
+        assert file.file_type == File.Type.PORTFOLIO
+
+
+def test_api_sign_batch_too_large(client, jwt_headers, settings):
+    """ Размер пакета ограничен настройкой MAX_SIGN_BATCH_SIZE. """
+    data = {
+        'files': [
+            {'orig_name': f'example-{i}.dat'}
+            for i in range(settings.MAX_SIGN_BATCH_SIZE + 1)
+        ]
+    }
+    response = client.post(
+        reverse('v2:file-sign-batch'),
+        data=json.dumps(data),
+        **jwt_headers
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 @pytest.mark.webtest
 def test_api_sign_file_upload(client, sample_file, jwt_headers):
     """ Загрузка файла по pre-signed url. """
@@ -303,6 +344,155 @@ def test_minio_upload_webhook(client, example_user, jwt_headers):
     # assert response.status_code == status.HTTP_200_OK
 
 
+def _upload_notification(*files):
+    """ Уведомление стораджа о загрузке нескольких файлов. """
+    return {
+        'EventName': 's3:ObjectCreated:Post',
+        'Key': f'{settings.AWS_STORAGE_BUCKET_NAME}/{files[0].uuid}',
+        'Records': [{
+            'eventName': 's3:ObjectCreated:Post',
+            's3': {
+                'object': {
+                    'key': str(file.uuid),
+                    'size': 1024 + i,
+                }
+            }
+        } for i, file in enumerate(files)]
+    }
+
+
+def test_minio_webhook_batch(client, example_user, mocker):
+    """ Все события уведомления обрабатываются, дубли игнорируются. """
+    task_run = mocker.patch.object(FileTask, 'run')
+    # Тест выполняется внутри транзакции - коммита не будет
+    mocker.patch(
+        'django.db.transaction.on_commit',
+        side_effect=lambda func: func()
+    )
+    files = [
+        example_user.files.create(orig_name=f'album-{i}.png', is_uploaded=False)
+        for i in range(3)
+    ]
+    data = _upload_notification(*files)
+
+    response = client.post(
+        reverse('file-webhook'),
+        data=json.dumps(data),
+        content_type='application/json'
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert task_run.call_count == len(files)
+    for i, file in enumerate(files):
+        file.refresh_from_db()
+        assert file.is_uploaded
+        assert file.file_size == 1024 + i
+
+    # Повторное уведомление не запускает конвертацию заново
+    response = client.post(
+        reverse('file-webhook'),
+        data=json.dumps(data),
+        content_type='application/json'
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert task_run.call_count == len(files)
+
+
+@pytest.mark.parametrize('line,duration,expected', [
+    ('out_time_us=5000000\n', 10.0, 0.5),
+    ('out_time_ms=20000000\n', 10.0, 1.0),
+    ('out_time_us=5000000\n', None, None),
+    ('progress=end\n', None, 1.0),
+    ('bitrate=64.0kbits/s\n', 10.0, None),
+])
+def test_ffmpeg_parse_progress(line, duration, expected):
+    """ Разбор прогресса из вывода ffmpeg. """
+    assert ffmpeg.parse_progress(line, duration) == expected
+
+
+def test_file_task_audio_encoding(example_user, mocker, tmp_path):
+    """ Голосовое сообщение кодируется в Opus, длительность в метаданных. """
+    mocker.patch.object(FileTask, 'MINIO_PATH', str(tmp_path))
+    mocker.patch('files.ffmpeg.probe_duration', return_value=42.4)
+    transcode = mocker.patch('files.ffmpeg.transcode')
+    file = example_user.files.create(
+        orig_name='voice.m4a',
+        file_type=File.Type.SPEECH,
+        handler=File.Handler.AUDIO_ENCODING,
+        is_uploaded=True
+    )
+
+    FileTask().delay(str(file.uuid))
+
+    args = transcode.call_args[0][0]
+    assert args[args.index('-c:a') + 1] == 'libopus'
+    assert args[args.index('-b:a') + 1] == FileTask.AUDIO_BITRATES[File.Type.SPEECH]
+    file.refresh_from_db()
+    assert file.is_compressed
+    assert file.metadata['duration'] == '42'
+    assert file.metadata['opus'] == f'opus/{file.uuid}'
+
+
+def test_file_task_avatar_placeholder(example_user, mocker, tmp_path):
+    """ Плейсхолдер аватара сохраняется в метаданных и у пользователя. """
+    mocker.patch.object(FileTask, 'MINIO_PATH', str(tmp_path))
+    bucket_path = tmp_path / settings.AWS_STORAGE_BUCKET_NAME
+    for prefix in list(FileTask.IMAGE_SIZES) + ['av']:
+        (bucket_path / prefix).mkdir(parents=True)
+
+    file = example_user.files.create(
+        orig_name='avatar.png',
+        file_type=File.Type.AVATAR,
+        handler=File.Handler.AVATAR,
+        is_uploaded=True
+    )
+    Image.new('RGB', (1024, 768), color='red').save(
+        bucket_path / str(file.uuid), format='PNG'
+    )
+    example_user.avatar_uuid = file.uuid
+    example_user.save()
+
+    FileTask().delay(str(file.uuid))
+
+    file.refresh_from_db()
+    assert file.metadata['placeholder'].startswith('data:image/jpeg;base64,')
+    assert file.placeholder['width'] == 1024
+    assert file.placeholder['height'] == 768
+    assert FileSerializer(file).data['placeholder'] == file.placeholder
+    example_user.refresh_from_db()
+    assert example_user.avatar_placeholder == file.placeholder
+    assert example_user.avatar_placeholder['color'].startswith('#f')
+
+
+def test_files_collect_garbage(example_user, mocker, settings):
+    """ Удаление брошенных и давно удаленных файлов. """
+    assert collect_garbage.name == settings.CELERY_BEAT_SCHEDULE['files-collect-garbage']['task']
+    settings.FILES_GC_BATCH_SIZE = 1
+    settings.FILES_GC_BATCH_DELAY = 0
+    client = mocker.patch('files.tasks.get_storage_client').return_value
+    client.remove_objects.return_value = iter([])
+
+    long_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=365)
+    abandoned = example_user.files.create(is_uploaded=False)
+    deleted = example_user.files.create(is_uploaded=True, deleted_at=long_ago)
+    fresh = example_user.files.create(is_uploaded=False)
+    File.all_objects.filter(pk__in=[abandoned.pk, deleted.pk]).update(created_at=long_ago)
+
+    report = collect_garbage(dry_run=True)
+    assert report['abandoned'] == 1
+    assert report['deleted'] == 1
+    assert not client.remove_objects.called
+    assert File.all_objects.filter(pk=abandoned.pk).exists()
+
+    report = collect_garbage()
+    assert report['objects'] == 2 * (len(files_tasks.DERIVATIVE_PREFIXES) + 1)
+    assert client.remove_objects.call_count == 2
+    removed = client.remove_objects.call_args_list[0][0][1]
+    assert str(abandoned.uuid) in removed
+    assert f'lq/{abandoned.uuid}' in removed
+    assert not File.all_objects.filter(pk__in=[abandoned.pk, deleted.pk]).exists()
+    assert File.all_objects.filter(pk=fresh.pk).exists()
+
+
 # def test_file_task_compress_avatar(example_user, mocker):
 #     file = example_user.files.first()
 #     file.handler = File.Handler.AVATAR
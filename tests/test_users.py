@@ -1,16 +1,27 @@
+import datetime
 import json
 import random
 import string
+import time
 import uuid
 
 import pytest
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Point
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 
-from users.serializers import UserSerializer
+from core.filters import BirthDateFilter
+from core.utils import calculate_age, compact_geojson
+from files.models import File
+from users import presence
+from users.presence import get_presence_store
+from users.serializers import UserLocationSerializer, UserSerializer
+from users.tasks import flush_presence
 
 
 @pytest.fixture(scope='function')
@@ -185,6 +196,23 @@ def test_user_upload_set_avatar(client, example_user, jwt_headers):
     assert serializer.is_valid()
 
 
+def test_user_avatar_placeholder_owner(client, example_user, another_user, jwt_headers):
+    """ Плейсхолдер чужого файла не копируется в аватар. """
+    metadata = {'placeholder': 'data:image/jpeg;base64,AA==', 'color': '#ff0000', 'width': '1', 'height': '1'}
+    foreign = another_user.files.create(orig_name='a.png', file_type=File.Type.AVATAR, metadata=metadata)
+    own = example_user.files.create(orig_name='b.png', file_type=File.Type.AVATAR, metadata=metadata)
+    url = reverse('v2:user-detail', kwargs={'uuid': example_user.uuid})
+
+    response = client.patch(url, data=json.dumps({'avatar_uuid': str(foreign.uuid)}), **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    example_user.refresh_from_db()
+    assert example_user.avatar_placeholder is None
+
+    client.patch(url, data=json.dumps({'avatar_uuid': str(own.uuid)}), **jwt_headers)
+    example_user.refresh_from_db()
+    assert example_user.avatar_placeholder == own.placeholder
+
+
 def test_user_init_with_existed_username(client, example_user):
     """ Пробуем инит с уже существующим пользователем. """
     response = client.post(
@@ -260,6 +288,14 @@ def test_user_profile_is_blocked(client, blocked_user, contact, jwt_headers):
     assert response.data['is_blocked'] is True
 
 
+def test_who_list_without_relation_subqueries(client, example_user, test_user, jwt_headers):
+    """ Флаги отношений не считаются для списков, где не сериализуются. """
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(reverse('v2:user-who-list') + '?radius=250000', **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert not any('EXISTS' in query['sql'] for query in context.captured_queries)
+
+
 def test_user_block_added(client, example_user, test_user, jwt_headers):
     """ Добавление в черный список другим пользователем. """
     assert not example_user.black_listed(test_user)
@@ -282,6 +318,36 @@ def test_user_block_removed(client, example_user, blocked_user, test_user, jwt_h
     assert not example_user.black_listed(test_user)
 
 
+def test_blocked_users_hidden_from_feeds(client, example_user, test_user, example_ad,
+                                         jwt_headers, jwt_headers_by_user, mocker):
+    """ Блокировка скрывает объявления в обе стороны. """
+    mocker.patch('django.db.transaction.on_commit', side_effect=lambda func: func())
+    test_user.set_password('1111')
+    test_user.save()
+    headers = jwt_headers_by_user(test_user)
+    get_ads = lambda: client.get(reverse('v2:ad-list'), **headers)  # noqa
+    assert get_ads().data['count'] == 1
+
+    response = client.post(
+        reverse('v2:user-block', kwargs={'uuid': test_user.uuid}),
+        **jwt_headers
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert test_user.get_block_set() == {example_user.pk}
+    assert test_user.is_blocked_with(example_user)
+    assert not test_user.black_listed(example_user)
+    assert get_ads().data['count'] == 0
+
+    client.delete(reverse('v2:user-block', kwargs={'uuid': test_user.uuid}), **jwt_headers)
+    assert get_ads().data['count'] == 1
+
+    # Изменения не через API (админка) тоже сбрасывают кеш
+    test_user.black_list.add(example_user)
+    assert example_user.get_block_set() == {test_user.pk}
+    test_user.black_list.clear()
+    assert example_user.get_block_set() == frozenset()
+
+
 def test_user_get_black_list(client, example_user, blocked_user, test_user, jwt_headers):
     """ Проверка черного списка пользователя. """
     response = client.get(reverse('v2:user-black-list'), **jwt_headers)
@@ -406,3 +472,139 @@ def test_user_list_feature_collection(client, example_user, test_user, jwt_heade
     assert 'count' in response.data
     assert response.data['type'] == 'FeatureCollection'
     assert len(response.data['features']) == 1
+
+
+def test_user_im_online_heartbeat(client, example_user, jwt_headers):
+    """ Heartbeat попадает в хранилище присутствия, а не в базу. """
+    response = client.post(reverse('v2:user-im-online'), **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['is_online'] is True
+    assert get_presence_store().online() == {example_user.pk}
+
+    response = client.post(
+        reverse('v2:user-im-online'), data=json.dumps({'is_online': False}), **jwt_headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['is_online'] is False
+    assert get_presence_store().online() == set()
+    example_user.refresh_from_db()
+    assert example_user.is_online is False
+
+
+def test_flush_presence(example_user, test_user, settings):
+    """ Пакетная запись last_activity и перевод в офлайн по TTL. """
+    settings.PRESENCE_TTL = 60
+    store = get_presence_store()
+    store.heartbeat(example_user.pk)
+    store.heartbeat(test_user.pk, time.time() - 120)
+    get_user_model().objects.filter(pk=test_user.pk).update(is_online=True)
+
+    assert flush_presence() == (2, 1)
+    example_user.refresh_from_db()
+    test_user.refresh_from_db()
+    assert example_user.is_online is True
+    assert example_user.last_activity is not None
+    assert test_user.is_online is False
+    assert store.online() == {example_user.pk}
+
+
+def test_who_tiles_presence(client, another_user, jwt_headers):
+    """ Закешированный тайл не переживает смену онлайна. """
+    another_user.show_activity = True
+    another_user.save()
+    url = reverse('v2:user-who-tiles', args=[0, 0, 0])
+    response = client.get(url, **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b''
+
+    get_presence_store().heartbeat(another_user.pk)
+    flush_presence()
+    response = client.get(url, **jwt_headers)
+    assert b'users' in response.content
+
+
+def test_who_list_interests(client, example_user, test_user, another_user, jwt_headers):
+    """ Поиск по интересам с ранжированием по количеству совпадений. """
+    example_user.location = Point(37.6, 55.7)
+    example_user.save()
+    for user in (test_user, another_user):
+        user.location = Point(37.601, 55.701)
+        user.show_activity = True
+        user.save()
+        get_presence_store().heartbeat(user.pk)
+    flush_presence()
+    another_user.interests.add('music')
+    test_user.interests.add('music', 'films')
+    test_user.refresh_from_db()
+    assert len(test_user.interest_ids) == 2
+
+    url = reverse('v2:user-who-list') + '?radius=10000&interests=music,films'
+    response = client.get(url, **jwt_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [f['properties']['uuid'] for f in response.data['features']] == [
+        str(test_user.uuid), str(another_user.uuid)
+    ]
+
+    response = client.get(url + '&interests_match=all', **jwt_headers)
+    assert [f['properties']['uuid'] for f in response.data['features']] == [str(test_user.uuid)]
+
+    test_user.interests.remove('films')
+    response = client.get(url + '&interests_match=all', **jwt_headers)
+    assert response.data['features'] == []
+
+
+@pytest.mark.parametrize('birth_date,today,age', [
+    (datetime.date(2000, 10, 20), datetime.date(2026, 10, 19), 25),
+    (datetime.date(2000, 10, 19), datetime.date(2026, 10, 19), 26),
+    (datetime.date(2000, 2, 29), datetime.date(2026, 2, 28), 25),
+    (None, datetime.date(2026, 10, 19), None),
+])
+def test_calculate_age(birth_date, today, age):
+    assert calculate_age(birth_date, today) == age
+
+
+def test_birth_date_filter_exact_bounds():
+    """ Диапазон дат рождения включает ровно возраст от 20 до 30 лет. """
+    date_from, date_to = BirthDateFilter().get_filter_params('20-30')
+    assert calculate_age(date_from) == 30
+    assert calculate_age(date_from - datetime.timedelta(days=1)) == 31
+    assert calculate_age(date_to) == 20
+    assert calculate_age(date_to + datetime.timedelta(days=1)) == 19
+
+
+def test_compact_geojson_size():
+    """ Размер ответа карты на 1000 точек: полный, компактный и по столбцам. """
+    rows = [
+        {
+            'id': num,
+            'uuid': uuid.uuid4(),
+            'display_name': f'User {num}',
+            'location': Point(37.6 + random.random() / 10, 55.7 + random.random() / 10),
+            'avatar_uuid': None,
+            'avatar_placeholder': None,
+            'geom_count': 1,
+        }
+        for num in range(1000)
+    ]
+    data = UserLocationSerializer(rows, many=True).data
+    full = len(json.dumps(data))
+    compact = compact_geojson(data, zoom=15)
+    columnar = compact_geojson(data, zoom=15, columnar=True)
+    compact_size, columnar_size = len(json.dumps(compact)), len(json.dumps(columnar))
+
+    assert compact_size < full * 0.75
+    assert columnar_size < compact_size * 0.8
+    assert columnar['count'] == 1000
+    assert columnar['columns']['display_name'][0] == 'User 0'
+    lon, lat = compact['features'][0]['geometry']['coordinates']
+    assert lon == round(rows[0]['location'].x, 5)
+    assert set(compact['features'][0]['properties']) == {'uuid', 'display_name'}
+
+
+def test_presence_store_required(settings, monkeypatch):
+    """ Без PRESENCE_URL в продакшене хранилище не создается. """
+    monkeypatch.setattr(presence, '_presence_store', None)
+    settings.PRESENCE_URL = ''
+    settings.DEBUG = settings.TESTING = False
+    with pytest.raises(ImproperlyConfigured):
+        presence.get_presence_store()
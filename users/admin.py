@@ -1,11 +1,8 @@
 from django.contrib import admin
-from django.db.models import Count, F, Q
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from taggit.models import Tag
 
-from abuses.models import AdAbuse
-
 from .models import User
 
 title = "Limon administration interface"
@@ -46,43 +43,18 @@ class UserAdmin(admin.ModelAdmin):
         })
     )
 
+    show_full_result_count = False
+
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        qs = qs.annotate(
-            in_userabuse=Count('userabuse', distinct=True),
-            in_userabuse_confirmed=Count(
-                'userabuse',
-                filter=Q(userabuse__is_confirmed=True),
-                distinct=True
-            ),
-            out_userabuse=Count('userabuses_sender', distinct=True),
-            out_userabuse_confirmed=Count(
-                'userabuses_sender',
-                filter=Q(userabuses_sender__is_confirmed=True),
-                distinct=True
-            ),
-            in_adabuse=Count(
-                'ads',
-                filter=Q(ads__id__in=AdAbuse.objects.filter(
-                    ad__user_id=F('id')
-                ).values('id')),
-                distinct=True
-            ),
-            in_adabuse_confirmed=Count(
-                'ads',
-                filter=Q(ads__id__in=AdAbuse.objects.filter(
-                    ad__user_id=F('id'), is_confirmed=True
-                ).values('id')),
-                distinct=True
-            ),
-            out_adabuse=Count('adabuses_sender', distinct=True),
-            out_adabuse_confirmed=Count(
-                'adabuses_sender',
-                filter=Q(adabuses_sender__is_confirmed=True),
-                distinct=True
-            ),
-        )
-        return qs
+        """ Счетчики жалоб читаются из user_abuse_stats. """
+        return super().get_queryset(request).select_related('abuse_stats')
+
+    @staticmethod
+    def _get_stats(obj, field):
+        stats = getattr(obj, 'abuse_stats', None)
+        if stats is None:
+            return '0 (0)'
+        return f'{getattr(stats, field)} ({getattr(stats, f"{field}_confirmed")})'
 
     def _get_link(self, link_name, text, query):
         link = reverse(f'admin:{link_name}')
@@ -91,7 +63,7 @@ class UserAdmin(admin.ModelAdmin):
 
     def in_userabuse(self, obj):
         query = f'user__id__exact={obj.id}'
-        value = f'{obj.in_userabuse} ({obj.in_userabuse_confirmed})'
+        value = self._get_stats(obj, 'in_userabuse')
         output = self._get_link(
             'abuses_userabuse_changelist', value, query
         )
@@ -99,15 +71,15 @@ class UserAdmin(admin.ModelAdmin):
 
     def out_userabuse(self, obj):
         query = f'sender__id__exact={obj.id}'
-        value = f'{obj.out_userabuse} ({obj.out_userabuse_confirmed})'
+        value = self._get_stats(obj, 'out_userabuse')
         output = self._get_link(
             'abuses_userabuse_changelist', value, query
         )
         return output
 
     def in_adabuse(self, obj):
-        query = f'sender__id__exact={obj.id}'
-        value = f'{obj.in_adabuse} ({obj.in_adabuse_confirmed})'
+        query = f'ad__user__id__exact={obj.id}'
+        value = self._get_stats(obj, 'in_adabuse')
         output = self._get_link(
             'abuses_adabuse_changelist', value, query
         )
@@ -115,8 +87,13 @@ class UserAdmin(admin.ModelAdmin):
 
     def out_adabuse(self, obj):
         query = f'sender__id__exact={obj.id}'
-        value = f'{obj.out_adabuse} ({obj.out_adabuse_confirmed})'
+        value = self._get_stats(obj, 'out_adabuse')
         output = self._get_link(
             'abuses_adabuse_changelist', value, query
         )
         return output
+
+    in_userabuse.admin_order_field = 'abuse_stats__in_userabuse'
+    out_userabuse.admin_order_field = 'abuse_stats__out_userabuse'
+    in_adabuse.admin_order_field = 'abuse_stats__in_adabuse'
+    out_adabuse.admin_order_field = 'abuse_stats__out_adabuse'
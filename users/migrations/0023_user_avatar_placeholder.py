@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-19 12:10
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_user_show_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_placeholder',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, help_text='Avatar placeholder (LQIP).', null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.28 on 2026-10-19 15:20
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0002_auto_20150616_2121'),
+        ('users', '0024_user_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='interest_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, editable=False, help_text='Interest tag ids (denormalized for search).', size=None),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE users SET interest_ids = ARRAY(
+                    SELECT ti.tag_id FROM taggit_taggeditem ti
+                    JOIN django_content_type ct ON ct.id = ti.content_type_id
+                    WHERE ct.app_label = 'users' AND ct.model = 'user'
+                        AND ti.object_id = users.id
+                    ORDER BY ti.tag_id
+                );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['interest_ids'], name='users_interest_ids_gin'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0025_user_interest_ids'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(is_active=True, show_activity=True), fields=['sex', 'birth_date'], name='users_sex_birth_date_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0026_user_sex_birth_date_idx'),
+        ('abuses', '0003_auto_20180814_1646'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='confirmed_abuses_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of confirmed abuses.'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE users SET confirmed_abuses_count = confirmed.count
+            FROM (
+                SELECT user_id, count(*) AS count FROM user_abuses
+                WHERE is_confirmed GROUP BY user_id
+            ) AS confirmed
+            WHERE users.id = confirmed.user_id
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.contrib.gis.db import models
+from django.contrib.postgres.fields import ArrayField, JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.core.cache import cache
 from django.core.validators import MinLengthValidator
+from django.db import transaction
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
@@ -68,6 +73,9 @@ class User(AbstractUser, BaseModel):
         max_length=32, blank=True, help_text=_('Display name.')
     )
     avatar_uuid = models.UUIDField(blank=True, null=True)
+    avatar_placeholder = JSONField(
+        blank=True, null=True, help_text=_('Avatar placeholder (LQIP).')
+    )
     device_id = models.CharField(max_length=180, blank=True, null=True)
     sex = models.CharField(
         max_length=1, choices=Sex.choices,  # default=Sex.none,
@@ -95,13 +103,33 @@ class User(AbstractUser, BaseModel):
         default=False, help_text='User is blocked.'
     )
     is_online = models.BooleanField(default=False, help_text='Is user online')
+    confirmed_abuses_count = models.PositiveIntegerField(
+        default=0, editable=False, help_text='Number of confirmed abuses.'
+    )
 
     black_list = models.ManyToManyField('self', blank=True, symmetrical=False)
 
     interests = TaggableManager(verbose_name='interests')
+    interest_ids = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        editable=False,
+        help_text=_('Interest tag ids (denormalized for search).')
+    )
 
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['updated_at'], name='users_updated_at_idx'),
+            GinIndex(fields=['interest_ids'], name='users_interest_ids_gin'),
+            # Поиск "кто рядом" по полу и возрасту
+            models.Index(
+                fields=['sex', 'birth_date'],
+                name='users_sex_birth_date_idx',
+                condition=models.Q(is_active=True, show_activity=True),
+            ),
+        ]
 
     @cached_property
     def owner(self):
@@ -121,10 +149,47 @@ class User(AbstractUser, BaseModel):
         self.deleted_at = timezone.now()
         self.save()
 
+    def sync_interest_ids(self):
+        """ Синхронизация индекса интересов с тегами. """
+        self.interest_ids = sorted(self.interests.values_list('pk', flat=True))
+        type(self).objects.filter(pk=self.pk).update(interest_ids=self.interest_ids)
+
     def black_listed(self, user):
         """ Пользователь входит в черный список. """
         return self.black_list.filter(pk=user.pk).exists()
 
+    def is_blocked_with(self, user):
+        """ Блокировка между пользователями в любую сторону. """
+        return user.pk in self.get_block_set()
+
+    @staticmethod
+    def get_block_set_key(user_id):
+        return f'users:block-set:{user_id}'
+
+    def get_block_set(self):
+        """
+        Id пользователей, заблокированных текущим или заблокировавших его.
+
+        Множество кешируется и сбрасывается при изменении блокировок.
+        """
+        key = self.get_block_set_key(self.pk)
+        block_set = cache.get(key)
+        if block_set is None:
+            pairs = self.black_list.through.objects.filter(
+                models.Q(from_user=self.pk) | models.Q(to_user=self.pk)
+            ).values_list('from_user_id', 'to_user_id')
+            block_set = frozenset(
+                user_id for pair in pairs for user_id in pair
+            ) - {self.pk}
+            cache.set(key, block_set, settings.BLOCK_SET_CACHE_TIMEOUT)
+        return block_set
+
+    @classmethod
+    def invalidate_block_sets(cls, user_ids):
+        """ Сброс кеша множеств после коммита (иначе закешируется старое). """
+        keys = [cls.get_block_set_key(user_id) for user_id in user_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
     def get_avatar_url(self):
         if self.avatar_uuid:
             return get_public_url(self.avatar_uuid, prefix='av')
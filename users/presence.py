@@ -0,0 +1,158 @@
+"""
+Presence (online status) of users.
+
+Clients send heartbeats to a TTL store instead of updating the users
+table: a user is online while their last heartbeat is younger than
+PRESENCE_TTL seconds. Last activity and the is_online flag are written
+back to the database in batches by users.tasks.flush_presence; map,
+tile and list queries filter on that is_online column. Every change of
+the column bumps the presence version, which is part of the cache keys
+of user tiles.
+"""
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+
+class LocalPresenceStore:
+    """
+    In-process store (DEBUG and tests only: every process has its own).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._flushed_at = 0.0
+
+    def heartbeat(self, user_id, timestamp=None):
+        with self._lock:
+            self._seen[user_id] = timestamp or time.time()
+
+    def remove(self, user_id):
+        with self._lock:
+            self._seen.pop(user_id, None)
+
+    def online(self, user_ids=None, now=None):
+        """ Id пользователей онлайн (из user_ids, если указаны). """
+        deadline = (now or time.time()) - settings.PRESENCE_TTL
+        with self._lock:
+            seen = dict(self._seen)
+        if user_ids is not None:
+            seen = {pk: seen[pk] for pk in user_ids if pk in seen}
+        return {pk for pk, timestamp in seen.items() if timestamp > deadline}
+
+    def active_since(self, since):
+        """ Время последнего heartbeat пользователей, активных после since. """
+        with self._lock:
+            return {pk: ts for pk, ts in self._seen.items() if ts > since}
+
+    def pop_expired(self, now=None):
+        """ Удаляет и возвращает id пользователей, ушедших в офлайн. """
+        deadline = (now or time.time()) - settings.PRESENCE_TTL
+        with self._lock:
+            expired = [pk for pk, ts in self._seen.items() if ts <= deadline]
+            for pk in expired:
+                del self._seen[pk]
+        return expired
+
+    def get_flushed_at(self):
+        return self._flushed_at
+
+    def set_flushed_at(self, timestamp):
+        self._flushed_at = timestamp
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+            self._flushed_at = 0.0
+
+
+class RedisPresenceStore:
+    """
+    Redis store: sorted set of user ids scored by last heartbeat time.
+    """
+    KEY = 'presence:seen'
+    FLUSHED_AT_KEY = 'presence:flushed_at'
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    def heartbeat(self, user_id, timestamp=None):
+        self.client.zadd(self.KEY, {user_id: timestamp or time.time()})
+
+    def remove(self, user_id):
+        self.client.zrem(self.KEY, user_id)
+
+    def online(self, user_ids=None, now=None):
+        deadline = (now or time.time()) - settings.PRESENCE_TTL
+        if user_ids is None:
+            members = self.client.zrangebyscore(self.KEY, f'({deadline}', '+inf')
+            return {int(pk) for pk in members}
+
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        with self.client.pipeline(transaction=False) as pipe:
+            for pk in user_ids:
+                pipe.zscore(self.KEY, pk)
+            scores = pipe.execute()
+        return {
+            pk for pk, score in zip(user_ids, scores)
+            if score is not None and score > deadline
+        }
+
+    def active_since(self, since):
+        members = self.client.zrangebyscore(self.KEY, f'({since}', '+inf', withscores=True)
+        return {int(pk): score for pk, score in members}
+
+    def pop_expired(self, now=None):
+        deadline = (now or time.time()) - settings.PRESENCE_TTL
+        with self.client.pipeline() as pipe:
+            pipe.zrangebyscore(self.KEY, '-inf', deadline)
+            pipe.zremrangebyscore(self.KEY, '-inf', deadline)
+            expired, _ = pipe.execute()
+        return [int(pk) for pk in expired]
+
+    def get_flushed_at(self):
+        return float(self.client.get(self.FLUSHED_AT_KEY) or 0)
+
+    def set_flushed_at(self, timestamp):
+        self.client.set(self.FLUSHED_AT_KEY, timestamp)
+
+    def clear(self):
+        self.client.delete(self.KEY, self.FLUSHED_AT_KEY)
+
+
+_presence_store = None
+
+
+def get_presence_store():
+    """ Хранилище присутствия, общее для всего процесса. """
+    global _presence_store
+    if _presence_store is None:
+        if settings.PRESENCE_URL:
+            _presence_store = RedisPresenceStore(settings.PRESENCE_URL)
+        elif settings.DEBUG or settings.TESTING:
+            _presence_store = LocalPresenceStore()
+        else:
+            # У каждого воркера было бы свое множество онлайн
+            raise ImproperlyConfigured('PRESENCE_URL (Redis) is required when DEBUG is off.')
+    return _presence_store
+
+
+PRESENCE_VERSION_KEY = 'presence:version'
+
+
+def get_presence_version():
+    """ Версия колонки is_online (для ключей кеша тайлов). """
+    return cache.get(PRESENCE_VERSION_KEY, 0)
+
+
+def bump_presence_version():
+    try:
+        cache.incr(PRESENCE_VERSION_KEY)
+    except ValueError:
+        cache.set(PRESENCE_VERSION_KEY, 1, None)
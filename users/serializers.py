@@ -1,20 +1,35 @@
-from datetime import datetime
+from datetime import date
 
 from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 from rest_framework_gis.serializers import (GeoFeatureModelSerializer,
                                             GeometryField)
 
 from core.fields import TimestampField
-from core.utils import get_public_url, get_user_or_create
+from core.utils import (calculate_age, get_field_value, get_public_url,
+                        get_user_or_create)
 from files.models import File
 from files.serializers import FileSerializer
 
 from .validators import InternationNubmerValidator
 
 
-class SimpeUserSerializer(serializers.ModelSerializer):
+class AgeSerializerMixin:
+    """
+    Возраст по birth_date (поле age = SerializerMethodField()).
+    """
+    @cached_property
+    def today(self):
+        """ Одна дата на весь сериализуемый список. """
+        return date.today()
+
+    def get_age(self, obj) -> int:
+        return calculate_age(get_field_value(obj, 'birth_date'), self.today)
+
+
+class SimpeUserSerializer(AgeSerializerMixin, serializers.ModelSerializer):
     """
     Simple user serializer.
     """
@@ -27,24 +42,24 @@ class SimpeUserSerializer(serializers.ModelSerializer):
         model = get_user_model()
         fields = (
             'uuid', 'display_name', 'age', 'avatar_uuid', 'avatar_url',
-            'last_login', 'last_activity', 'is_online',
+            'avatar_placeholder', 'last_login', 'last_activity', 'is_online',
         )
         extra_kwargs = {
             'avatar_uuid': {'write_only': True, 'required': False},
+            'avatar_placeholder': {'read_only': True},
         }
 
-    @staticmethod
-    def get_avatar_url(obj) -> str:
-        if obj.avatar_uuid:
-            return get_public_url(obj.avatar_uuid, prefix='av')
+    # Колонки строк values(), которые читают методы (core.fastserializers)
+    row_fields = ('avatar_uuid', 'birth_date')
 
     @staticmethod
-    def get_age(obj) -> int:
-        if obj.birth_date:
-            return datetime.utcnow().year - obj.birth_date.year
+    def get_avatar_url(obj) -> str:
+        avatar_uuid = get_field_value(obj, 'avatar_uuid')
+        if avatar_uuid:
+            return get_public_url(avatar_uuid, prefix='av')
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(AgeSerializerMixin, serializers.ModelSerializer):
     """
     User serializer.
     """
@@ -64,6 +79,7 @@ class UserSerializer(serializers.ModelSerializer):
     is_contact = serializers.BooleanField(read_only=True)
     is_favorite = serializers.BooleanField(read_only=True)
     is_blocked = serializers.BooleanField(read_only=True)
+    mutual_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = get_user_model()
@@ -73,7 +89,7 @@ class UserSerializer(serializers.ModelSerializer):
             'sex', 'age', 'last_login', 'last_location', 'created_at',
             'im_confirm_tos', 'device_id', 'avatar_uuid', 'avatar_url',
             'is_contact', 'is_favorite', 'is_blocked', 'is_online',
-            'last_activity', 'show_activity', 'portfolio',
+            'last_activity', 'show_activity', 'portfolio', 'mutual_count',
         )
         extra_kwargs = {
             'avatar_uuid': {'write_only': True, 'required': False},
@@ -81,6 +97,15 @@ class UserSerializer(serializers.ModelSerializer):
             'device_id': {'write_only': True},
         }
 
+    def update(self, instance, validated_data):
+        """ Плейсхолдер аватара берется из уже обработанного файла пользователя. """
+        avatar_uuid = validated_data.get('avatar_uuid', instance.avatar_uuid)
+        if avatar_uuid != instance.avatar_uuid:
+            avatar = instance.files.filter(uuid=avatar_uuid).first() \
+                if avatar_uuid else None
+            instance.avatar_placeholder = avatar.placeholder if avatar else None
+        return super().update(instance, validated_data)
+
     def get_portfolio(self, obj):
         qs = obj.files.filter(file_type=File.Type.PORTFOLIO, is_uploaded=True)
         serializers = FileSerializer(qs, many=True)
@@ -109,11 +134,6 @@ class UserSerializer(serializers.ModelSerializer):
         if obj.avatar_uuid:
             return obj.get_avatar_url()
 
-    @staticmethod
-    def get_age(obj) -> int:
-        if obj.birth_date:
-            return datetime.utcnow().year - obj.birth_date.year
-
 
 class InitialSerializer(serializers.ModelSerializer):
     """
@@ -161,26 +181,27 @@ class UserLocationSerializer(GeoFeatureModelSerializer):
         bbox_filter_field = 'location'
         fields = (
             'uuid', 'display_name', 'location', 'is_cluster', 'avatar_url',
-            'geom_count',
+            'avatar_placeholder', 'geom_count',
         )
         extra_kwargs = {
             'location': {'required': True},
             'geom_count': {'required': False},
+            'avatar_placeholder': {'read_only': True},
         }
 
+    # Колонки строк values(), которые читают методы (core.fastserializers)
+    row_fields = ('avatar_uuid',)
+
     @staticmethod
     def get_is_cluster(obj) -> bool:
-        """ Признак кластера точек. """
-        if isinstance(obj, dict) and obj['display_name'].startswith('Cluster'):
-            return True
-        return False
+        """ Признак кластера точек (колонка is_cluster строк DBSCAN). """
+        return bool(get_field_value(obj, 'is_cluster', False))
 
     @staticmethod
     def get_avatar_url(obj) -> str:
-        if isinstance(obj, dict) and obj.get('avatar_uuid'):
-            return get_public_url(obj['avatar_uuid'], prefix='av')
-        if isinstance(obj, get_user_model()) and obj.avatar_uuid:
-            return obj.get_avatar_url()
+        avatar_uuid = get_field_value(obj, 'avatar_uuid')
+        if avatar_uuid:
+            return get_public_url(avatar_uuid, prefix='av')
 
 
 class WhoIsNearListQueryParamsSerializer(serializers.Serializer):
@@ -198,6 +219,13 @@ class WhoIsNearListQueryParamsSerializer(serializers.Serializer):
         required=False,
         help_text=_('Bounding Box (example "35.62,54.98,38.03,56.07").')
     )
+    interests = serializers.CharField(
+        required=False, help_text=_('Interests (example "music,films").')
+    )
+    interests_match = serializers.ChoiceField(
+        choices=('any', 'all'), required=False,
+        help_text=_('Match any (default) or all of interests.')
+    )
 
 
 class WhoIsNearMapQueryParamsSerializer(WhoIsNearListQueryParamsSerializer):
@@ -207,6 +235,18 @@ class WhoIsNearMapQueryParamsSerializer(WhoIsNearListQueryParamsSerializer):
         default=11,
         min_value=1, max_value=21, help_text=_('Zoom level (from 1 to 20).')
     )
+    state = serializers.CharField(
+        required=False,
+        help_text=_('Map state token from previous response (viewport delta).')
+    )
+    compact = serializers.BooleanField(
+        required=False, default=False,
+        help_text=_('Compact output: rounded coordinates, no empty and cluster filler fields.')
+    )
+    columnar = serializers.BooleanField(
+        required=False, default=False,
+        help_text=_('Compact output with properties in columns (with compact only).')
+    )
     # Для K-means
     clusters_number = serializers.IntegerField(
         min_value=0, default=3, help_text=_('Number of point clusters on map.')
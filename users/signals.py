@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+
+@receiver(m2m_changed, sender=get_user_model().interests.through)
+def sync_interest_ids(sender, instance, action, **kwargs):
+    """ Изменение тегов интересов обновляет индекс пользователя. """
+    if action in ('post_add', 'post_remove', 'post_clear') \
+            and isinstance(instance, get_user_model()):
+        instance.sync_interest_ids()
+
+
+@receiver(m2m_changed, sender=get_user_model().black_list.through)
+def invalidate_block_sets(sender, instance, action, pk_set, **kwargs):
+    """ Любое изменение черного списка сбрасывает множества блокировок. """
+    if action in ('post_add', 'post_remove'):
+        get_user_model().invalidate_block_sets({instance.pk, *pk_set})
+    elif action == 'pre_clear':
+        pairs = sender.objects.filter(
+            Q(from_user=instance.pk) | Q(to_user=instance.pk)
+        ).values_list('from_user_id', 'to_user_id')
+        get_user_model().invalidate_block_sets(
+            {instance.pk, *(user_id for pair in pairs for user_id in pair)}
+        )
@@ -1,12 +1,17 @@
+import time
 import requests
+from datetime import datetime, timezone
 from uuid import UUID
 from celery import shared_task
 from celery.utils.log import get_task_logger
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from core.exceptions import RemoteAPIError
 from core.tasks import send_sematext_metrics
 
+from .presence import bump_presence_version, get_presence_store
+
 logger = get_task_logger(__name__)
 
 
@@ -44,3 +49,31 @@ def send_sms_code(phone, code):
             pass
 
     return data['status']
+
+
+@shared_task
+def flush_presence():
+    """
+    Пакетная запись присутствия в базу: last_activity активных
+    пользователей и is_online=False для ушедших в офлайн.
+    """
+    store = get_presence_store()
+    now = time.time()
+    active = store.active_since(store.get_flushed_at())
+    expired = set(store.pop_expired(now))
+    store.set_flushed_at(now)
+
+    User = get_user_model()  # noqa
+    online = [pk for pk in active if pk not in expired]
+    User.objects.bulk_update([
+        User(pk=pk, last_activity=datetime.fromtimestamp(active[pk], tz=timezone.utc))
+        for pk in online
+    ], ['last_activity'], batch_size=500)
+    changed = User.objects.filter(pk__in=online, is_online=False).update(is_online=True)
+    changed += User.objects.filter(pk__in=expired, is_online=True).update(is_online=False)
+    if changed:
+        # Кешированные тайлы "Кто рядом" устарели
+        bump_presence_version()
+
+    logger.info(f'Presence flushed: {len(active)} active, {len(expired)} went offline')
+    return len(active), len(expired)
@@ -5,7 +5,6 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import GEOSGeometry
 from django.db import connection, transaction
-from django.db.models import Exists, OuterRef
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from django_filters.views import FilterMixin
@@ -13,6 +12,7 @@ from drf_yasg.utils import swagger_auto_schema
 from rest_framework import mixins, permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.settings import api_settings
 from rest_framework.views import Response, status
 from rest_framework_gis.filters import InBBoxFilter
@@ -23,16 +23,22 @@ from rest_framework_jwt.views import JSONWebTokenAPIView
 
 from abuses.serializers import UserAbuseSerializer
 from contacts.models import Contact
-from core.filters import (BirthDateFilter, SexFilter,  # InterestsFilter
-                          WhoIsNearFilter)
+from core.filters import (BirthDateFilter, BlockedUsersFilter,
+                          InterestsFilter, SexFilter, WhoIsNearFilter)
+from core.mixins import (FastSerializerMixin, VectorTileMixin,
+                         ViewportDeltaMixin)
 from core.permissions import OnlyOwnerAllowedEdit
+from core.renderers import MVTRenderer
 from core.serializers import EmptySerializer, TokenSerializer
-from core.utils import (fix_rawsql_helper, get_best_minpoints_dbscan,
-                        get_meter_per_pixel, get_rows_from_cursor)
+from core.utils import (compact_geojson, fix_rawsql_helper,
+                        get_best_minpoints_dbscan, get_meter_per_pixel,
+                        get_rows_from_cursor)
 # from files.serializers import FileSerializer
 from files.models import File
 
 from .models import SMSCode
+from .presence import (bump_presence_version, get_presence_store,
+                       get_presence_version)
 from .serializers import (ImOnlineSerializer, InitialSerializer,
                           SimpeUserSerializer, UserLocationSerializer,
                           UserSerializer, WhoIsNearListQueryParamsSerializer,
@@ -42,7 +48,10 @@ from .tasks import send_sms_code
 logger = logging.getLogger(__name__)
 
 
-class UserViewSet(mixins.RetrieveModelMixin,
+class UserViewSet(FastSerializerMixin,
+                  VectorTileMixin,
+                  ViewportDeltaMixin,
+                  mixins.RetrieveModelMixin,
                   mixins.ListModelMixin,
                   FilterMixin,
                   mixins.UpdateModelMixin,
@@ -61,28 +70,55 @@ class UserViewSet(mixins.RetrieveModelMixin,
     distance_filter_convert_meters = True
     bbox_filter_field = 'location'
     bbox_filter_include_overlapping = True  # Optional
+    blocked_users_filter_field = 'pk'
+    interests_filter_rank = True
     http_method_names = ('get', 'post', 'head', 'patch', 'delete',)
+    tile_layer = 'users'
+    tile_geom_field = 'location'
+    tile_properties = ('uuid', 'display_name', 'avatar_uuid')
 
-    def annotate_queryset(self, qs):
-        # XXX: Лучше делать после фильтрации или после получения страницы.
-        is_contact = Contact.objects.filter(
-            user=OuterRef('pk'), holder=self.request.user
+    def get_serializer(self, *args, **kwargs):
+        """
+        Флаги отношений с текущим пользователем считаются только для
+        реально сериализуемых объектов (после пагинации).
+        """
+        if args and issubclass(self.get_serializer_class(), UserSerializer):
+            instance, *args = args
+            if kwargs.get('many'):
+                instance = list(instance)
+                self.annotate_users(instance)
+            elif instance is not None:
+                self.annotate_users([instance])
+            args = (instance, *args)
+        return super().get_serializer(*args, **kwargs)
+
+    def annotate_users(self, users):
+        """ Пакетная установка is_contact, is_favorite, is_blocked и mutual_count. """
+        user_ids = [user.pk for user in users]
+        if not user_ids:
+            return
+
+        me = self.request.user
+        contacts = dict(
+            Contact.objects.filter(holder=me, user_id__in=user_ids)
+            .values_list('user_id', 'is_favorite')
         )
-        is_favorite = Contact.objects.filter(
-            user=OuterRef('pk'), is_favorite=True, holder=self.request.user
+        blocked = set(
+            me.black_list.filter(pk__in=user_ids).values_list('pk', flat=True)
         )
-        is_blocked = self.request.user.black_list.filter(pk=OuterRef('pk'))
-
-        qs = qs.annotate(
-            is_contact=Exists(is_contact),
-            is_favorite=Exists(is_favorite),
-            is_blocked=Exists(is_blocked),
-        )
-        return qs
-
-    def get_queryset(self):
-        qs = super().get_queryset()
-        return self.annotate_queryset(qs)
+        online = get_presence_store().online(user_ids)
+        # Общие контакты нужны только в профиле пользователя
+        mutual_counts = {}
+        if self.action == 'retrieve':
+            mutual_counts = Contact.objects.mutual_counts(me, user_ids)
+
+        for user in users:
+            user.is_contact = user.pk in contacts
+            user.is_favorite = contacts.get(user.pk, False)
+            user.is_blocked = user.pk in blocked
+            user.is_online = user.pk in online
+            if self.action == 'retrieve':
+                user.mutual_count = mutual_counts.get(user.pk, 0)
 
     def perfom_update(self, serializer):
         super().perfom_update(serializer)
@@ -115,11 +151,13 @@ class UserViewSet(mixins.RetrieveModelMixin,
             clusters as (
                 SELECT
                     ST_ClusterKMeans(location, {minpoints}) OVER() AS cluster_id,
-                    uuid, location, display_name, avatar_uuid
+                    uuid, location, display_name, avatar_uuid,
+                    avatar_placeholder
                 FROM user_list
             )
         SELECT
             cluster_id, uuid, display_name, location, avatar_uuid,
+            avatar_placeholder,
             False as is_cluster
         FROM clusters WHERE cluster_id = 0
 
@@ -130,6 +168,7 @@ class UserViewSet(mixins.RetrieveModelMixin,
             CONCAT('Cluster ', cluster_id) as display_name,
             ST_Centroid(ST_Collect(clusters.location)) as location,
             NULL as avatar_uuid,
+            NULL as avatar_placeholder,
             True as is_cluster
         FROM clusters
         GROUP BY cluster_id
@@ -153,11 +192,13 @@ class UserViewSet(mixins.RetrieveModelMixin,
                 clusters as (
                     SELECT
                         ST_ClusterDBSCAN(ST_Transform(location, 4326), {eps}, {minpoints}) OVER() AS cluster_id,
-                        uuid, location, display_name, avatar_uuid
+                        uuid, location, display_name, avatar_uuid,
+                        avatar_placeholder
                     FROM user_list
                 )
             SELECT
                 cluster_id, uuid, display_name, location, avatar_uuid,
+                avatar_placeholder,
                 '1' as geom_count,
                 False as is_cluster
             FROM clusters WHERE cluster_id IS NULL
@@ -169,6 +210,7 @@ class UserViewSet(mixins.RetrieveModelMixin,
                 CONCAT('Cluster ', cluster_id) as display_name,
                 ST_Centroid(ST_Collect(clusters.location)) as location,
                 NULL as avatar_uuid,
+                NULL as avatar_placeholder,
                 COUNT(clusters.location) as geom_count,
                 True as is_cluster
             FROM clusters
@@ -184,8 +226,10 @@ class UserViewSet(mixins.RetrieveModelMixin,
 
     @action(
         methods=['get'], detail=False, serializer_class=UserLocationSerializer,
-        filterset_class=SexFilter, pagination_class=None, filter_backends=(
-            WhoIsNearFilter, BirthDateFilter, DjangoFilterBackend,
+        filterset_class=SexFilter, pagination_class=None, interests_filter_rank=False,
+        filter_backends=(
+            WhoIsNearFilter, BirthDateFilter, DjangoFilterBackend, InBBoxFilter,
+            BlockedUsersFilter, InterestsFilter,
         )
     )
     @swagger_auto_schema(query_serializer=WhoIsNearMapQueryParamsSerializer,
@@ -200,13 +244,18 @@ class UserViewSet(mixins.RetrieveModelMixin,
         # px = query_serializer.validated_data.get('horizonta_px', 1080)
         # clusters_number = query_serializer.validated_data['clusters_number']
 
-        queryset = self.get_queryset().filter(show_activity=True, is_online=True)
-        queryset = self.filter_queryset(queryset)
+        # Онлайн по колонке is_online: ее пакетно обновляет flush_presence
+        # (с задержкой до PRESENCE_FLUSH_INTERVAL), без IN по всему онлайну
+        queryset = self.filter_queryset(self.get_queryset().filter(
+            show_activity=True, is_online=True
+        ))
         points_count = queryset.count()
         meter_pixel = get_meter_per_pixel(zoom)
         # При определенном зуме кластеризация не применяется
         if zoom >= 19.5 or points_count < 3:
-            serializer = self.get_serializer(queryset, many=True)
+            # При сдвиге карты с токеном state - только изменения
+            queryset, removed, ids = self.get_viewport_delta(queryset)
+            data = self.viewport_response_data(self.serialize_rows(self.get_rows(queryset)), removed, ids)
 
         else:
             # Запрос сырого SQL через курсор
@@ -222,9 +271,46 @@ class UserViewSet(mixins.RetrieveModelMixin,
                 for row in data:
                     row['location'] = GEOSGeometry(row['location'])
 
-                serializer = self.get_serializer(data, many=True)
+                data = self.serialize_rows(data)
 
-        return Response(serializer.data)
+        if query_serializer.validated_data['compact']:
+            data = compact_geojson(
+                data, zoom, columnar=query_serializer.validated_data['columnar']
+            )
+        return Response(data)
+
+    def get_tile_cache_vary(self, request):
+        vary = super().get_tile_cache_vary(request)
+        # Онлайн меняется при flush_presence, тайл не должен его пережить
+        vary.append(get_presence_version())
+        # Радиус считается от локации текущего пользователя
+        if request.query_params.get(WhoIsNearFilter.dist_param):
+            location = request.user.location
+            vary.append(location.wkt if location else None)
+        return vary
+
+    @swagger_auto_schema(responses={200: 'Mapbox Vector Tile.'})
+    @action(
+        methods=['get'], detail=False, url_name='who-tiles',
+        url_path=r'who/tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt',
+        renderer_classes=(MVTRenderer, JSONRenderer),
+        filterset_class=SexFilter, interests_filter_rank=False,
+        filter_backends=(
+            WhoIsNearFilter, BirthDateFilter, DjangoFilterBackend, BlockedUsersFilter,
+            InterestsFilter,
+        )
+    )
+    def who_tiles(self, request, z, x, y, *args, **kwargs):
+        """
+        Кто рядом (векторный тайл, кластеры на мелких зумах).
+        """
+        def get_queryset():
+            queryset = self.get_queryset().filter(
+                show_activity=True, is_online=True
+            )
+            return self.filter_queryset(queryset)
+
+        return self.tile_response(request, get_queryset, z, x, y)
 
     @action(
         methods=['get'], detail=False, serializer_class=UserLocationSerializer,
@@ -232,6 +318,7 @@ class UserViewSet(mixins.RetrieveModelMixin,
         pagination_class=GeoJsonPagination,
         filterset_class=SexFilter, filter_backends=(
             WhoIsNearFilter, BirthDateFilter, DjangoFilterBackend, InBBoxFilter,
+            BlockedUsersFilter, InterestsFilter,
         )
     )
     @swagger_auto_schema(query_serializer=WhoIsNearListQueryParamsSerializer,
@@ -244,16 +331,15 @@ class UserViewSet(mixins.RetrieveModelMixin,
             .is_valid(raise_exception=True)
 
         # Only online users show
-        queryset = self.get_queryset().filter(show_activity=True, is_online=True)
-        queryset = self.filter_queryset(queryset)
+        queryset = self.get_queryset().filter(
+            show_activity=True, is_online=True
+        )
+        queryset = self.get_rows(self.filter_queryset(queryset))
 
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+            return self.get_paginated_response(self.serialize_rows(page))
+        return Response(self.serialize_rows(queryset))
 
     @action(
         methods=['post'], detail=True, serializer_class=UserAbuseSerializer,
@@ -274,11 +360,12 @@ class UserViewSet(mixins.RetrieveModelMixin,
             serializer_class=EmptySerializer)
     def block(self, request, uuid=None):
         """ Устанавливает или снимает пользовательскую блокировку. """
+        user = self.get_object()
         if request.method.lower() == 'post':
-            request.user.black_list.add(self.get_object())
+            request.user.black_list.add(user)
             return Response(status=status.HTTP_201_CREATED)
         elif request.method.lower() == 'delete':
-            request.user.black_list.remove(self.get_object())
+            request.user.black_list.remove(user)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['get'], detail=False, serializer_class=SimpeUserSerializer)
@@ -293,12 +380,42 @@ class UserViewSet(mixins.RetrieveModelMixin,
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(methods=['get'], detail=True, serializer_class=SimpeUserSerializer)
+    def mutual(self, request, uuid=None):
+        """ Общие контакты текущего пользователя и пользователя uuid. """
+        user = self.get_object()
+        queryset = get_user_model().objects.filter(
+            pk__in=Contact.objects.mutual(request.user, user),
+            is_active=True
+        ).order_by('pk')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
     @action(methods=['post'], detail=False, serializer_class=ImOnlineSerializer)
     def im_online(self, request, uuid=None):
-        serializer_class = self.get_serializer_class()
-        serializer = serializer_class(data=request.data)
+        """
+        Heartbeat присутствия (без записи в базу, см. users.presence).
+        С is_online=false пользователь сразу уходит в офлайн.
+        """
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(last_ativity=datetime.now())
+        user = request.user
+        if serializer.validated_data.get('is_online', True):
+            user.last_activity = timezone.now()
+            user.is_online = True
+            get_presence_store().heartbeat(user.pk, user.last_activity.timestamp())
+        else:
+            # flush_presence переводит в офлайн только по TTL
+            get_presence_store().remove(user.pk)
+            user.is_online = False
+            if type(user).objects.filter(pk=user.pk, is_online=True).update(is_online=False):
+                bump_presence_version()
+        serializer = self.get_serializer(user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     # @action(methods=['get'], detail=True, serializer_class=FileSerializer)